@@ -14,6 +14,7 @@ import psycopg2.extensions
 import sentry_sdk
 
 
+from django.core.exceptions import ImproperlyConfigured
 from sentry_sdk.integrations.django import DjangoIntegration
 from pathlib import Path
 from dotenv import load_dotenv, find_dotenv  # type: ignore
@@ -65,13 +66,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "nursapps.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "nursapps.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "nursapps.routers.ReplicaPinMiddleware",
 ]
 
 ROOT_URLCONF = "app.urls"
@@ -108,12 +112,74 @@ DATABASES = {
         "TEST": {
             "NAME": "agenda_test_database",
         },
+        # The writes raise it to SERIALIZABLE, see nursapps.transactions.
         "OPTIONS": {
-            "isolation_level": psycopg2.extensions.ISOLATION_LEVEL_SERIALIZABLE,
+            "isolation_level": psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED,
         },
     }
 }
 
+# The agenda reads go to the replica once a replica host is set.
+DATABASE_ROUTERS = ["nursapps.routers.ReplicaRouter"]
+REPLICA_READS = bool(os.getenv("DB_REPLICA_HOST"))
+# Seconds a user who wrote reads from the primary.
+REPLICA_STICKY_SECONDS = 10
+
+# Shared by the processes once MEMCACHED_LOCATION is set, see nursapps.cache.
+# The invalidations of a process do not reach the local memory caches of the
+# others: those are for the tests and development only.
+if os.getenv("MEMCACHED_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": os.getenv("MEMCACHED_LOCATION"),
+        }
+    }
+elif os.environ.get("ENV") == "PRODUCTION":
+    raise ImproperlyConfigured("MEMCACHED_LOCATION must be set in production.")
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Per request SQL, template and total times, logged as JSON lines.
+REQUEST_INSTRUMENTATION = os.getenv("REQUEST_INSTRUMENTATION") == "True"
+# Adds the times to the responses as a Server-Timing header, for debugging.
+REQUEST_INSTRUMENTATION_HEADER = os.getenv("REQUEST_INSTRUMENTATION_HEADER") == "True"
+
+# Profiles the requests with a signed X-Profile header, or the profile query
+# flag of a staff user, into pstats files. manage.py profiling_token signs
+# a header valid REQUEST_PROFILING_TOKEN_AGE seconds.
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING") == "True"
+REQUEST_PROFILING_DIR = os.getenv("REQUEST_PROFILING_DIR", BASE_DIR / "profiles")
+REQUEST_PROFILING_TOKEN_AGE = 60 * 60
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "nursapps.instrumentation": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "nursapps.profiling": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        # Timings of the tests tagged benchmark, run with --tag benchmark.
+        "nursapps.agenda.tests.benchmarks": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -176,7 +242,18 @@ LOGIN_REDIRECT_URL = "registration/profile.html"
 
 LOGIN_URL = "/auth/accounts/login"
 
+# Store the recurring series as a rule expanded on read, not one event per visit.
+# The series stored while the mode was on are still read once it is turned off.
+AGENDA_VIRTUAL_SERIES = os.getenv("AGENDA_VIRTUAL_SERIES") == "True"
+
 if "/app" in os.environ["HOME"]:
     import django_heroku
 
     django_heroku.settings(locals())
+
+# Defined last, from the final primary: the primary itself without a replica host.
+DATABASES["replica"] = dict(
+    DATABASES["default"],
+    HOST=os.getenv("DB_REPLICA_HOST", DATABASES["default"].get("HOST", "")),
+    TEST={"MIRROR": "default"},
+)
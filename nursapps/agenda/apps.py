@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AgendaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "nursapps.agenda"
+
+    def ready(self):
+        """Connect the agenda signals."""
+        from nursapps.agenda import signals  # noqa: F401
@@ -0,0 +1,241 @@
+"""Agenda benchmark module.
+
+Seed cabinets through the event form paths, then time the views through the
+test client. Every view is run cold, the cache being cleared before each
+request, and warm. The report gives the p50 and p95 latencies and the
+largest query count of every view, as sorted JSON to diff between commits.
+"""
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from nursapps.agenda.models import Event
+from nursapps.agenda.utils import get_daily_agenda_hours
+from nursapps.cabinet.models import Associate, Cabinet
+from nursapps.instrumentation import RequestMetrics
+
+
+User = get_user_model()
+
+# The seeded series book the first slots of the day, the last ones are left
+# free for the created and edited visits of the benchmark.
+FREE_SLOTS = 8
+
+SERIES_DAYS = 7
+
+VIEWS = (
+    "agenda",
+    "daily_agenda",
+    "create_events",
+    "edit_event",
+    "delete_event",
+    "autocomplete",
+    "user_profile",
+)
+
+
+def seed(cabinets, associates, events, start):
+    """Create the cabinets, their nurses and their visits, return the nurses.
+
+    Every nurse gets events visits, as series of SERIES_DAYS daily visits
+    created by Event.create_events. The series of a cabinet take its slots
+    in turn from start, one slot of the day per series.
+    """
+    hours = get_daily_agenda_hours()[:-FREE_SLOTS]
+    nurses = []
+    for cabinet_index in range(cabinets):
+        cabinet = Cabinet.objects.create(name=f"bench{cabinet_index}")
+        members = []
+        for index in range(associates):
+            user = User.objects.create_user(
+                username=f"bench{cabinet_index}-{index}",
+                email=f"bench{cabinet_index}-{index}@bool.com",
+                password="poufpouf",
+                is_cabinet_owner=index == 0,
+            )
+            Associate.objects.create(cabinet_id=cabinet.id, user_id=user.id)
+            members.append(user)
+
+        slots = count()
+        for user in members:
+            for first in range(0, events, SERIES_DAYS):
+                slot = next(slots)
+                hour, minute = (int(i) for i in hours[slot % len(hours)].split(":"))
+                event = Event(
+                    name=f"Client n{slot}",
+                    care_address=f"{slot} rue du chemin",
+                    cares="AC, INJ",
+                    date=start.replace(hour=hour, minute=minute)
+                    + timedelta(days=slot // len(hours) * SERIES_DAYS),
+                    total_visit_per_day=1,
+                    delta_visit_per_day=1,
+                    delta_visit_per_hour=0,
+                    number_of_days=min(SERIES_DAYS, events - first),
+                )
+                event.create_events(user.id)
+        nurses += members
+    return nurses
+
+
+def percentile(samples, percent) -> float:
+    """Return a percentile of the samples."""
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[percent - 1]
+
+
+class Benchmark:
+    """Time the views for a nurse of a seeded cabinet."""
+
+    def __init__(self, user, day, runs):
+        """Init."""
+        self.user = user
+        self.day = day
+        self.runs = runs
+        self.client = Client()
+        self.client.force_login(user)
+        free_hours = get_daily_agenda_hours()[-FREE_SLOTS:]
+        self.creation_slots = self.slots(free_hours[: FREE_SLOTS // 2], days=3)
+        self.edition_slots = self.slots(free_hours[FREE_SLOTS // 2 :], days=1)
+        # The edits move the first visits, the deletes take the last ones
+        # backwards: a delete drops the rest of the series from its visit.
+        visits = Event.objects.filter(user=user, date__gte=day).values_list(
+            "id", "date"
+        )
+        self.first_visits = iter(visits.order_by("date"))
+        self.last_visits = iter(visits.order_by("-date"))
+
+    def slots(self, hours, days):
+        """Yield free slots from the benchmark day, days apart for a same hour."""
+        for offset in count(step=days):
+            for hour in hours:
+                yield (self.day + timedelta(days=offset)).replace(
+                    hour=int(hour[:2]), minute=int(hour[3:])
+                )
+
+    def request(self, method, url, data=None) -> tuple:
+        """Return the latency in ms and the number of queries of a request."""
+        metrics = RequestMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics.execute))
+            start = time.perf_counter()
+            response = getattr(self.client, method)(url, data)
+            latency = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method.upper()} {url}: {response.status_code}")
+        return latency, metrics.queries
+
+    def measure(self, view, cold) -> dict:
+        """Return the latencies and query counts of runs of a view."""
+        latencies, queries = [], []
+        if not cold:
+            self.request(*getattr(self, view)())
+        for _ in range(self.runs):
+            args = getattr(self, view)()
+            if cold:
+                cache.clear()
+            latency, number = self.request(*args)
+            latencies.append(latency)
+            queries.append(number)
+        return {
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "queries": max(queries),
+        }
+
+    def report(self) -> dict:
+        """Return the cold and warm measures of every view."""
+        return {
+            view: {
+                "cold": self.measure(view, cold=True),
+                "warm": self.measure(view, cold=False),
+            }
+            for view in VIEWS
+        }
+
+    def form_data(self, date, number_of_days) -> dict:
+        """Return the POST data of the event form."""
+        return {
+            "name": "Client bench",
+            "care_address": "1 rue du chemin",
+            "cares": ["AC"],
+            "date": date.strftime("%d/%m/%Y %H:%M"),
+            "total_visit_per_day": 1,
+            "delta_visit_per_hour": 0,
+            "delta_visit_per_day": 1,
+            "number_of_days": number_of_days,
+        }
+
+    def agenda(self) -> tuple:
+        """Return the request of the month view."""
+        return "get", reverse("nurse:main_agenda", args=[self.day.year, self.day.month])
+
+    def daily_agenda(self) -> tuple:
+        """Return the request of the day view."""
+        return "get", reverse(
+            "nurse:daily_agenda", args=[self.day.year, self.day.month, self.day.day]
+        )
+
+    def create_events(self) -> tuple:
+        """Return the request creating a 3 days series on free slots."""
+        date = next(self.creation_slots)
+        url = reverse(
+            "nurse:new_event",
+            args=[date.year, date.month, date.day, date.strftime("%H:%M")],
+        )
+        return "post", url, self.form_data(date, 3)
+
+    def edit_event(self) -> tuple:
+        """Return the request moving a seeded visit to a free slot."""
+        event_id, date = next(self.first_visits)
+        url = reverse(
+            "nurse:edit_event",
+            args=[date.year, date.month, date.day, date.strftime("%H:%M"), event_id],
+        )
+        data = self.form_data(next(self.edition_slots), 1)
+        data["choice_event_edit"] = "thisone"
+        return "post", url, data
+
+    def delete_event(self) -> tuple:
+        """Return the request deleting a seeded visit."""
+        event_id, date = next(self.last_visits)
+        url = reverse(
+            "nurse:del_event",
+            args=[date.year, date.month, date.day, date.strftime("%H:%M"), event_id],
+        )
+        return "post", url
+
+    def autocomplete(self) -> tuple:
+        """Return the request of the cabinet names autocomplete."""
+        return "get", reverse("cabinet:autocomplete"), {"term": "bench"}
+
+    def user_profile(self) -> tuple:
+        """Return the request of the profile page."""
+        return "get", reverse("nursauth:profile")
+
+
+def run(cabinets, associates, events, runs) -> dict:
+    """Seed the cabinets and return the report of the views."""
+    day = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    start = time.perf_counter()
+    nurses = seed(cabinets, associates, events, day)
+    seed_time = time.perf_counter() - start
+    return {
+        "seed": {
+            "cabinets": cabinets,
+            "associates": associates,
+            "events": events,
+            "runs": runs,
+            "seed_s": round(seed_time, 3),
+        },
+        "views": Benchmark(nurses[0], day, runs).report(),
+    }
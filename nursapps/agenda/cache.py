@@ -0,0 +1,49 @@
+"""Agenda cache module."""
+from datetime import date
+
+from nursapps.cabinet.models import Associate
+from nursapps.cache import CabinetNamespace
+from nursapps.routers import primary_reads
+
+
+MONTH_CALENDAR_TIMEOUT = 60 * 60 * 24
+
+MONTH_CALENDARS = CabinetNamespace("agenda:calendar", MONTH_CALENDAR_TIMEOUT)
+
+
+def cabinet_calendar_version(cabinet_id) -> int:
+    """Return the current version of the cached calendars of a cabinet."""
+    return MONTH_CALENDARS.version(cabinet_id)
+
+
+def month_calendar_key(cabinet_id, year, month) -> str:
+    """Return the cache key of a month calendar.
+
+    The day is part of the key because the calendar highlights today.
+    """
+    return MONTH_CALENDARS.key((cabinet_id, year, month, date.today().isoformat()))
+
+
+def get_or_set_month_calendar(cabinet_id, year, month, render) -> str:
+    """Return the cached month calendar, render and store it when missing.
+
+    The calendar is rendered from the primary, the replica may lag behind.
+    """
+
+    def render_from_primary():
+        with primary_reads():
+            return render()
+
+    return MONTH_CALENDARS.get_or_set(
+        (cabinet_id, year, month, date.today().isoformat()), render_from_primary
+    )
+
+
+def invalidate_cabinet_calendars(cabinet_id):
+    """Invalidate every cached month calendar of a cabinet."""
+    MONTH_CALENDARS.invalidate(cabinet_id)
+
+
+def invalidate_user_calendars(user_id):
+    """Invalidate the cached month calendars of the cabinet of a user."""
+    invalidate_cabinet_calendars(Associate.objects.get_membership(user_id).cabinet_id)
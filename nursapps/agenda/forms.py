@@ -1,12 +1,13 @@
 """Agenda form module."""
-import datetime as dt
 from datetime import datetime
 
 from django.core.exceptions import ValidationError
 from django import forms
 from django.forms import DateInput
 
+from nursapps.agenda.idempotency import new_submission_token
 from nursapps.agenda.models import Event
+from nursapps.agenda.recurrence import Recurrence
 from nursapps.cabinet.models import Associate
 
 
@@ -37,6 +38,29 @@ DAYS_CHOICES = [
     (6, "Dimanche"),
 ]
 
+SLOT_TAKEN_MESSAGE = (
+    "Cette tranche horaire est probablement déjà "
+    "occupée ou en dehors du scope (06:00 - 22:45)."
+)
+
+
+def slots_taken_message(dates) -> str:
+    """Return the error of visits falling on booked slots of the cabinet.
+
+    dates are the booked slots, empty when one was taken in the meantime.
+    """
+    if not dates:
+        return "Une tranche horaire a été occupée entre-temps."
+    return "Ces visites tombent sur des tranches horaires déjà occupées : " + ", ".join(
+        date.strftime("%d/%m/%Y %H:%M") for date in dates
+    )
+
+
+EDIT_CONFLICT_MESSAGE = (
+    "Ce rendez-vous a été modifié entre-temps : "
+    "rechargez la page avant de le modifier."
+)
+
 EVENT_CHOICES = [
     ("thisone", "Cet événement seulement "),
     ("thisone_after", "Cet événement et les suivants "),
@@ -204,6 +228,11 @@ class FormEvent(forms.ModelForm):
         choices=DAYS_CHOICES,
     )
 
+    # Claimed by the first POST, its replays write nothing.
+    submission_token = forms.CharField(
+        widget=forms.HiddenInput, initial=new_submission_token, required=False
+    )
+
     def clean_cares(self) -> str:
         """Return cleaned cares."""
         cares = self.cleaned_data["cares"]
@@ -219,32 +248,42 @@ class FormEvent(forms.ModelForm):
     def clean_date(self):
         """Return cleaned date to accept only minutes in [0, 15, 30, 45]."""
         if self.user:
-            associate = Associate.objects.filter(user_id=self.user.id).first()
-            associates = Associate.objects.get_associates(associate.cabinet_id)
-            associates = [associate.id for associate in associates]
-            dt_obj = datetime.strptime(self.initial["date"][:-6], "%Y-%m-%d")
-            events = Event.objects.filter(
-                date__contains=dt.date(
-                    year=dt_obj.year, month=dt_obj.month, day=dt_obj.day
-                ),
-                user_id__in=associates,
-            )
-
+            cabinet_id = Associate.objects.get_membership(self.user).cabinet_id
             date = self.cleaned_data["date"]
 
             if (
                 (
-                    date not in [i.date for i in events]
-                    or date == datetime.strptime(self.initial["date"], "%Y-%m-%dT%H:%M")
+                    date == datetime.strptime(self.initial["date"], "%Y-%m-%dT%H:%M")
+                    or Event.objects.is_slot_free(cabinet_id, date)
                 )
                 and date.minute in [0, 15, 30, 45]
                 and date.hour in list(range(6, 23))
             ):
                 return date
-            raise ValidationError(
-                "Cette tranche horaire est probablement déjà "
-                "occupée ou en dehors du scope (06:00 - 22:45)."
+            raise ValidationError(SLOT_TAKEN_MESSAGE)
+
+    def clean(self):
+        """Check every visit of a new series against the booked cabinet slots.
+
+        The series is expanded and checked in a single query before anything
+        is written, and every conflicting visit is reported.
+        """
+        cleaned_data = super().clean()
+        if self.user and self.instance.pk is None and "date" in cleaned_data:
+            recurrence = Recurrence(
+                cleaned_data["date"],
+                number_of_days=cleaned_data.get("number_of_days"),
+                total_visit_per_day=cleaned_data.get("total_visit_per_day"),
+                delta_visit_per_day=cleaned_data.get("delta_visit_per_day"),
+                delta_visit_per_hour=cleaned_data.get("delta_visit_per_hour"),
+                day_per_week=cleaned_data.get("day_per_week"),
             )
+            conflicts = Event.objects.conflicts(
+                Associate.objects.get_membership(self.user).cabinet_id, recurrence
+            )
+            if conflicts:
+                self.add_error("date", slots_taken_message(conflicts))
+        return cleaned_data
 
 
 class EditEventForm(FormEvent):
@@ -258,3 +297,56 @@ class EditEventForm(FormEvent):
         label="Sélectionnez quel événement modifier",
         choices=EVENT_CHOICES,
     )
+    # Versions of the event and of its series the form was read at.
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+    series_version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+
+class SeriesForm(forms.Form):
+    """Parameters of an operation on a series of the cabinet."""
+
+    def __init__(self, *args, **kwargs):
+        """Init."""
+        self.cabinet_id = kwargs.pop("cabinet_id", None)
+        super().__init__(*args, **kwargs)
+
+
+class SeriesShiftForm(SeriesForm):
+    """Shift a series by a number of days and minutes."""
+
+    days = forms.IntegerField(required=False)
+    minutes = forms.IntegerField(required=False)
+
+    def clean(self):
+        """Keep the visits on the quarter hour grid."""
+        cleaned_data = super().clean()
+        cleaned_data["days"] = cleaned_data.get("days") or 0
+        cleaned_data["minutes"] = cleaned_data.get("minutes") or 0
+        if cleaned_data["minutes"] % 15:
+            self.add_error("minutes", "Les visites sont placées au quart d'heure.")
+        elif not cleaned_data["days"] and not cleaned_data["minutes"]:
+            raise ValidationError("Le décalage est nul.")
+        return cleaned_data
+
+
+class SeriesExtendForm(SeriesForm):
+    """Extend a series by a number of visits."""
+
+    count = forms.IntegerField(min_value=1, max_value=100)
+
+
+class SeriesTruncateForm(SeriesForm):
+    """Truncate a series at a date."""
+
+    date = forms.DateTimeField(input_formats=("%d/%m/%Y %H:%M", "%Y-%m-%dT%H:%M"))
+
+
+class SeriesReassignForm(SeriesForm):
+    """Reassign a series to another nurse of the cabinet."""
+
+    user = forms.ModelChoiceField(queryset=None)
+
+    def __init__(self, *args, **kwargs):
+        """Init."""
+        super().__init__(*args, **kwargs)
+        self.fields["user"].queryset = Associate.objects.get_associates(self.cabinet_id)
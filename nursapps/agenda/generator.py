@@ -0,0 +1,251 @@
+"""Agenda generator module.
+
+Fill cabinets with months of home-care schedules, for index and query plan
+testing. Every patient gets a care plan compiled into a Recurrence, as the
+event form does, on slots of the cabinet still free: a plan whose slots are
+taken is moved a quarter of an hour later, like a nurse would. The visits
+are copied in bulk, one transaction per cabinet.
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+from itertools import islice, takewhile
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from nursapps.agenda.cache import invalidate_cabinet_calendars
+from nursapps.agenda.forms import CARES_CHOICES, DAYS_CHOICES
+from nursapps.agenda.models import DailyVisitCount, Event, Events
+from nursapps.agenda.recurrence import Recurrence, is_day_slot
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+User = get_user_model()
+
+CARES = [code for code, _ in CARES_CHOICES]
+
+STREETS = (
+    "rue du chemin",
+    "avenue de la gare",
+    "place de l'église",
+    "impasse des lilas",
+    "boulevard Victor Hugo",
+    "allée des tilleuls",
+)
+
+# Tries of a plan a quarter of an hour later, when its slots are taken.
+SHIFTS = 8
+
+QUARTER = timedelta(minutes=15)
+
+COLUMNS = (
+    "events",
+    "cabinet",
+    "user",
+    "name",
+    "care_address",
+    "cares",
+    "date",
+    "total_visit_per_day",
+    "delta_visit_per_day",
+    "delta_visit_per_hour",
+    "number_of_days",
+    "day_per_week",
+    "version",
+)
+
+
+def care_plan(rng, day) -> dict:
+    """Return the event fields of a random care plan starting on a day.
+
+    Mostly daily visits, then several injections a day, visits every other
+    day and weekly visits on some days of the week.
+    """
+    kind = rng.choices(
+        ("daily", "injections", "every_other_day", "weekly"), weights=(4, 3, 1, 2)
+    )[0]
+    minute = rng.choice((0, 15, 30, 45))
+    if kind == "injections":
+        total_visit_per_day = rng.randint(2, 4)
+        delta_visit_per_hour = rng.randint(4, 5)
+        return {
+            "date": day.replace(hour=rng.randint(6, 7), minute=minute),
+            "cares": rng.sample(("INJ", "GC", "SC"), rng.randint(1, 2)),
+            "number_of_days": rng.randint(10, 90),
+            "total_visit_per_day": total_visit_per_day,
+            "delta_visit_per_hour": delta_visit_per_hour,
+        }
+    if kind == "weekly":
+        return {
+            "date": day.replace(hour=rng.randint(7, 17), minute=minute),
+            "cares": rng.sample(("BS", "PERF", "IM", "F", "Fils"), rng.randint(1, 2)),
+            "number_of_days": rng.randint(4, 24),
+            "day_per_week": ", ".join(
+                str(number)
+                for number in sorted(
+                    rng.sample(
+                        [number for number, _ in DAYS_CHOICES], rng.randint(1, 3)
+                    )
+                )
+            ),
+        }
+    return {
+        "date": day.replace(hour=rng.randint(7, 19), minute=minute),
+        "cares": rng.sample(CARES, rng.randint(1, 3)),
+        "number_of_days": rng.randint(5, 45) if kind == "daily" else rng.randint(5, 20),
+        "delta_visit_per_day": 2 if kind == "every_other_day" else 1,
+    }
+
+
+def plan_dates(fields, end) -> list:
+    """Return the visits of a plan before end, clipping its number of days."""
+    if not fields.get("day_per_week"):
+        fields["number_of_days"] = min(
+            fields["number_of_days"],
+            (end - fields["date"]).days // fields.get("delta_visit_per_day", 1) + 1,
+        )
+    recurrence = Recurrence(
+        fields["date"],
+        number_of_days=fields["number_of_days"],
+        total_visit_per_day=fields.get("total_visit_per_day"),
+        delta_visit_per_day=fields.get("delta_visit_per_day"),
+        delta_visit_per_hour=fields.get("delta_visit_per_hour"),
+        day_per_week=fields.get("day_per_week"),
+    )
+    dates = list(takewhile(lambda date: date < end, recurrence))
+    if fields.get("day_per_week"):
+        fields["number_of_days"] = len(dates)
+    return dates
+
+
+def book(fields, booked, end) -> list:
+    """Return the visits of a plan on free slots, booked; [] if none is found."""
+    dates = plan_dates(fields, end)
+    for shift in range(SHIFTS):
+        shifted = [date + shift * QUARTER for date in dates]
+        if (
+            shifted
+            and booked.isdisjoint(shifted)
+            and all(is_day_slot(date) for date in shifted)
+        ):
+            booked.update(shifted)
+            fields["date"] += shift * QUARTER
+            return shifted
+    return []
+
+
+def copy_visits(rows, batch_size):
+    """Insert visit rows, tuples of the COLUMNS values, with COPY batches.
+
+    COPY skips the SQL compilation of a bulk_create, the bulk of the time of
+    millions of rows.
+    """
+    columns = ", ".join(Event._meta.get_field(name).column for name in COLUMNS)
+    sql = f"COPY {Event._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while batch := list(islice(rows, batch_size)):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+
+
+def create_cabinets(number, associates, prefix, password=None) -> list:
+    """Create cabinets of nurses, return the (cabinet id, nurse ids) pairs."""
+    password = make_password(password)
+    cabinets = Cabinet.objects.bulk_create(
+        Cabinet(name=f"{prefix}{index}") for index in range(number)
+    )
+    nurses = User.objects.bulk_create(
+        User(
+            username=f"{cabinet.name}-{index}",
+            email=f"{cabinet.name}-{index}@example.com",
+            password=password,
+            is_cabinet_owner=index == 0,
+        )
+        for cabinet in cabinets
+        for index in range(associates)
+    )
+    Associate.objects.bulk_create(
+        Associate(cabinet_id=cabinet.id, user_id=nurse.id)
+        for cabinet, nurse in zip(
+            (cabinet for cabinet in cabinets for _ in range(associates)), nurses
+        )
+    )
+    return [
+        (
+            cabinet.id,
+            [
+                nurse.id
+                for nurse in nurses[index * associates : (index + 1) * associates]
+            ],
+        )
+        for index, cabinet in enumerate(cabinets)
+    ]
+
+
+def generate(rng, cabinet_id, nurse_ids, start, end, plans, batch_size) -> tuple:
+    """Fill a cabinet with care plans, return the numbers of plans and visits.
+
+    Every nurse starts plans care plans a month, on days drawn between start
+    and end. The slots already booked in the cabinet are left alone.
+    """
+    booked = set(
+        Event.objects.filter(
+            cabinet_id=cabinet_id, date__gte=start, date__lt=end
+        ).values_list("date", flat=True)
+    )
+    days = (end - start).days
+    series = []
+    for nurse_id in nurse_ids:
+        for _ in range(max(1, round(plans * days / 30))):
+            patient = rng.randint(1, 9999)
+            fields = care_plan(rng, start + timedelta(days=rng.randrange(days)))
+            dates = book(fields, booked, end)
+            if dates:
+                fields.update(
+                    user_id=nurse_id,
+                    name=f"Client n{patient}",
+                    care_address=f"{patient % 200 + 1} {rng.choice(STREETS)}",
+                    cares=", ".join(fields["cares"]),
+                )
+                series.append((fields, dates))
+
+    with transaction.atomic():
+        parents = Events.objects.bulk_create(
+            (Events() for _ in series), batch_size=batch_size
+        )
+        copy_visits(
+            (
+                (
+                    parent.id,
+                    cabinet_id,
+                    fields["user_id"],
+                    fields["name"],
+                    fields["care_address"],
+                    fields["cares"],
+                    date,
+                    fields.get("total_visit_per_day", 1),
+                    fields.get("delta_visit_per_day", 1),
+                    fields.get("delta_visit_per_hour"),
+                    fields["number_of_days"],
+                    fields.get("day_per_week"),
+                    1,
+                )
+                for parent, (fields, dates) in zip(parents, series)
+                for date in dates
+            ),
+            batch_size,
+        )
+        DailyVisitCount.objects.rebuild(cabinet_id)
+    invalidate_cabinet_calendars(cabinet_id)
+    return len(series), sum(len(dates) for _, dates in series)
+
+
+def month_start(day=None) -> datetime:
+    """Return the first day of the month of a day, today by default."""
+    day = day or datetime.now()
+    return datetime(day.year, day.month, 1)
@@ -0,0 +1,41 @@
+"""Agenda idempotency module.
+
+The create and edit forms carry a submission token. The first POST of a token
+claims it; its replays get the redirect of the first one and write nothing.
+"""
+import re
+import uuid
+
+from nursapps.cache import Namespace
+
+
+SUBMISSION_TIMEOUT = 60 * 10
+
+SUBMISSION_TOKEN = re.compile(r"^[0-9a-f]{32}$")
+
+SUBMISSIONS = Namespace("agenda:submission", SUBMISSION_TIMEOUT)
+
+
+def new_submission_token() -> str:
+    """Return a new submission token."""
+    return uuid.uuid4().hex
+
+
+def claim_submission(user_id, token, result):
+    """Claim a submission token, return the result of its first POST if any.
+
+    The claim is atomic on the shared cache: of two concurrent POSTs of a
+    token only one gets None and writes. A missing or malformed token is
+    never claimed.
+    """
+    if not token or not SUBMISSION_TOKEN.match(token):
+        return None
+    if SUBMISSIONS.add((user_id, token), result):
+        return None
+    return SUBMISSIONS.get((user_id, token), result)
+
+
+def release_submission(user_id, token):
+    """Let a token be posted again, its POST having written nothing."""
+    if token and SUBMISSION_TOKEN.match(token):
+        SUBMISSIONS.delete((user_id, token))
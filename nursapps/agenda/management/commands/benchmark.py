@@ -0,0 +1,69 @@
+"""Benchmark command module."""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from nursapps.agenda import benchmark
+
+
+class Command(BaseCommand):
+    """Seed a test database and report the latencies of the views."""
+
+    help = (
+        "Seed cabinets in a test database, time the agenda, cabinet and "
+        "profile views cold and warm and print a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        """Add arguments."""
+        parser.add_argument(
+            "--cabinets", type=int, default=1, help="Number of cabinets."
+        )
+        parser.add_argument(
+            "--associates", type=int, default=2, help="Nurses per cabinet."
+        )
+        parser.add_argument("--events", type=int, default=56, help="Visits per nurse.")
+        parser.add_argument(
+            "--runs", type=int, default=10, help="Measured requests per view."
+        )
+        parser.add_argument("--output", help="Write the report to this file.")
+
+    def handle(self, *args, **options):
+        """Handle."""
+        if min(options["cabinets"], options["associates"], options["runs"]) < 1:
+            raise CommandError("--cabinets, --associates and --runs must be >= 1.")
+        # Every run of the edit and delete views consumes a visit of the nurse.
+        if options["events"] < 2 * (2 * options["runs"] + 1):
+            raise CommandError(
+                f"--events must be >= {2 * (2 * options['runs'] + 1)} "
+                f"for {options['runs']} runs."
+            )
+
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            report = benchmark.run(
+                options["cabinets"],
+                options["associates"],
+                options["events"],
+                options["runs"],
+            )
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output + "\n")
+            self.stdout.write(
+                self.style.SUCCESS(f"Report written to {options['output']}.")
+            )
+        else:
+            self.stdout.write(output)
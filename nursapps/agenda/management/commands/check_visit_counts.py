@@ -0,0 +1,32 @@
+"""Check visit counts command module."""
+from django.core.management.base import BaseCommand, CommandError
+
+from nursapps.agenda.models import DailyVisitCount
+
+
+class Command(BaseCommand):
+    """Compare the daily visit counters with the events."""
+
+    help = "Report the daily visit counters which do not match the events."
+
+    def add_arguments(self, parser):
+        """Add arguments."""
+        parser.add_argument(
+            "--cabinet",
+            type=int,
+            help="Only check the counters of this cabinet id.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle."""
+        inconsistencies = DailyVisitCount.objects.inconsistencies(options["cabinet"])
+        for cabinet_id, day, stored, expected in inconsistencies:
+            self.stdout.write(
+                f"cabinet {cabinet_id} - {day}: {stored} stored, {expected} expected"
+            )
+        if inconsistencies:
+            raise CommandError(
+                f"{len(inconsistencies)} daily visit counters are out of sync, "
+                "run rebuild_visit_counts to fix them."
+            )
+        self.stdout.write(self.style.SUCCESS("Daily visit counters are consistent."))
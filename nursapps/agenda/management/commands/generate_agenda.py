@@ -0,0 +1,119 @@
+"""Generate agenda command module."""
+import random
+import time
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+
+from nursapps.agenda import generator
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+class Command(BaseCommand):
+    """Fill cabinets with months of generated visits."""
+
+    help = (
+        "Generate months of home-care schedules in new cabinets, or in an "
+        "existing one, for index and query plan testing."
+    )
+
+    def add_arguments(self, parser):
+        """Add arguments."""
+        parser.add_argument(
+            "--cabinets", type=int, default=10, help="Number of new cabinets."
+        )
+        parser.add_argument(
+            "--associates", type=int, default=4, help="Nurses per new cabinet."
+        )
+        parser.add_argument(
+            "--cabinet",
+            type=int,
+            help="Fill this existing cabinet id instead of creating cabinets.",
+        )
+        parser.add_argument(
+            "--prefix", default="gen", help="Name prefix of the new cabinets."
+        )
+        parser.add_argument(
+            "--password", help="Password of the new nurses, unusable by default."
+        )
+        parser.add_argument(
+            "--start",
+            type=lambda value: datetime.strptime(value, "%Y-%m-%d"),
+            help="First day of the schedules, YYYY-MM-DD, this month by default.",
+        )
+        parser.add_argument(
+            "--months", type=int, default=3, help="Months of schedules."
+        )
+        parser.add_argument(
+            "--plans",
+            type=int,
+            default=15,
+            help="Care plans started per nurse and month.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the random generator."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows per bulk insert."
+        )
+
+    def handle(self, *args, **options):
+        """Handle."""
+        if min(options["cabinets"], options["associates"], options["months"]) < 1:
+            raise CommandError("--cabinets, --associates and --months must be >= 1.")
+        start = options["start"] or generator.month_start()
+        end = start + relativedelta(months=options["months"])
+
+        if options["cabinet"] is not None:
+            nurse_ids = list(
+                Associate.objects.filter(cabinet_id=options["cabinet"]).values_list(
+                    "user_id", flat=True
+                )
+            )
+            if not nurse_ids:
+                raise CommandError(f"Cabinet {options['cabinet']} has no nurse.")
+            cabinets = [(options["cabinet"], nurse_ids)]
+        else:
+            names = [
+                f"{options['prefix']}{index}" for index in range(options["cabinets"])
+            ]
+            if (
+                max(len(name) for name in names)
+                > Cabinet._meta.get_field("name").max_length
+            ):
+                raise CommandError("The cabinet names are too long, shorten --prefix.")
+            if Cabinet.objects.filter(name__in=names).exists():
+                raise CommandError(
+                    f"Cabinets named {options['prefix']}<n> exist, change --prefix."
+                )
+            cabinets = generator.create_cabinets(
+                options["cabinets"],
+                options["associates"],
+                options["prefix"],
+                options["password"],
+            )
+
+        rng = random.Random(options["seed"])
+        began = time.perf_counter()
+        total_plans = total_visits = 0
+        for cabinet_id, nurse_ids in cabinets:
+            plans, visits = generator.generate(
+                rng,
+                cabinet_id,
+                nurse_ids,
+                start,
+                end,
+                options["plans"],
+                options["batch_size"],
+            )
+            total_plans += plans
+            total_visits += visits
+            if options["verbosity"] > 1:
+                self.stdout.write(f"cabinet {cabinet_id}: {visits} visits")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total_visits} visits of {total_plans} care plans generated in "
+                f"{len(cabinets)} cabinets in {time.perf_counter() - began:.1f}s."
+            )
+        )
@@ -0,0 +1,19 @@
+"""Profiling token command module."""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from nursapps.profiling import PROFILE_HEADER, profiling_token
+
+
+class Command(BaseCommand):
+    """Print a signed header asking for the profile of a request."""
+
+    help = "Print a signed X-Profile header, to profile a request."
+
+    def handle(self, *args, **options):
+        """Handle."""
+        self.stdout.write(f"{PROFILE_HEADER}: {profiling_token()}")
+        self.stderr.write(
+            f"Valid {settings.REQUEST_PROFILING_TOKEN_AGE} seconds, "
+            "with REQUEST_PROFILING=True."
+        )
@@ -0,0 +1,23 @@
+"""Rebuild visit counts command module."""
+from django.core.management.base import BaseCommand
+
+from nursapps.agenda.models import DailyVisitCount
+
+
+class Command(BaseCommand):
+    """Rebuild the daily visit counters from the events."""
+
+    help = "Rebuild the daily visit counters of the cabinets from the events."
+
+    def add_arguments(self, parser):
+        """Add arguments."""
+        parser.add_argument(
+            "--cabinet",
+            type=int,
+            help="Only rebuild the counters of this cabinet id.",
+        )
+
+    def handle(self, *args, **options):
+        """Handle."""
+        total = DailyVisitCount.objects.rebuild(options["cabinet"])
+        self.stdout.write(self.style.SUCCESS(f"{total} daily visit counters rebuilt."))
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cabinet', '0002_associate_user'),
+        ('agenda', '0002_event_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVisitCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('cabinet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cabinet.cabinet')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyvisitcount',
+            constraint=models.UniqueConstraint(fields=('cabinet', 'day'), name='unique_daily_visit_count'),
+        ),
+    ]
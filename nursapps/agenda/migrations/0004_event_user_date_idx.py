@@ -0,0 +1,17 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0003_dailyvisitcount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user', 'date'], name='event_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cabinet', '0002_associate_user'),
+        ('agenda', '0004_event_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='cabinet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cabinet.cabinet'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['cabinet', 'date'], name='event_cabinet_date_idx'),
+        ),
+    ]
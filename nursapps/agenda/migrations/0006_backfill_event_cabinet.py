@@ -0,0 +1,25 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:19
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_event_cabinet(apps, schema_editor):
+    Associate = apps.get_model('cabinet', 'Associate')
+    Event = apps.get_model('agenda', 'Event')
+    Event.objects.update(
+        cabinet_id=Subquery(
+            Associate.objects.filter(user_id=OuterRef('user_id')).values('cabinet_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0005_event_cabinet'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_event_cabinet, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cabinet', '0002_associate_user'),
+        ('agenda', '0006_backfill_event_cabinet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence', models.DateTimeField()),
+                ('date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='cabinet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cabinet.cabinet'),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='care_address',
+            field=models.CharField(blank=True, max_length=400),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='cares',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='day_per_week',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='delta_visit_per_day',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='delta_visit_per_hour',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='first_occurrence',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='is_virtual',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='last_occurrence',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='number_of_days',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='total_visit_per_day',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='events',
+            index=models.Index(condition=models.Q(('is_virtual', True)), fields=['cabinet', 'last_occurrence'], name='events_cabinet_last_idx'),
+        ),
+        migrations.AddField(
+            model_name='eventexception',
+            name='events',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='agenda.events'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventexception',
+            constraint=models.UniqueConstraint(fields=('events', 'occurrence'), name='unique_event_exception'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:40
+
+from django.db import migrations, models
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Count
+import django.db.models.constraints
+
+
+def check_double_bookings(apps, schema_editor):
+    """Refuse to migrate while visits of a cabinet share a slot.
+
+    The visits are patient appointments: the conflicting slots are listed
+    for an operator to rebook or delete them, then the migration is run again.
+    """
+    Event = apps.get_model('agenda', 'Event')
+    slots = (
+        Event.objects.filter(cabinet__isnull=False, date__isnull=False)
+        .values('cabinet', 'date')
+        .annotate(events=ArrayAgg('id', ordering='id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by('cabinet', 'date')
+    )
+    conflicts = [
+        f"cabinet {slot['cabinet']} at {slot['date']:%Y-%m-%d %H:%M}: "
+        f"events {', '.join(str(event_id) for event_id in slot['events'])}"
+        for slot in slots
+    ]
+    if conflicts:
+        raise RuntimeError(
+            'Visits of a cabinet share a slot, rebook them before migrating: '
+            + '; '.join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0007_events_virtual_series'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('cabinet', 'date'), name='unique_cabinet_slot'),
+        ),
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_cabinet_date_idx',
+        ),
+    ]
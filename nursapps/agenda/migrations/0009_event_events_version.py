@@ -0,0 +1,23 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0008_event_unique_cabinet_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='events',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:46
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def rebuild_daily_visit_counts(apps, schema_editor):
+    """Count the visits of the cabinets per day, once their cabinet is set.
+
+    The month view only reads the counters: without them every month stored
+    before the counters would show no visit.
+    """
+    DailyVisitCount = apps.get_model('agenda', 'DailyVisitCount')
+    Event = apps.get_model('agenda', 'Event')
+    visits = (
+        Event.objects.filter(cabinet__isnull=False, date__isnull=False)
+        .values('cabinet', day=TruncDate('date'))
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    DailyVisitCount.objects.all().delete()
+    DailyVisitCount.objects.bulk_create(
+        (
+            DailyVisitCount(
+                cabinet_id=visit['cabinet'], day=visit['day'], total=visit['total']
+            )
+            for visit in visits.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0009_event_events_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_daily_visit_counts, migrations.RunPython.noop),
+    ]
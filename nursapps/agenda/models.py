@@ -1,22 +1,317 @@
 """Agenda models module."""
-from dateutil.rrule import WEEKLY, rrule, SU
 from dateutil.parser import *
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from itertools import islice
 
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest, Least, TruncDate
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
-from nursapps.cabinet.models import Associate
+from nursapps.agenda.cache import (
+    invalidate_cabinet_calendars,
+    invalidate_user_calendars,
+)
+from nursapps.agenda.recurrence import Recurrence
+from nursapps.cabinet.models import Associate, Cabinet
+from nursapps.transactions import serializable
 
 UserModel = get_user_model()
 
 
+class EventsManager(models.Manager):
+    """Events manager."""
+
+    def create_virtual(self, event, user_id):
+        """Create a virtual series storing the recurrence of a form event."""
+        recurrence = Recurrence.from_event(event)
+        dates = list(recurrence)
+        return self.create(
+            is_virtual=True,
+            user_id=user_id,
+            cabinet_id=Associate.objects.get_membership(user_id).cabinet_id,
+            name=event.name,
+            care_address=event.care_address,
+            cares=event.cares,
+            date=recurrence.dtstart,
+            number_of_days=recurrence.number_of_days,
+            total_visit_per_day=recurrence.total_visit_per_day,
+            delta_visit_per_day=recurrence.delta_visit_per_day,
+            delta_visit_per_hour=recurrence.delta_visit_per_hour,
+            day_per_week=event.day_per_week or None,
+            first_occurrence=min(dates),
+            last_occurrence=max(dates),
+        )
+
+    def occurrences(self, cabinet_id, start, end, exclude=None) -> list:
+        """Return the occurrences of the virtual series of a cabinet in [start, end).
+
+        The series are read whatever the mode, which only decides how the new
+        series are stored. exclude is the id of a series left out. A nurse
+        without a cabinet sees no series, the leftovers of deleted cabinets
+        included.
+        """
+        if cabinet_id is None:
+            return []
+        series = self.filter(
+            is_virtual=True,
+            cabinet_id=cabinet_id,
+            first_occurrence__lt=end,
+            last_occurrence__gte=start,
+        ).prefetch_related("exceptions")
+        if exclude is not None:
+            series = series.exclude(pk=exclude)
+        return sorted(
+            occurrence
+            for events in series
+            for occurrence in events.occurrences(start, end)
+        )
+
+
 class Events(models.Model):
-    """Events."""
+    """Events.
+
+    The parent of the visits of a series. A virtual series stores its
+    recurrence rule and its exceptions; its visits are expanded on read.
+    """
+
+    is_virtual = models.BooleanField(default=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE
+    )
+    cabinet = models.ForeignKey(
+        Cabinet, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    name = models.CharField(max_length=200, blank=True)
+    care_address = models.CharField(max_length=400, blank=True)
+    cares = models.CharField(max_length=100, blank=True)
+    date = models.DateTimeField(null=True, blank=True)
+    total_visit_per_day = models.IntegerField(default=1)
+    delta_visit_per_day = models.IntegerField(default=1)
+    delta_visit_per_hour = models.IntegerField(blank=True, null=True)
+    number_of_days = models.IntegerField(blank=True, null=True)
+    day_per_week = models.CharField(max_length=100, blank=True, null=True)
+    # The rule is not expanded from this date on.
+    until = models.DateTimeField(null=True, blank=True)
+    # Bounds of the visits, moved ones included, to find the series of a window.
+    first_occurrence = models.DateTimeField(null=True, blank=True)
+    last_occurrence = models.DateTimeField(null=True, blank=True)
+    # Bumped by every write of the series, compared by the edits.
+    version = models.PositiveIntegerField(default=1)
+
+    objects = EventsManager()
 
-    pass
+    class Meta:
+        """Meta."""
+
+        indexes = [
+            models.Index(
+                fields=["cabinet", "last_occurrence"],
+                name="events_cabinet_last_idx",
+                condition=Q(is_virtual=True),
+            ),
+        ]
+
+    def recurrence(self) -> Recurrence:
+        """Return the recurrence rule of the series."""
+        return Recurrence(
+            self.date,
+            number_of_days=self.number_of_days,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            day_per_week=self.day_per_week,
+        )
+
+    def occurrence(self, date):
+        """Return the unsaved event of the visit of the series at date."""
+        return Event(
+            events=self,
+            user_id=self.user_id,
+            cabinet_id=self.cabinet_id,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            date=date,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            number_of_days=self.number_of_days,
+            day_per_week=self.day_per_week,
+        )
+
+    def occurrences(self, start, end) -> list:
+        """Return the unsaved events of the series in [start, end).
+
+        Only the window is expanded; cancelled visits are dropped and moved
+        ones are shown at their new date.
+        """
+        exceptions = {
+            exception.occurrence: exception.date for exception in self.exceptions.all()
+        }
+        rule_end = min(end, self.until) if self.until else end
+        dates = [
+            date
+            for date in self.recurrence().between(start, rule_end)
+            if date not in exceptions
+        ]
+        dates += [date for date in exceptions.values() if date and start <= date < end]
+        return [self.occurrence(date) for date in sorted(dates)]
+
+    @transaction.atomic
+    def cancel(self, occurrence):
+        """Cancel a visit of the series."""
+        EventException.objects.update_or_create(
+            events=self, occurrence=occurrence, defaults={"date": None}
+        )
+        Events.objects.filter(pk=self.pk).update(version=F("version") + 1)
+        invalidate_cabinet_calendars(self.cabinet_id)
+
+    @transaction.atomic
+    def move(self, occurrence, date):
+        """Move a visit of the series to another date."""
+        EventException.objects.update_or_create(
+            events=self, occurrence=occurrence, defaults={"date": date}
+        )
+        Events.objects.filter(pk=self.pk).update(
+            first_occurrence=Least("first_occurrence", Value(date)),
+            last_occurrence=Greatest("last_occurrence", Value(date)),
+            version=F("version") + 1,
+        )
+        invalidate_cabinet_calendars(self.cabinet_id)
+
+    @serializable
+    def detach(self, date):
+        """Return the event row of the visit at date, created on the first call.
+
+        The visit is then no longer expanded from the rule and can be edited
+        or deleted as any other event.
+        """
+        if not self.occurrences(date, date + timedelta(minutes=1)):
+            return Event.objects.filter(events=self, date=date).first()
+        moved = self.exceptions.filter(date=date).first()
+        event = self.occurrence(date)
+        event.save()
+        self.cancel(moved.occurrence if moved else date)
+        DailyVisitCount.objects.refresh(self.cabinet_id, [date])
+        return event
+
+    @transaction.atomic
+    def reschedule(self, start, shift, **fields):
+        """Move the rule of the series from start on by shift, with new fields.
+
+        From the start of the rule on, the series is moved as a whole. From a
+        later date, the rest of the rule and its exceptions are split into a
+        new series, moved in its turn. Return the series of the moved visits.
+        """
+        series = self
+        if start > self.date:
+            end = self.until or self.last_occurrence + timedelta(minutes=1)
+            first = next(iter(self.recurrence().between(start, end)), None)
+            if first is None:
+                return self
+            rest = self.exceptions.filter(occurrence__gte=start)
+            series = Events.objects.create(
+                is_virtual=True,
+                user_id=self.user_id,
+                cabinet_id=self.cabinet_id,
+                name=self.name,
+                care_address=self.care_address,
+                cares=self.cares,
+                date=first,
+                number_of_days=self.number_of_days,
+                total_visit_per_day=self.total_visit_per_day,
+                delta_visit_per_day=self.delta_visit_per_day,
+                delta_visit_per_hour=self.delta_visit_per_hour,
+                day_per_week=self.day_per_week,
+                until=end,
+                first_occurrence=min(
+                    [first]
+                    + [date for date in rest.values_list("date", flat=True) if date]
+                ),
+                last_occurrence=self.last_occurrence,
+            )
+            rest.update(events=series)
+            Events.objects.filter(pk=self.pk).update(
+                until=start, version=F("version") + 1
+            )
+
+        # Recreated rather than updated: shifting the occurrences one row at
+        # a time would collide on the unique (events, occurrence) constraint.
+        exceptions = list(series.exceptions.all())
+        series.exceptions.all().delete()
+        EventException.objects.bulk_create(
+            EventException(
+                events=series,
+                occurrence=exception.occurrence + shift,
+                date=exception.date + shift if exception.date else None,
+            )
+            for exception in exceptions
+        )
+        Events.objects.filter(pk=series.pk).update(
+            date=F("date") + shift,
+            until=F("until") + shift,
+            first_occurrence=F("first_occurrence") + shift,
+            last_occurrence=F("last_occurrence") + shift,
+            version=F("version") + 1,
+            **fields,
+        )
+        invalidate_cabinet_calendars(self.cabinet_id)
+        return series
+
+    @transaction.atomic
+    def truncate(self, date):
+        """Drop the visits of the series from date on."""
+        Events.objects.filter(pk=self.pk).update(until=date, version=F("version") + 1)
+        self.exceptions.filter(date__gte=date).update(date=None)
+        invalidate_cabinet_calendars(self.cabinet_id)
+
+
+class EventException(models.Model):
+    """A moved or cancelled (no date) visit of a virtual series."""
+
+    events = models.ForeignKey(
+        Events, related_name="exceptions", on_delete=models.CASCADE
+    )
+    occurrence = models.DateTimeField()
+    date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """Meta."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["events", "occurrence"], name="unique_event_exception"
+            )
+        ]
+
+
+class EditConflict(Exception):
+    """The visit or its series was written since the edit form was read."""
+
+
+class SlotConflict(Exception):
+    """Visits of a write fall on booked slots of the cabinet.
+
+    dates are the booked slots, empty when one was taken in the meantime.
+    """
+
+    def __init__(self, dates):
+        """Init."""
+        self.dates = dates
+        super().__init__(dates)
+
+
+def check_cabinet_slots():
+    """Check the deferred unique cabinet slot constraint right away.
+
+    Raise IntegrityError when two visits of a cabinet share a slot.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS unique_cabinet_slot IMMEDIATE")
+        cursor.execute("SET CONSTRAINTS unique_cabinet_slot DEFERRED")
 
 
 class EventManager(models.Manager):
@@ -26,6 +321,52 @@ class EventManager(models.Manager):
         """Create event."""
         return super().create(*args, **kwargs)
 
+    def is_slot_free(self, cabinet_id, date, exclude=None) -> bool:
+        """Return True if no visit of the cabinet is booked at date.
+
+        An existence query on the (cabinet, date) unique index, whatever the
+        size of the table. exclude is the id of the event being moved.
+        A nurse without a cabinet shares no slot.
+        """
+        if cabinet_id is None:
+            return True
+        events = self.filter(cabinet_id=cabinet_id, date=date)
+        if exclude is not None:
+            events = events.exclude(pk=exclude)
+        if events.exists():
+            return False
+        return not Events.objects.occurrences(
+            cabinet_id, date, date + timedelta(minutes=1)
+        )
+
+    def conflicts(self, cabinet_id, dates, exclude_events=None, exclude=None) -> list:
+        """Return the sorted dates already booked by visits of the cabinet.
+
+        The whole list is checked in a single query, whatever its length.
+        exclude_events is the id of the series being moved, exclude the ids
+        of the visits being moved. A nurse without a cabinet shares no slot.
+        """
+        dates = set(dates)
+        if cabinet_id is None or not dates:
+            return []
+        events = self.filter(cabinet_id=cabinet_id, date__in=dates)
+        if exclude_events is not None:
+            events = events.exclude(events_id=exclude_events)
+        if exclude is not None:
+            events = events.exclude(pk__in=exclude)
+        booked = set(events.values_list("date", flat=True))
+        booked.update(
+            occurrence.date
+            for occurrence in Events.objects.occurrences(
+                cabinet_id,
+                min(dates),
+                max(dates) + timedelta(minutes=1),
+                exclude=exclude_events,
+            )
+            if occurrence.date in dates
+        )
+        return sorted(booked)
+
 
 class Event(models.Model):
     """Event model class."""
@@ -45,26 +386,71 @@ class Event(models.Model):
         null=True,
         on_delete=models.CASCADE,
     )
+    # Denormalized cabinet of the nurse, kept in sync by the Associate signals.
+    cabinet = models.ForeignKey(
+        Cabinet,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
     total_visit_per_day = models.IntegerField(default=1)
     delta_visit_per_day = models.IntegerField(default=1)
     delta_visit_per_hour = models.IntegerField(blank=True, null=True)
     number_of_days = models.IntegerField(blank=True, null=True)
     day_per_week = models.CharField(max_length=100, blank=True, null=True)
+    # Bumped by every write of the visit, compared by the edits.
+    version = models.PositiveIntegerField(default=1)
 
     objects = EventManager()
 
+    class Meta:
+        """Meta."""
+
+        indexes = [
+            models.Index(fields=["user", "date"], name="event_user_date_idx"),
+        ]
+        constraints = [
+            # Checked at commit so that a series can be moved row by row;
+            # check_cabinet_slots checks it earlier.
+            models.UniqueConstraint(
+                fields=["cabinet", "date"],
+                name="unique_cabinet_slot",
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
+
     def __str__(self) -> str:
         """Return str representation."""
         return f"{self.user} - {self.name} - {self.care_address} - {self.cares}\
  - {self.date} - {self.events}"
 
+    def save(self, *args, **kwargs):
+        """Save the event, filling in the cabinet of its nurse."""
+        if self.cabinet_id is None and self.user_id:
+            self.cabinet_id = Associate.objects.get_membership(self.user_id).cabinet_id
+        super().save(*args, **kwargs)
+
     def __lt__(self, other) -> bool:
         """Compare the instance date selected with the event date."""
         return self.date < other.date
 
     @property
     def get_html_url(self) -> str:
-        """Get html url."""
+        """Get html url.
+
+        The unsaved visits of a virtual series link to their detach view.
+        """
+        if self.id is None and self.events_id:
+            return reverse(
+                "nurse:detach_occurrence",
+                args=(
+                    self.date.strftime("%Y"),
+                    self.date.strftime("%m"),
+                    self.date.strftime("%d"),
+                    self.date.strftime("%H:%M"),
+                    self.events_id,
+                ),
+            )
         url = reverse(
             "nurse:edit_event",
             args=(
@@ -99,87 +485,108 @@ class Event(models.Model):
 
     def by_hour(self) -> tuple:
         """Return the rrule byhour parameter."""
-        return tuple(
-            range(
-                int(self.date.hour),
-                (
-                    (
-                        self.delta_visit_per_hour + 1
-                        if self.delta_visit_per_hour > 3
-                        else self.delta_visit_per_hour + 2
-                    )
-                    * self.total_visit_per_day
-                ),
-                self.delta_visit_per_hour,
-            )
-        )
+        return Recurrence.from_event(self).by_hour()
 
     def by_week_day(self) -> tuple:
         """Return the rrule byweekday parameter."""
-        return tuple([int(day_number) for day_number in self.day_per_week.split(", ")])
+        return Recurrence.from_event(self).week_days
 
-    def create_weekly_event_with_delta_hour(self, user_id):
-        """Create a weekly event with delta in hour."""
-        dates = rrule(
-            WEEKLY,
-            count=self.number_of_days * self.total_visit_per_day,
-            wkst=SU,
-            byhour=self.by_hour(),
-            byweekday=self.by_week_day(),
-            dtstart=self.date,
+    def get_dates(self) -> list:
+        """Return a date list, one visit a day."""
+        return list(
+            Recurrence(
+                self.date,
+                number_of_days=self.number_of_days,
+                delta_visit_per_day=self.delta_visit_per_day,
+            )
         )
-        dates = list(dates)
 
-        self.events = Events.objects.create()
+    def get_recurency_dates(self) -> list:
+        """Return a list of dates.
 
-        for index in range(0, self.number_of_days * self.total_visit_per_day):
-            Event.objects.create(
+        These are repeated in a day at a frequency in hours between each. With also
+        a recurrence of days which can be consecutive or spaced apart by several days.
+
+        For example, twice a day every three days for a total of 5 days.
+        """
+        return list(
+            Recurrence(
+                self.date,
+                number_of_days=self.number_of_days,
                 total_visit_per_day=self.total_visit_per_day,
                 delta_visit_per_day=self.delta_visit_per_day,
                 delta_visit_per_hour=self.delta_visit_per_hour,
-                number_of_days=self.number_of_days,
-                name=self.name,
-                care_address=self.care_address,
-                cares=self.cares,
-                user_id=user_id,
-                day_per_week=self.day_per_week,
-                events_id=self.events.id,
-                date=dates[index],
             )
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def create_series(dates, **fields) -> tuple:
+        """Create the parent Events and one event per date.
+
+        The occurrences are inserted with a single bulk insert, in the same
+        transaction as their parent. Return the parent and the created events,
+        raise IntegrityError when one of the slots is already booked.
+        """
+        events = Events.objects.create()
+        cabinet_id = Associate.objects.get_membership(fields["user_id"]).cabinet_id
+        created = Event.objects.bulk_create(
+            [
+                Event(events=events, cabinet_id=cabinet_id, date=date, **fields)
+                for date in dates
+            ]
+        )
+        check_cabinet_slots()
+        return events, created
+
+    def create_weekly_event_with_delta_hour(self, user_id):
+        """Create a weekly event with delta in hour."""
+        dates = Recurrence(
+            self.date,
+            number_of_days=self.number_of_days,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            day_per_week=self.day_per_week,
+        )
+
+        self.events, _ = Event.create_series(
+            dates,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            number_of_days=self.number_of_days,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=user_id,
+            day_per_week=self.day_per_week,
+        )
 
     def create_unique_event_per_day_with_week_recurrency(self, user_id):
         """create_unique event per day with week recurrency."""
-        dates = rrule(
-            WEEKLY,
-            count=self.number_of_days,
-            wkst=SU,
-            byweekday=self.by_week_day(),
-            dtstart=self.date,
+        dates = Recurrence(
+            self.date,
+            number_of_days=self.number_of_days,
+            day_per_week=self.day_per_week,
         )
-        dates = list(dates)
-
-        self.events = Events.objects.create()
 
-        for index in range(0, self.number_of_days):
-            event = Event.objects.create(
-                total_visit_per_day=self.total_visit_per_day,
-                delta_visit_per_day=self.delta_visit_per_day,
-                number_of_days=self.number_of_days,
-                name=self.name,
-                care_address=self.care_address,
-                cares=self.cares,
-                user_id=user_id,
-                day_per_week=self.day_per_week,
-                events_id=self.events.id,
-                date=dates[index],
-            )
-        return event
+        self.events, created = Event.create_series(
+            dates,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            number_of_days=self.number_of_days,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=user_id,
+            day_per_week=self.day_per_week,
+        )
+        return created[-1]
 
     def create_unique_day_at_unique_hour(self, user_id):
         """Create an event once a day at a specific time."""
-        self.events = Events.objects.create()
-
-        event = Event.objects.create(
+        self.events, created = Event.create_series(
+            Recurrence(self.date),
             total_visit_per_day=self.total_visit_per_day,
             delta_visit_per_day=self.delta_visit_per_day,
             delta_visit_per_hour=self.delta_visit_per_hour,
@@ -188,239 +595,281 @@ class Event(models.Model):
             care_address=self.care_address,
             cares=self.cares,
             user_id=user_id,
-            events_id=self.events.id,
-            date=self.date,
         )
-        return event
+        return created[-1]
 
     def create_unique_day_at_unique_hour_during_several_consecutive_days(self, user_id):
         """Create unique day at unique hour during several consecutive days.
 
         1 X per day (on consecutives days).
         """
-        self.events = Events.objects.create()
+        dates = Recurrence(
+            self.date,
+            number_of_days=self.number_of_days,
+            delta_visit_per_day=self.delta_visit_per_day,
+        )
 
-        dates = self.get_dates()
-        for index in range(0, self.number_of_days):
-            event = Event.objects.create(
-                total_visit_per_day=self.total_visit_per_day,
-                delta_visit_per_day=self.delta_visit_per_day,
-                delta_visit_per_hour=self.delta_visit_per_hour,
-                number_of_days=self.number_of_days,
-                name=self.name,
-                care_address=self.care_address,
-                cares=self.cares,
-                user_id=user_id,
-                events_id=self.events.id,
-                date=dates[index],
-            )
-        return event
+        self.events, created = Event.create_series(
+            dates,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            number_of_days=self.number_of_days,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=user_id,
+        )
+        return created[-1]
 
     def create_unique_day_with_recurence_in_it(self, user_id):
         """Create unique day with recurence in it."""
-        self.events = Events.objects.create()
-
-        for i in range(
-            0,
-            self.total_visit_per_day * self.delta_visit_per_hour,
-            self.delta_visit_per_hour,
-        ):
-            event = Event.objects.create(
-                total_visit_per_day=self.total_visit_per_day,
-                delta_visit_per_day=self.delta_visit_per_day,
-                delta_visit_per_hour=self.delta_visit_per_hour,
-                number_of_days=self.number_of_days,
-                name=self.name,
-                care_address=self.care_address,
-                cares=self.cares,
-                user_id=user_id,
-                events_id=self.events.id,
-                date=self.date + timedelta(hours=i),
-            )
-        return event
+        dates = Recurrence(
+            self.date,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+        )
+
+        self.events, created = Event.create_series(
+            dates,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            number_of_days=self.number_of_days,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=user_id,
+        )
+        return created[-1]
 
     def create_unique_day_with_recurency_in_days_delta(self, user_id):
         """Create consecutive days with recurency in the day.
 
         Eg: For example, twice a day every three days for a total of 5 days.
         """
-        self.dates = self.get_recurency_dates()
+        dates = Recurrence(
+            self.date,
+            number_of_days=self.number_of_days,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+        )
 
-        self.events = Events.objects.create()
-        for index in range(0, len(self.dates)):
-            event = Event.objects.create(
-                total_visit_per_day=self.total_visit_per_day,
-                delta_visit_per_day=self.delta_visit_per_day,
-                delta_visit_per_hour=self.delta_visit_per_hour,
-                number_of_days=self.number_of_days,
-                name=self.name,
-                care_address=self.care_address,
-                cares=self.cares,
-                user_id=user_id,
-                events_id=self.events.id,
-                date=self.dates[index],
-            )
-        return event
+        self.events, created = Event.create_series(
+            dates,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            number_of_days=self.number_of_days,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=user_id,
+        )
+        return created[-1]
 
     def create_several_times_a_day_for_several_days(self, user_id):
         """Create several times a day for several days."""
-        self.events = Events.objects.create()
+        dates = Recurrence(
+            self.date,
+            number_of_days=self.number_of_days,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+        )
 
-        dates = self.get_recurency_dates()
-        for index in range(0, len(dates)):
-            Event.objects.create(
-                total_visit_per_day=self.total_visit_per_day,
-                delta_visit_per_day=self.delta_visit_per_day,
-                delta_visit_per_hour=self.delta_visit_per_hour,
-                number_of_days=self.number_of_days,
-                name=self.name,
-                care_address=self.care_address,
-                cares=self.cares,
-                user_id=user_id,
-                events_id=self.events.id,
-                date=dates[index],
-            )
+        self.events, _ = Event.create_series(
+            dates,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            number_of_days=self.number_of_days,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=user_id,
+        )
 
+    @serializable
     def create_events(self, user_id):
-        """Create events."""
-        if self.day_per_week and self.delta_visit_per_hour:
-            self.create_weekly_event_with_delta_hour(user_id)
-            """2x/d++ on mon thu & sat"""
-
-        elif self.day_per_week and not self.delta_visit_per_hour:
-            self.create_unique_event_per_day_with_week_recurrency(user_id)
-            """1x/day on mon thu & sat"""
-        elif (
-            not self.day_per_week
-            and not self.delta_visit_per_hour
-            and self.number_of_days < 2
-        ):
-            self.create_unique_day_at_unique_hour(user_id)
-        elif (
-            not self.day_per_week
-            and self.delta_visit_per_day
-            and self.number_of_days == 1
-        ):
-            self.create_unique_day_with_recurency_in_days_delta(user_id)
-            """create_multiple_times_a_day_for_a_single_day"""
-
-        elif (
-            not self.day_per_week
-            and self.delta_visit_per_hour == 0
-            and self.number_of_days > 1
-        ):
-            self.create_unique_day_at_unique_hour_during_several_consecutive_days(
-                user_id
-            )
-        elif (
-            not self.day_per_week
-            and self.delta_visit_per_hour
-            and self.number_of_days == 1
-        ):
-            self.create_unique_day_with_recurence_in_it(user_id)
-
-        elif (
-            not self.day_per_week
-            and self.delta_visit_per_hour
-            and self.delta_visit_per_day
-            and self.number_of_days > 1
-        ):
-            self.create_several_times_a_day_for_several_days(user_id)
+        """Create events.
 
-    def get_dates(self) -> list:
-        """Return a date list."""
-        dates = [self.date]
-        for index in range(
-            0,
-            (
-                self.number_of_days - 1
-                if self.number_of_days >= 3
-                else self.number_of_days
-            )
-            * self.delta_visit_per_day,
-            self.delta_visit_per_day,
-        ):
-            self.date += timedelta(days=self.delta_visit_per_day)
-            dates.append(self.date)
-        return dates
+        The form fields are compiled into a single recurrence rule whose
+        occurrences are inserted in one bulk insert. With the virtual series
+        mode on, a recurring series only stores its rule.
+        """
+        recurrence = Recurrence.from_event(self)
+        if settings.AGENDA_VIRTUAL_SERIES and len(list(islice(recurrence, 2))) > 1:
+            self.events = Events.objects.create_virtual(self, user_id)
+            invalidate_user_calendars(user_id)
+            return
 
-    def get_recurency_dates(self) -> list:
-        """Return a list of dates.
+        self.events, created = Event.create_series(
+            recurrence,
+            total_visit_per_day=self.total_visit_per_day,
+            delta_visit_per_day=self.delta_visit_per_day,
+            delta_visit_per_hour=self.delta_visit_per_hour,
+            number_of_days=self.number_of_days,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=user_id,
+            day_per_week=self.day_per_week,
+        )
 
-        These are repeated in a day at a frequency in hours between each. With also
-        a recurrence of days which can be consecutive or spaced apart by several days.
+        DailyVisitCount.objects.refresh_for_user(
+            user_id, [event.date for event in created]
+        )
+        invalidate_user_calendars(user_id)
 
-        For example, twice a day every three days for a total of 5 days.
+    @transaction.atomic
+    def updated_dates_in_group(self, group_event, updated_dates):
+        """Get updated dates in group.
+
+        updated_dates are the dates of the group shifted by updated_date: the
+        whole group is moved by a single UPDATE, the database shifting every
+        event from its own date. Raise SlotConflict, the group left unchanged,
+        when one of its new slots is already booked by another visit.
         """
-        dates = []
-        for index in range(0, self.number_of_days):
-            dates += [
-                self.date + timedelta(hours=hour)
-                for hour in range(
-                    0,
-                    (self.total_visit_per_day * self.delta_visit_per_hour),
-                    self.delta_visit_per_hour,
-                )
-                if index + self.date.hour not in [0, 1, 2, 3, 4, 5, 24]
-            ]
-            self.date += timedelta(days=self.delta_visit_per_day)
-        return dates
+        cabinet_id = Associate.objects.get_membership(self.user).cabinet_id
+        previous_dates = list(group_event.values_list("date", flat=True))
+        if not previous_dates:
+            return []
+        shift = min(updated_dates) - min(previous_dates)
+        conflicts = Event.objects.conflicts(
+            cabinet_id,
+            [date + shift for date in previous_dates],
+            exclude=group_event.values("pk"),
+        )
+        if conflicts:
+            raise SlotConflict(conflicts)
 
-    def updated_dates_in_group(self, group_event, updated_dates):
-        """Get updated dates in group."""
-        associate = Associate.objects.filter(user_id=self.user.id).first()
-        associates = Associate.objects.get_associates(associate.cabinet_id)
-        all_events = Event.objects.filter(user_id__in=associates)
-
-        for index, event in enumerate(group_event):
-            if self.date.hour not in [0, 1, 2, 3, 4, 5] or self.date not in [
-                event.date for event in all_events
-            ]:
-                Event.objects.filter(pk=event.id).update(
+        try:
+            with transaction.atomic():
+                group_event.update(
                     name=self.name,
                     care_address=self.care_address,
                     cares=self.cares,
                     user_id=self.user.id,
-                    date=updated_dates[index],
+                    date=F("date") + shift,
+                    version=F("version") + 1,
                 )
+                check_cabinet_slots()
+        except IntegrityError:
+            raise SlotConflict([])
+        DailyVisitCount.objects.refresh(
+            cabinet_id,
+            previous_dates + [date + shift for date in previous_dates],
+        )
+        invalidate_cabinet_calendars(cabinet_id)
         return updated_dates
 
-    def update_events(self, group_event, edit_choice):
-        """Update events."""
-        edit_choice = "".join(edit_choice)
+    def update_virtual_series(self, group_event, start=None):
+        """Move the virtual series of the event, from start on, to the edited date.
 
-        if edit_choice == "thisone":
-            dates_grp_event = [self.date]
+        The rule is moved with the stored visits of group_event, by the shift
+        updated_date gives on all the visits. Raise SlotConflict, the series
+        left unchanged, when one of its new slots is already booked.
+        """
+        series = self.events
+        start = start or series.first_occurrence
+        rows = list(group_event.values_list("id", "date"))
+        visits = [
+            occurrence.date
+            for occurrence in series.occurrences(
+                start, series.last_occurrence + timedelta(minutes=1)
+            )
+        ]
+        dates = visits + [date for _, date in rows]
+        if not dates:
+            return
+        shift = min(
+            self.updated_date(dates, self.date.day, self.date.hour, self.date.minute)
+        ) - min(dates)
 
-        elif edit_choice == "thisone_after":
-            dates_grp_event = [
-                evt.date
-                for evt in group_event
-                if evt.date >= datetime(self.date.year, self.date.month, self.date.day)
-            ]
-            group_event = sorted(
-                [
-                    evt
-                    for evt in group_event
-                    if evt.date
-                    >= datetime(self.date.year, self.date.month, self.date.day)
-                ]
+        moved = [date + shift for date in visits]
+        kept = {
+            occurrence.date
+            for occurrence in series.occurrences(series.first_occurrence, start)
+        }
+        kept.update(
+            Event.objects.filter(events=series, date__lt=start).values_list(
+                "date", flat=True
+            )
+        )
+        conflicts = kept.intersection(moved).union(
+            Event.objects.conflicts(series.cabinet_id, moved, exclude_events=series.id)
+        )
+        if conflicts:
+            raise SlotConflict(sorted(conflicts))
+        ids = [event_id for event_id, _ in rows]
+        if rows:
+            self.updated_dates_in_group(
+                Event.objects.filter(pk__in=ids), [date + shift for _, date in rows]
             )
+        moved_series = series.reschedule(
+            start,
+            shift,
+            name=self.name,
+            care_address=self.care_address,
+            cares=self.cares,
+            user_id=self.user.id,
+        )
+        Event.objects.filter(pk__in=ids).update(events=moved_series)
 
-        elif edit_choice == "allevent":
-            dates_grp_event = [evt.date for evt in group_event]
+    def bump_series(self, series_version=None):
+        """Move the series of the event to its next version.
 
-        updated_dates = self.updated_date(
-            dates_grp_event, self.date.day, self.date.hour, self.date.minute
-        )
+        A compare-and-swap on series_version when given: raise EditConflict
+        if the series was written since that version was read.
+        """
+        if self.events_id is None:
+            return
+        series = Events.objects.filter(pk=self.events_id)
+        if series_version is not None:
+            series = series.filter(version=series_version)
+        if not series.update(version=F("version") + 1) and series_version is not None:
+            raise EditConflict(self.events_id)
+
+    @serializable
+    def update_events(
+        self, group_event, edit_choice, version=None, series_version=None
+    ):
+        """Update events.
 
-        if edit_choice == "allevent":
-            """Update all group"""
-            self.updated_dates_in_group(group_event, updated_dates)
+        version and series_version are the versions of the event and of its
+        series the form was read at: a stale form raises EditConflict instead
+        of overwriting the changes made since. Visits moved onto booked slots
+        raise SlotConflict and nothing is written.
+        """
+        edit_choice = "".join(edit_choice)
 
-        elif edit_choice == "thisone_after":
+        if edit_choice == "thisone_after":
             """Update from the chosen date to the end."""
-            self.updated_dates_in_group(group_event, updated_dates)
+            group_event = group_event.filter(
+                date__gte=datetime(self.date.year, self.date.month, self.date.day)
+            )
+
+        if edit_choice in ["allevent", "thisone_after"]:
+            """Update the group, all of it or from the chosen date."""
+            self.bump_series(series_version)
+            if self.events_id and self.events.is_virtual:
+                self.update_virtual_series(
+                    group_event,
+                    datetime(self.date.year, self.date.month, self.date.day)
+                    if edit_choice == "thisone_after"
+                    else None,
+                )
+                return
+            dates_grp_event = list(group_event.values_list("date", flat=True))
+            if dates_grp_event:
+                self.updated_dates_in_group(
+                    group_event,
+                    self.updated_date(
+                        dates_grp_event, self.date.day, self.date.hour, self.date.minute
+                    ),
+                )
 
         elif edit_choice == "thisone":
             """
@@ -429,21 +878,162 @@ class Event(models.Model):
             Only the selected date will be updated.
             """
             event = Event.objects.filter(pk=self.id)
-            all_events = Event.objects.all()
-            if self.date not in [i.date for i in all_events]:
-                event.update(
-                    name=self.name,
-                    care_address=self.care_address,
-                    cares=self.cares,
-                    user_id=self.user.id,
-                    date=self.date,
-                )
+            if version is not None:
+                event = event.filter(version=version)
+            previous_dates = list(event.values_list("date", flat=True))
+            if version is not None and not previous_dates:
+                raise EditConflict(self.id)
+            if not Event.objects.is_slot_free(
+                self.cabinet_id, self.date, exclude=self.id
+            ):
+                raise SlotConflict([self.date])
+            try:
+                with transaction.atomic():
+                    if not event.update(
+                        name=self.name,
+                        care_address=self.care_address,
+                        cares=self.cares,
+                        user_id=self.user.id,
+                        date=self.date,
+                        version=F("version") + 1,
+                    ):
+                        raise EditConflict(self.id)
+                    check_cabinet_slots()
+            except IntegrityError:
+                raise SlotConflict([])
+            self.bump_series()
+            DailyVisitCount.objects.refresh_for_user(
+                self.user.id, previous_dates + [self.date]
+            )
+            invalidate_user_calendars(self.user.id)
 
-    def delete_event(self, group_event, year, month, day, hour, minute):
+    @serializable
+    def delete_event(
+        self, group_event, year, month, day, hour, minute, series_version=None
+    ):
         """Delete event.
 
-        Delete all events from the selected date to the end of group.
+        Delete all events from the selected date to the end of group, with a
+        single DELETE, and the parent of the group once it is empty. A stale
+        series_version raises EditConflict.
+        """
+        self.bump_series(series_version)
+        cut = datetime(int(year), int(month), int(day), hour, minute)
+        deleted = group_event.filter(date__gte=cut)
+        deleted_dates = list(deleted.values_list("date", flat=True))
+        deleted.delete()
+        events = Events.objects.filter(pk=self.events_id).first()
+        if events and events.is_virtual:
+            events.truncate(cut)
+        elif events:
+            Events.objects.filter(pk=events.pk, event__isnull=True).delete()
+        DailyVisitCount.objects.refresh_for_user(self.user_id, deleted_dates)
+        invalidate_user_calendars(self.user_id)
+
+
+class DailyVisitCountManager(models.Manager):
+    """Daily visit count manager."""
+
+    def count_events(self, cabinet_id=None, days=None) -> dict:
+        """Return the number of visits per (cabinet, day) counted on the events."""
+        events = Event.objects.filter(cabinet__isnull=False, date__isnull=False)
+        if cabinet_id is not None:
+            events = events.filter(cabinet_id=cabinet_id)
+        if days is not None:
+            day_ranges = Q()
+            for day in days:
+                start = datetime(day.year, day.month, day.day)
+                day_ranges |= Q(date__gte=start, date__lt=start + timedelta(days=1))
+            events = events.filter(day_ranges)
+        visits = (
+            events.values("cabinet", day=TruncDate("date"))
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+        return {(visit["cabinet"], visit["day"]): visit["total"] for visit in visits}
+
+    def refresh(self, cabinet_id, dates):
+        """Recount the visits of a cabinet on the days of the given dates.
+
+        Called by the event write paths, inside their transaction.
         """
-        for event in group_event:
-            if event.date >= datetime(int(year), int(month), int(day), hour, minute):
-                event.delete()
+        days = {date.date() for date in dates if date}
+        if not days:
+            return
+        counts = self.count_events(cabinet_id, days)
+        self.filter(cabinet_id=cabinet_id, day__in=days).delete()
+        self.bulk_create(
+            [
+                self.model(cabinet_id=cabinet_id, day=day, total=total)
+                for (_, day), total in counts.items()
+            ]
+        )
+
+    def refresh_for_user(self, user_id, dates):
+        """Recount the visits of the cabinet of a user on the given dates."""
+        cabinet_id = Associate.objects.get_membership(user_id).cabinet_id
+        if cabinet_id:
+            self.refresh(cabinet_id, dates)
+
+    @transaction.atomic
+    def rebuild(self, cabinet_id=None) -> int:
+        """Rebuild the counters from the events and return the number of rows."""
+        counts = self.count_events(cabinet_id)
+        rows = self.all() if cabinet_id is None else self.filter(cabinet_id=cabinet_id)
+        rows.delete()
+        self.bulk_create(
+            [
+                self.model(cabinet_id=cabinet, day=day, total=total)
+                for (cabinet, day), total in counts.items()
+            ],
+            batch_size=1000,
+        )
+        return len(counts)
+
+    def inconsistencies(self, cabinet_id=None) -> list:
+        """Return the (cabinet, day, stored, expected) counters out of sync."""
+        expected = self.count_events(cabinet_id)
+        rows = self.all() if cabinet_id is None else self.filter(cabinet_id=cabinet_id)
+        stored = {(row.cabinet_id, row.day): row.total for row in rows}
+        return sorted(
+            (
+                cabinet,
+                day,
+                stored.get((cabinet, day), 0),
+                expected.get((cabinet, day), 0),
+            )
+            for cabinet, day in expected.keys() | stored.keys()
+            if stored.get((cabinet, day), 0) != expected.get((cabinet, day), 0)
+        )
+
+    def for_month(self, user, year, month) -> dict:
+        """Return the day -> number of visits map of the cabinet of a user."""
+        visits = self.filter(
+            cabinet__associate__user_id=user.id,
+            day__gte=date(year, month, 1),
+            day__lt=date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1),
+        ).values_list("day", "total")
+        return {day.day: total for day, total in visits}
+
+
+class DailyVisitCount(models.Model):
+    """Number of visits of a cabinet per day, kept up to date by the events."""
+
+    cabinet = models.ForeignKey(Cabinet, on_delete=models.CASCADE)
+    day = models.DateField()
+    total = models.IntegerField(default=0)
+
+    objects = DailyVisitCountManager()
+
+    class Meta:
+        """Meta."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cabinet", "day"], name="unique_daily_visit_count"
+            )
+        ]
+
+    def __str__(self) -> str:
+        """Return str representation."""
+        return f"{self.cabinet_id} - {self.day} - {self.total}"
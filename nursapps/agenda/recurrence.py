@@ -0,0 +1,133 @@
+"""Agenda recurrence module."""
+from datetime import time, timedelta
+from itertools import takewhile
+
+from dateutil.rrule import WEEKLY, rrule, SU
+
+
+FIRST_SLOT = time(6, 0)
+LAST_SLOT = time(22, 45)
+
+
+def is_day_slot(date) -> bool:
+    """Return True if the date falls in the 06:00 - 22:45 agenda grid."""
+    return FIRST_SLOT <= date.time() <= LAST_SLOT
+
+
+class Recurrence:
+    """Recurrence rule compiled from the event form fields.
+
+    Iterating over a recurrence lazily yields its occurrences, dropping the
+    ones which fall outside the agenda grid (night hours).
+    """
+
+    def __init__(
+        self,
+        dtstart,
+        number_of_days=1,
+        total_visit_per_day=1,
+        delta_visit_per_day=1,
+        delta_visit_per_hour=0,
+        day_per_week=None,
+    ):
+        """Init."""
+        self.dtstart = dtstart
+        self.number_of_days = int(number_of_days or 1)
+        self.total_visit_per_day = int(total_visit_per_day or 1)
+        self.delta_visit_per_day = int(delta_visit_per_day or 1)
+        self.delta_visit_per_hour = int(delta_visit_per_hour or 0)
+        self.week_days = (
+            tuple(int(day_number) for day_number in day_per_week.split(", "))
+            if day_per_week
+            else ()
+        )
+
+    @classmethod
+    def from_event(cls, event):
+        """Compile the recurrence of an event filled in by the event form."""
+        return cls(
+            event.date,
+            number_of_days=event.number_of_days,
+            total_visit_per_day=event.total_visit_per_day,
+            delta_visit_per_day=event.delta_visit_per_day,
+            delta_visit_per_hour=event.delta_visit_per_hour,
+            day_per_week=event.day_per_week,
+        )
+
+    def __iter__(self):
+        """Yield the occurrences inside the agenda grid."""
+        return (date for date in self.dates() if is_day_slot(date))
+
+    def between(self, start, end):
+        """Yield the occurrences inside the agenda grid of the [start, end) window.
+
+        Only the window is expanded, whatever the length of the series.
+        """
+        if self.week_days:
+            dates = takewhile(
+                lambda date: date < end, self.weekly_dates().xafter(start, inc=True)
+            )
+        else:
+            dates = (
+                date for date in self.daily_dates(start, end) if start <= date < end
+            )
+        return (date for date in dates if is_day_slot(date))
+
+    def dates(self):
+        """Return an iterator over the raw occurrences of the rule."""
+        if self.week_days:
+            return self.weekly_dates()
+        return self.daily_dates()
+
+    def by_hour(self) -> tuple:
+        """Return the rrule byhour parameter, the day visits before the night."""
+        return tuple(
+            range(
+                self.dtstart.hour,
+                min(
+                    self.dtstart.hour
+                    + self.total_visit_per_day * self.delta_visit_per_hour,
+                    LAST_SLOT.hour + 1,
+                ),
+                self.delta_visit_per_hour,
+            )
+        )
+
+    def weekly_dates(self):
+        """Return the occurrences on the selected days of the week."""
+        if self.delta_visit_per_hour:
+            by_hour = self.by_hour()
+            return rrule(
+                WEEKLY,
+                count=self.number_of_days * len(by_hour),
+                wkst=SU,
+                byhour=by_hour,
+                byweekday=self.week_days,
+                dtstart=self.dtstart,
+            )
+        return rrule(
+            WEEKLY,
+            count=self.number_of_days,
+            wkst=SU,
+            byweekday=self.week_days,
+            dtstart=self.dtstart,
+        )
+
+    def daily_dates(self, start=None, end=None):
+        """Yield the visits of every day, the days being delta_visit_per_day apart.
+
+        The days ending before start and the days beginning after end are skipped.
+        """
+        visits = self.total_visit_per_day if self.delta_visit_per_hour else 1
+        first_day = 0
+        if start is not None:
+            span = timedelta(hours=(visits - 1) * self.delta_visit_per_hour)
+            first_day = max(
+                0, (start - span - self.dtstart).days // self.delta_visit_per_day
+            )
+        for day in range(first_day, self.number_of_days):
+            day_start = self.dtstart + timedelta(days=day * self.delta_visit_per_day)
+            if end is not None and day_start >= end:
+                return
+            for visit in range(visits):
+                yield day_start + timedelta(hours=visit * self.delta_visit_per_hour)
@@ -0,0 +1,182 @@
+"""Agenda series module.
+
+Operations on a whole series of visits. Each one runs in a fixed number of
+queries, whatever the length of the series, and checks the cabinet slots it
+books before writing.
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from nursapps.agenda.cache import invalidate_cabinet_calendars
+from nursapps.agenda.models import (
+    DailyVisitCount,
+    Event,
+    Events,
+    SlotConflict,
+    check_cabinet_slots,
+)
+from nursapps.agenda.recurrence import Recurrence, is_day_slot
+from nursapps.cabinet.models import Associate
+from nursapps.transactions import serializable
+
+
+class SeriesError(Exception):
+    """The operation cannot be applied to the series."""
+
+
+def get_series(events_id, cabinet_id):
+    """Return the series of a cabinet, None when it does not exist.
+
+    A user without a cabinet has no series: a None cabinet_id would match
+    every series whose Events.cabinet is not set.
+    """
+    if cabinet_id is None:
+        return None
+    return (
+        Events.objects.filter(pk=events_id)
+        .filter(Q(cabinet_id=cabinet_id) | Q(event__cabinet_id=cabinet_id))
+        .distinct()
+        .first()
+    )
+
+
+def stored_visits(events):
+    """Return the visits of a series stored one row per visit."""
+    if events.is_virtual:
+        raise SeriesError(
+            "Une série virtuelle ne peut être que tronquée ou réassignée."
+        )
+    return Event.objects.filter(events=events)
+
+
+def book(events, cabinet_id, dates, write):
+    """Write visits of a series on dates of the cabinet.
+
+    The dates are checked against the other visits of the cabinet in one
+    query before the write, and the unique slot constraint right after it
+    for the visits booked in between.
+    """
+    conflicts = Event.objects.conflicts(cabinet_id, dates, exclude_events=events.pk)
+    if conflicts:
+        raise SlotConflict(conflicts)
+    try:
+        with transaction.atomic():
+            write()
+            check_cabinet_slots()
+    except IntegrityError:
+        raise SlotConflict([])
+    Events.objects.filter(pk=events.pk).update(version=F("version") + 1)
+
+
+@serializable
+def shift(events, days=0, minutes=0) -> list:
+    """Move every visit of a series by a number of days and minutes."""
+    delta = timedelta(days=days, minutes=minutes)
+    visits = stored_visits(events)
+    rows = list(visits.values_list("date", "cabinet_id"))
+    if not rows:
+        return []
+    cabinet_id = rows[0][1]
+    previous_dates = [date for date, _ in rows]
+    dates = [date + delta for date in previous_dates]
+    if not all(is_day_slot(date) for date in dates):
+        raise SeriesError("Le décalage place des visites hors des heures de l'agenda.")
+    book(
+        events,
+        cabinet_id,
+        dates,
+        lambda: visits.update(date=F("date") + delta, version=F("version") + 1),
+    )
+    DailyVisitCount.objects.refresh(cabinet_id, previous_dates + dates)
+    invalidate_cabinet_calendars(cabinet_id)
+    return sorted(dates)
+
+
+@serializable
+def extend(events, count) -> list:
+    """Add the next count visits of the rule of a series after its last one."""
+    visits = list(stored_visits(events).order_by("date"))
+    if not visits:
+        raise SeriesError("La série ne contient aucune visite.")
+    first, last = visits[0], visits[-1]
+    # Every day of the rule has at least one visit.
+    recurrence = Recurrence(
+        first.date,
+        number_of_days=(first.number_of_days or 1) + count,
+        total_visit_per_day=first.total_visit_per_day,
+        delta_visit_per_day=first.delta_visit_per_day,
+        delta_visit_per_hour=first.delta_visit_per_hour,
+        day_per_week=first.day_per_week,
+    )
+    dates = list(islice((date for date in recurrence if date > last.date), count))
+    book(
+        events,
+        last.cabinet_id,
+        dates,
+        lambda: Event.objects.bulk_create(
+            [
+                Event(
+                    events=events,
+                    user_id=last.user_id,
+                    cabinet_id=last.cabinet_id,
+                    name=last.name,
+                    care_address=last.care_address,
+                    cares=last.cares,
+                    care_price=last.care_price,
+                    date=date,
+                    total_visit_per_day=last.total_visit_per_day,
+                    delta_visit_per_day=last.delta_visit_per_day,
+                    delta_visit_per_hour=last.delta_visit_per_hour,
+                    number_of_days=last.number_of_days,
+                    day_per_week=last.day_per_week,
+                )
+                for date in dates
+            ]
+        ),
+    )
+    DailyVisitCount.objects.refresh(last.cabinet_id, dates)
+    invalidate_cabinet_calendars(last.cabinet_id)
+    return dates
+
+
+@serializable
+def truncate(events, date):
+    """Drop the visits of a series from date on."""
+    visit = Event.objects.filter(events=events).first()
+    if visit:
+        visit.delete_event(
+            Event.objects.filter(events=events),
+            date.year,
+            date.month,
+            date.day,
+            date.hour,
+            date.minute,
+        )
+    elif events.is_virtual:
+        events.truncate(date)
+
+
+@serializable
+def reassign(events, user) -> int:
+    """Give every visit of a series to another nurse of its cabinet.
+
+    The cabinet and its slots are unchanged. Return the number of visits.
+    """
+    cabinet_id = Associate.objects.get_membership(user).cabinet_id
+    visits = Event.objects.filter(events=events)
+    if (
+        cabinet_id is None
+        or events.is_virtual
+        and events.cabinet_id != cabinet_id
+        or visits.exclude(cabinet_id=cabinet_id).exists()
+    ):
+        raise SeriesError("Cette infirmière n'est pas membre du cabinet de la série.")
+    series = Events.objects.filter(pk=events.pk)
+    if events.is_virtual:
+        series.update(user_id=user.id, version=F("version") + 1)
+    else:
+        series.update(version=F("version") + 1)
+    return visits.update(user_id=user.id, version=F("version") + 1)
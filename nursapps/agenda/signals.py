@@ -0,0 +1,77 @@
+"""Agenda signals module."""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from nursapps.agenda.cache import invalidate_cabinet_calendars
+from nursapps.agenda.models import DailyVisitCount, Event
+from nursapps.cabinet.models import Associate, MembershipConflict
+
+
+@transaction.atomic
+def move_events_to_cabinet(user_id, cabinet_id):
+    """Move the events of a nurse to their cabinet and recount both cabinets.
+
+    Raise MembershipConflict, before moving anything, when some of the
+    events fall on slots the cabinet has already booked.
+    """
+    events = Event.objects.filter(user_id=user_id).exclude(cabinet_id=cabinet_id)
+    moved = list(events.values_list("cabinet_id", "date"))
+    if not moved:
+        return
+    if cabinet_id is not None:
+        conflicts = set(
+            events.filter(
+                date__in=Event.objects.filter(cabinet_id=cabinet_id).values("date")
+            ).values_list("date", flat=True)
+        ) | set(
+            events.filter(date__isnull=False)
+            .values("date")
+            .annotate(total=Count("id"))
+            .filter(total__gt=1)
+            .values_list("date", flat=True)
+        )
+        if conflicts:
+            raise MembershipConflict(sorted(conflicts))
+    events.update(cabinet_id=cabinet_id)
+
+    dates = [date for _, date in moved]
+    for cabinet in {previous for previous, _ in moved} | {cabinet_id}:
+        if cabinet is not None:
+            DailyVisitCount.objects.refresh(cabinet, dates)
+            invalidate_cabinet_calendars(cabinet)
+
+
+@receiver(post_save, sender=Associate)
+def associate_saved(sender, instance, **kwargs):
+    """Keep the cabinet of the events in sync with the associate."""
+    move_events_to_cabinet(instance.user_id, instance.cabinet_id)
+
+
+@receiver(post_delete, sender=Associate)
+def associate_deleted(sender, instance, **kwargs):
+    """Detach the events of a nurse who left their cabinet."""
+    move_events_to_cabinet(instance.user_id, None)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleting(sender, instance, **kwargs):
+    """Keep the cabinet days of the visits of a nurse before the cascade."""
+    instance.agenda_visits = list(
+        Event.objects.filter(user_id=instance.id, cabinet_id__isnull=False)
+        .values_list("cabinet_id", "date")
+        .distinct()
+    )
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    """Recount the cabinet days of the visits deleted with a nurse."""
+    visits = getattr(instance, "agenda_visits", [])
+    for cabinet_id in {cabinet_id for cabinet_id, _ in visits}:
+        DailyVisitCount.objects.refresh(
+            cabinet_id, [date for cabinet, date in visits if cabinet == cabinet_id]
+        )
+        invalidate_cabinet_calendars(cabinet_id)
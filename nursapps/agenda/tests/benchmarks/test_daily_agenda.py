@@ -0,0 +1,82 @@
+"""Benchmark daily agenda module."""
+import logging
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from django.test import TestCase, tag
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+
+from nursapps.agenda.models import Event, Events
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+@tag("benchmark")
+class BenchmarkDailyAgenda(TestCase):
+    """Benchmark the daily agenda of a busy cabinet day."""
+
+    number_of_visits = 64
+    runs = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed a cabinet day with a visit on almost every slot."""
+        cls.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        cls.bob = User.objects.create_user(
+            username="bob", email="bob@bebo.com", password="poufpouf"
+        )
+        cls.bill.is_cabinet_owner = True
+        cls.bill.save()
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=cls.bill.id)
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=cls.bob.id)
+
+        events = Events.objects.create()
+        cls.day = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
+        Event.objects.bulk_create(
+            Event(
+                name=f"Client n{index}",
+                care_address=f"{index} rue du chemin",
+                cares="AC, INJ",
+                user_id=(cls.bill, cls.bob)[index % 2].id,
+                cabinet_id=cabinet.id,
+                events_id=events.id,
+                date=cls.day + timedelta(minutes=15 * index),
+            )
+            for index in range(cls.number_of_visits)
+        )
+
+    def test_daily_agenda_render_time(self):
+        """Measure the daily agenda response time with 64 visits."""
+        client = Client()
+        client.force_login(self.bill)
+        url = reverse(
+            "nurse:daily_agenda", args=[self.day.year, self.day.month, self.day.day]
+        )
+
+        timings = []
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - start)
+
+        content = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        for index in range(self.number_of_visits):
+            self.assertIn(f"Client n{index} ", content)
+        logger.info(
+            "daily agenda, %s visits: median %.1f ms, max %.1f ms over %s runs",
+            self.number_of_visits,
+            statistics.median(timings) * 1000,
+            max(timings) * 1000,
+            self.runs,
+        )
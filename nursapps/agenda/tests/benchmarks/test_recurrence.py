@@ -0,0 +1,52 @@
+"""Benchmark agenda recurrence module."""
+import logging
+import statistics
+import time
+from datetime import datetime
+
+from django.test import SimpleTestCase, tag
+
+from nursapps.agenda.recurrence import Recurrence
+from nursapps.agenda.tests.unit_tests.test_recurrence import legacy_dates
+
+
+logger = logging.getLogger(__name__)
+
+
+@tag("benchmark")
+class BenchmarkRecurrence(SimpleTestCase):
+    """Benchmark the expansion of the form rules."""
+
+    runs = 200
+    rules = [
+        (datetime(2022, 1, 3, 6, 0), 30, 1, 1, 0, ""),
+        (datetime(2022, 1, 3, 6, 0), 30, 3, 2, 6, ""),
+        (datetime(2022, 1, 3, 6, 0), 30, 1, 1, 0, "0, 2, 4"),
+        (datetime(2022, 1, 3, 6, 0), 30, 3, 1, 6, "0, 2, 4"),
+    ]
+
+    def measure(self, expand) -> list:
+        """Return the timings of the expansion of every rule."""
+        timings = []
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            for rule in self.rules:
+                list(expand(*rule))
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def test_expansion_time(self):
+        """Measure the expansion time of 30 days series against the former one."""
+        engine = self.measure(Recurrence)
+        legacy = self.measure(legacy_dates)
+
+        for rule in self.rules:
+            self.assertTrue(list(Recurrence(*rule)))
+        logger.info(
+            "recurrence, %s rules of 30 days: median %.3f ms, "
+            "former branches median %.3f ms over %s runs",
+            len(self.rules),
+            statistics.median(engine) * 1000,
+            statistics.median(legacy) * 1000,
+            self.runs,
+        )
@@ -0,0 +1,43 @@
+"""Agenda test cases module."""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from nursapps.agenda.models import Event
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+User = get_user_model()
+
+
+def daily(first, number_of_days) -> list:
+    """Return the dates of a visit a day from first."""
+    return [first + timedelta(days=day) for day in range(number_of_days)]
+
+
+class SeriesTestCase(TestCase):
+    """A nurse of a cabinet and the series of their visits."""
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=self.user.id)
+        # Warm the membership cache so the series of a test run the same queries.
+        Associate.objects.get_membership(self.user.id)
+
+    def series(self, dates, **fields) -> tuple:
+        """Create a series of visits of the nurse, return its parent and visits."""
+        fields = {
+            "name": "Client n1",
+            "care_address": "1 rue du chemin",
+            "cares": "AB",
+            "user_id": self.user.id,
+            **fields,
+        }
+        return Event.create_series(dates, **fields)
@@ -0,0 +1,41 @@
+"""Test the benchmark of the views."""
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from nursapps.agenda import benchmark
+from nursapps.agenda.models import Event
+
+
+class TestBenchmark(TestCase):
+    """Test the benchmark seeds the cabinets and measures every view."""
+
+    def test_seed(self):
+        """Test every nurse gets their visits, in series of a week."""
+        nurses = benchmark.seed(2, 3, 10, benchmark.datetime(2030, 1, 1))
+
+        self.assertEqual(len(nurses), 6)
+        for nurse in nurses:
+            visits = Event.objects.filter(user=nurse)
+            self.assertEqual(visits.count(), 10)
+            self.assertEqual(visits.values("events").distinct().count(), 2)
+
+    def test_run(self):
+        """Test the report gives the latencies and queries of every view."""
+        report = benchmark.run(1, 2, 10, runs=2)
+
+        self.assertEqual(set(report["views"]), set(benchmark.VIEWS))
+        for measures in report["views"].values():
+            self.assertEqual(set(measures), {"cold", "warm"})
+            for measure in measures.values():
+                self.assertLessEqual(measure["p50_ms"], measure["p95_ms"])
+                self.assertGreater(measure["queries"], 0)
+        # Every view is run 5 times: 5 series of 3 days created, 5 visits
+        # moved, 5 deleted.
+        self.assertEqual(Event.objects.count(), 2 * 10 + 5 * 3 - 5)
+        self.assertEqual(Event.objects.filter(name="Client bench").count(), 5 * 3 + 5)
+
+    def test_command_needs_enough_visits(self):
+        """Test the command refuses too few visits for the runs."""
+        with self.assertRaises(CommandError):
+            call_command("benchmark", events=10, runs=5)
@@ -0,0 +1,131 @@
+"""Test agenda concurrent writes."""
+import threading
+from datetime import datetime
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.contrib.auth import get_user_model
+
+from nursapps.agenda.models import DailyVisitCount, Event
+from nursapps.cabinet.models import Associate, Cabinet
+from nursapps.transactions import serializable
+
+
+User = get_user_model()
+
+
+class SerializationFailure(Exception):
+    """Stand-in for the psycopg2 error of an aborted transaction."""
+
+    pgcode = "40001"
+
+
+class TestSerializable(TransactionTestCase):
+    """Test the serializable transactions of the write operations."""
+
+    def test_isolation_level(self):
+        """Test the transaction is serializable and the connection is not."""
+
+        @serializable
+        def isolation_level():
+            with connection.cursor() as cursor:
+                cursor.execute("SHOW transaction_isolation")
+                return cursor.fetchone()[0]
+
+        self.assertEqual(isolation_level(), "serializable")
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW transaction_isolation")
+            self.assertEqual(cursor.fetchone()[0], "read committed")
+
+    @patch("nursapps.transactions.time.sleep")
+    def test_serialization_failures_are_retried(self, sleep):
+        """Test an aborted transaction is run again, a bounded number of times."""
+        calls = []
+
+        @serializable(attempts=3)
+        def aborted():
+            calls.append(1)
+            raise OperationalError("could not serialize") from SerializationFailure()
+
+        with self.assertRaises(OperationalError):
+            aborted()
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_other_errors_are_not_retried(self):
+        """Test an error other than an aborted transaction goes up at once."""
+        calls = []
+
+        @serializable
+        def failing():
+            calls.append(1)
+            raise OperationalError("connection lost")
+
+        with self.assertRaises(OperationalError):
+            failing()
+
+        self.assertEqual(len(calls), 1)
+
+
+class TestConcurrentWrites(TransactionTestCase):
+    """Test concurrent writes on the same cabinet day."""
+
+    threads = 8
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        cabinet = Cabinet.objects.create(name="cabbill")
+        self.users = []
+        for index in range(self.threads):
+            user = User.objects.create_user(
+                username=f"bill{index}",
+                email=f"bill{index}@bool.com",
+                password="poufpouf",
+            )
+            Associate.objects.create(cabinet_id=cabinet.id, user_id=user.id)
+            self.users.append(user)
+
+    def test_same_cabinet_day(self):
+        """Test every nurse of a cabinet can book the same day concurrently.
+
+        Every write recounts the visits of the day: the transactions that
+        PostgreSQL aborts are run again instead of failing.
+        """
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def book(index):
+            try:
+                event = Event(
+                    name=f"Client n{index}",
+                    care_address="1 rue du chemin",
+                    cares="AC",
+                    date=datetime(2022, 1, 3, 8 + index, 0),
+                )
+                barrier.wait()
+                event.create_events(user_id=self.users[index].id)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=book, args=(index,))
+            for index in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Event.objects.count(), self.threads)
+        self.assertEqual(
+            DailyVisitCount.objects.get(day=datetime(2022, 1, 3).date()).total,
+            self.threads,
+        )
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(), [])
@@ -0,0 +1,96 @@
+"""Test the agenda generator."""
+import random
+from datetime import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from nursapps.agenda import generator
+from nursapps.agenda.models import DailyVisitCount, Event, Events
+from nursapps.agenda.recurrence import Recurrence, is_day_slot
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+class TestGenerator(TestCase):
+    """Test the generated schedules respect the agenda rules."""
+
+    start = datetime(2030, 1, 1)
+    end = datetime(2030, 3, 1)
+
+    def generate(self, seed=0, prefix="gen"):
+        """Generate 2 months of a cabinet of 3 nurses, return the cabinet id."""
+        ((cabinet_id, nurse_ids),) = generator.create_cabinets(1, 3, prefix)
+        generator.generate(
+            random.Random(seed), cabinet_id, nurse_ids, self.start, self.end, 15, 500
+        )
+        return cabinet_id
+
+    def test_visits_follow_the_agenda_rules(self):
+        """Test the visits are on the grid, in the window, of the cabinet nurses."""
+        cabinet_id = self.generate()
+        visits = Event.objects.filter(cabinet_id=cabinet_id)
+        nurse_ids = set(
+            Associate.objects.filter(cabinet_id=cabinet_id).values_list(
+                "user_id", flat=True
+            )
+        )
+        cares = set(generator.CARES)
+
+        self.assertGreater(visits.count(), 1000)
+        for visit in visits:
+            self.assertTrue(is_day_slot(visit.date))
+            self.assertTrue(self.start <= visit.date < self.end)
+            self.assertEqual(visit.date.minute % 15, 0)
+            self.assertIn(visit.user_id, nurse_ids)
+            self.assertLessEqual(set(visit.cares.split(", ")), cares)
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(cabinet_id), [])
+
+    def test_plans_are_mixed(self):
+        """Test weekly plans and plans of several visits a day are generated."""
+        cabinet_id = self.generate()
+        visits = Event.objects.filter(cabinet_id=cabinet_id)
+
+        self.assertTrue(visits.filter(day_per_week__gt="").exists())
+        self.assertTrue(visits.filter(total_visit_per_day__gt=1).exists())
+        # The stored fields of a series compile back into its visits.
+        for series in Events.objects.filter(event__cabinet_id=cabinet_id).distinct():
+            visits = list(series.event_set.order_by("date"))
+            self.assertEqual(
+                list(Recurrence.from_event(visits[0])),
+                [visit.date for visit in visits],
+            )
+
+    def test_generation_is_reproducible(self):
+        """Test a same seed generates the same schedules."""
+        first = Event.objects.filter(cabinet_id=self.generate(1, "first"))
+        second = Event.objects.filter(cabinet_id=self.generate(1, "second"))
+
+        self.assertEqual(
+            list(first.order_by("date").values_list("date", "cares")),
+            list(second.order_by("date").values_list("date", "cares")),
+        )
+
+    def test_command_fills_an_existing_cabinet(self):
+        """Test the command keeps the visits already booked in a cabinet."""
+        cabinet_id = self.generate()
+        before = Event.objects.filter(cabinet_id=cabinet_id).count()
+
+        call_command(
+            "generate_agenda",
+            f"--cabinet={cabinet_id}",
+            "--start=2030-01-01",
+            "--months=2",
+            stdout=StringIO(),
+        )
+
+        self.assertGreater(Event.objects.filter(cabinet_id=cabinet_id).count(), before)
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(cabinet_id), [])
+
+    def test_command_refuses_existing_names(self):
+        """Test the command does not create cabinets with taken names."""
+        Cabinet.objects.create(name="gen0")
+
+        with self.assertRaises(CommandError):
+            call_command("generate_agenda", cabinets=2, stdout=StringIO())
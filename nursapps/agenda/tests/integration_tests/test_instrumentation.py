@@ -0,0 +1,75 @@
+"""Test the request instrumentation on the agenda views."""
+import json
+from datetime import datetime
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import Client, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from nursapps.agenda.models import Event
+from nursapps.cabinet.models import Associate, Cabinet
+from nursapps.instrumentation import InstrumentationMiddleware
+
+
+User = get_user_model()
+
+now = datetime.now()
+
+
+class TestInstrumentation(TestCase):
+    """Test the per request SQL, template and total times."""
+
+    def setUp(self):
+        """Set Up."""
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+        Event.objects.create(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            date=datetime(now.year, now.month, 2, 9, 0),
+        )
+        self.url = reverse("nurse:daily_agenda", args=[now.year, now.month, 2])
+
+    def client_for_bill(self) -> Client:
+        """Return a client logged in, built after the settings overrides."""
+        client = Client()
+        client.force_login(self.bill)
+        return client
+
+    @override_settings(REQUEST_INSTRUMENTATION=True)
+    def test_log_line(self):
+        """Test a JSON line is logged per request, keyed by URL name."""
+        client = self.client_for_bill()
+
+        with self.assertLogs("nursapps.instrumentation", "INFO") as logs:
+            response = client.get(self.url)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "nurse:daily_agenda")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+        self.assertGreaterEqual(record["total_ms"], record["template_ms"])
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(
+        REQUEST_INSTRUMENTATION=True, REQUEST_INSTRUMENTATION_HEADER=True
+    )
+    def test_debug_header(self):
+        """Test the times are sent in a Server-Timing header on demand."""
+        with self.assertLogs("nursapps.instrumentation", "INFO"):
+            response = self.client_for_bill().get(self.url)
+
+        self.assertIn("sql;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+    def test_disabled(self):
+        """Test the middleware leaves the chain when it is disabled."""
+        with self.assertRaises(MiddlewareNotUsed):
+            InstrumentationMiddleware(lambda request: None)
@@ -0,0 +1,102 @@
+"""Test the data steps of the agenda migrations."""
+from datetime import datetime
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrate the agenda back to a migration, and forward again after."""
+
+    def tearDown(self):
+        """Tear Down."""
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes("agenda"))
+
+    def migrate(self, name):
+        """Migrate the agenda to a migration, return the apps of its state."""
+        executor = MigrationExecutor(connection)
+        executor.migrate([("agenda", name)])
+        executor.loader.build_graph()
+        return executor.loader.project_state([("agenda", name)]).apps
+
+    def nurse(self, apps, name):
+        """Create a nurse of a cabinet, return the user and cabinet ids."""
+        user = apps.get_model("nursauth", "User").objects.create(
+            username=name, email=f"{name}@bool.com"
+        )
+        cabinet = apps.get_model("cabinet", "Cabinet").objects.create(name=f"cab{name}")
+        apps.get_model("cabinet", "Associate").objects.create(
+            user_id=user.id, cabinet_id=cabinet.id
+        )
+        return user.id, cabinet.id
+
+
+class TestUniqueCabinetSlot(MigrationTestCase):
+    """Test the slots booked twice are resolved before the constraint."""
+
+    def test_double_bookings_stop_the_migration(self):
+        """Test the slots booked twice are listed and no visit is changed."""
+        apps = self.migrate("0007_events_virtual_series")
+        Event = apps.get_model("agenda", "Event")
+        user_id, cabinet_id = self.nurse(apps, "bill")
+        slot = datetime(2022, 1, 3, 9, 0)
+        first, second, other = (
+            Event.objects.create(
+                name="Client n1",
+                care_address="1 rue du chemin",
+                cares="AC",
+                user_id=user_id,
+                cabinet_id=cabinet_id,
+                date=date,
+            )
+            for date in (slot, slot, datetime(2022, 1, 3, 10, 0))
+        )
+
+        with self.assertRaisesMessage(
+            RuntimeError,
+            f"cabinet {cabinet_id} at 2022-01-03 09:00: events {first.id}, {second.id}",
+        ):
+            self.migrate("0008_event_unique_cabinet_slot")
+
+        self.assertEqual(
+            dict(Event.objects.values_list("id", "cabinet_id")),
+            {first.id: cabinet_id, second.id: cabinet_id, other.id: cabinet_id},
+        )
+        second.delete()
+        self.migrate("0008_event_unique_cabinet_slot")
+
+
+class TestRebuildDailyVisitCounts(MigrationTestCase):
+    """Test the counters of the visits stored before them are built."""
+
+    def test_counters_are_built(self):
+        """Test every cabinet day gets its number of visits."""
+        apps = self.migrate("0009_event_events_version")
+        Event = apps.get_model("agenda", "Event")
+        user_id, cabinet_id = self.nurse(apps, "bill")
+        for hour in (9, 10):
+            Event.objects.create(
+                name="Client n1",
+                care_address="1 rue du chemin",
+                cares="AC",
+                user_id=user_id,
+                cabinet_id=cabinet_id,
+                date=datetime(2022, 1, 3, hour, 0),
+            )
+        Event.objects.create(
+            name="Client n2",
+            care_address="2 rue du chemin",
+            cares="AC",
+            user_id=user_id,
+            date=datetime(2022, 1, 4, 9, 0),
+        )
+
+        apps = self.migrate("0010_rebuild_daily_visit_counts")
+        DailyVisitCount = apps.get_model("agenda", "DailyVisitCount")
+
+        self.assertEqual(
+            list(DailyVisitCount.objects.values_list("cabinet_id", "day", "total")),
+            [(cabinet_id, datetime(2022, 1, 3).date(), 2)],
+        )
@@ -0,0 +1,111 @@
+"""Test the on demand profiling of the agenda views."""
+import json
+import pstats
+import tempfile
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from nursapps.agenda.models import Event
+from nursapps.cabinet.models import Associate, Cabinet
+from nursapps.profiling import PROFILE_SALT, ProfilingMiddleware, profiling_token
+
+
+User = get_user_model()
+
+now = datetime.now()
+
+
+class TestProfiling(TestCase):
+    """Test a request is profiled only when it asks for it and may."""
+
+    def setUp(self):
+        """Set Up."""
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+        Event.objects.create(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            date=datetime(now.year, now.month, 2, 9, 0),
+        )
+        self.url = reverse("nurse:daily_agenda", args=[now.year, now.month, 2])
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(
+            REQUEST_PROFILING=True, REQUEST_PROFILING_DIR=self.directory
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = Client()
+        self.client.force_login(self.bill)
+
+    def test_signed_header(self):
+        """Test a signed header dumps the stats and logs the agenda hot spots."""
+        with self.assertLogs("nursapps.profiling", "INFO") as logs:
+            response = self.client.get(self.url, HTTP_X_PROFILE=profiling_token())
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "nurse:daily_agenda")
+        self.assertEqual(response["X-Profile"], Path(record["profile"]).name)
+        stats = pstats.Stats(record["profile"])
+        self.assertGreater(stats.total_calls, 0)
+        self.assertTrue(record["hot"])
+        self.assertTrue(
+            all("nursapps/agenda/" in hot["function"] for hot in record["hot"])
+        )
+        self.assertIn("views.py", record["hot"][0]["function"])
+
+    def test_bad_or_expired_header(self):
+        """Test a forged or expired header is not profiled."""
+        expired = signing.TimestampSigner(salt=PROFILE_SALT).sign("profile")
+
+        with override_settings(REQUEST_PROFILING_TOKEN_AGE=-1):
+            response = self.client.get(self.url, HTTP_X_PROFILE=expired)
+        self.assertNotIn("X-Profile", response)
+
+        response = self.client.get(self.url, HTTP_X_PROFILE="profile:forged")
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_staff_flag(self):
+        """Test the query flag profiles the requests of the staff only."""
+        response = self.client.get(self.url, {"profile": ""})
+        self.assertNotIn("X-Profile", response)
+
+        self.bill.is_staff = True
+        self.bill.save()
+        with self.assertLogs("nursapps.profiling", "INFO"):
+            response = self.client.get(self.url, {"profile": ""})
+        self.assertTrue((self.directory / response["X-Profile"]).exists())
+
+    def test_token_command(self):
+        """Test the command prints a header the middleware accepts."""
+        stdout = StringIO()
+        call_command("profiling_token", stdout=stdout, stderr=StringIO())
+        header, token = stdout.getvalue().strip().split(": ")
+
+        self.assertEqual(header, "X-Profile")
+        with self.assertLogs("nursapps.profiling", "INFO"):
+            response = self.client.get(self.url, HTTP_X_PROFILE=token)
+        self.assertIn("X-Profile", response)
+
+    def test_disabled(self):
+        """Test the middleware leaves the chain when it is disabled."""
+        with override_settings(REQUEST_PROFILING=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
@@ -0,0 +1,269 @@
+"""Test the query budgets of the views."""
+from datetime import datetime, timedelta
+from itertools import product
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from nursapps.agenda.models import DailyVisitCount, Event, Events
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+User = get_user_model()
+
+now = datetime.now()
+
+# A cabinet day has 68 slots, 06:00 - 22:45: 60 visits is a full day.
+VISITS_PER_DAY = (1, 10, 60)
+ASSOCIATES = (2, 10)
+
+# Maximum number of queries of a view, whatever the size of the cabinet. The
+# agenda reads and the slot checks include one query on the virtual series.
+BUDGETS = {
+    "main_agenda": 5,
+    "daily_agenda": 5,
+    "new_event": 3,
+    "create_events": 16,
+    "edit_event": 6,
+    "update_events": 22,
+    "del_event_form": 3,
+    "del_event": 17,
+    "profile": 10,
+}
+
+
+class QueryBudgetTestCase(TestCase):
+    """Seed cabinets of growing sizes and count the queries of a request."""
+
+    day = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed a cabinet of every size, keep a nurse of each."""
+        cls.nurses = {
+            (associates, visits_per_day): cls.seed(associates, visits_per_day)
+            for associates, visits_per_day in product(ASSOCIATES, VISITS_PER_DAY)
+        }
+
+    @staticmethod
+    def seed(associates, visits_per_day):
+        """Create a cabinet, its nurses and a month of visits, return a nurse.
+
+        The visits of every day of the month are split between the nurses,
+        one series per nurse and day.
+        """
+        cabinet = Cabinet.objects.create(name=f"c{associates}-{visits_per_day}")
+        users = []
+        for index in range(associates):
+            user = User.objects.create_user(
+                username=f"{cabinet.name}-{index}",
+                email=f"{cabinet.name}-{index}@bool.com",
+                password="poufpouf",
+                is_cabinet_owner=index == 0,
+            )
+            Associate.objects.create(cabinet_id=cabinet.id, user_id=user.id)
+            users.append(user)
+
+        slots = [
+            datetime(now.year, now.month, 1, 6, 0) + timedelta(minutes=15 * slot)
+            for slot in range(visits_per_day)
+        ]
+        events = []
+        for day in range(28):
+            for index, user in enumerate(users):
+                series = Events.objects.create()
+                events += [
+                    Event(
+                        events=series,
+                        user_id=user.id,
+                        cabinet_id=cabinet.id,
+                        name="Client",
+                        care_address="1 rue du chemin",
+                        cares="AC",
+                        date=slot + timedelta(days=day),
+                    )
+                    for slot in slots[index::associates]
+                ]
+        Event.objects.bulk_create(events, batch_size=1000)
+        DailyVisitCount.objects.rebuild(cabinet.id)
+        return users[0]
+
+    def count_queries(self, user, method, url, data=None) -> int:
+        """Return the number of queries of a request of a nurse, cold caches."""
+        client = Client()
+        client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def assert_budget(self, name, request):
+        """Assert a request stays in its budget on every size of cabinet.
+
+        request(user) returns the number of queries of the request of a
+        nurse of a seeded cabinet.
+        """
+        counts = {size: request(user) for size, user in self.nurses.items()}
+        for size, count in counts.items():
+            with self.subTest(view=name, size=size):
+                self.assertLessEqual(
+                    count,
+                    BUDGETS[name],
+                    f"{name} went over its budget of {BUDGETS[name]} queries, "
+                    f"queries per (associates, visits per day): {counts}",
+                )
+
+
+class TestQueryBudgets(QueryBudgetTestCase):
+    """Test the views run a bounded number of queries."""
+
+    def visit(self, user):
+        """Return the first visit of the nurse on the tested day."""
+        return (
+            Event.objects.filter(user=user, date__day=self.day).order_by("date").first()
+        )
+
+    def test_month_view(self):
+        """Test the month view."""
+        self.assert_budget(
+            "main_agenda",
+            lambda user: self.count_queries(
+                user, "get", reverse("nurse:main_agenda", args=[now.year, now.month])
+            ),
+        )
+
+    def test_day_view(self):
+        """Test the day view."""
+        self.assert_budget(
+            "daily_agenda",
+            lambda user: self.count_queries(
+                user,
+                "get",
+                reverse("nurse:daily_agenda", args=[now.year, now.month, self.day]),
+            ),
+        )
+
+    def test_create_form(self):
+        """Test the new event form."""
+        self.assert_budget(
+            "new_event",
+            lambda user: self.count_queries(
+                user,
+                "get",
+                reverse(
+                    "nurse:new_event", args=[now.year, now.month, self.day, "23:00"]
+                ),
+            ),
+        )
+
+    def test_create(self):
+        """Test the creation of a 3 days series on free slots."""
+        self.assert_budget(
+            "create_events",
+            lambda user: self.count_queries(
+                user,
+                "post",
+                reverse(
+                    "nurse:new_event", args=[now.year, now.month, self.day, "22:45"]
+                ),
+                {
+                    "name": "Client n2",
+                    "care_address": "2 rue du chemin",
+                    "cares": ["AC"],
+                    "date": f"{self.day}/{now.month:02}/{now.year} 22:45",
+                    "total_visit_per_day": 1,
+                    "delta_visit_per_hour": 0,
+                    "delta_visit_per_day": 1,
+                    "number_of_days": 3,
+                },
+            ),
+        )
+
+    def edit_url(self, visit) -> str:
+        """Return the edit url of a visit."""
+        return reverse(
+            "nurse:edit_event",
+            args=[
+                now.year,
+                now.month,
+                self.day,
+                visit.date.strftime("%H:%M"),
+                visit.id,
+            ],
+        )
+
+    def test_edit_form(self):
+        """Test the edit form."""
+        self.assert_budget(
+            "edit_event",
+            lambda user: self.count_queries(
+                user, "get", self.edit_url(self.visit(user))
+            ),
+        )
+
+    def test_edit(self):
+        """Test the move of a visit to a free slot."""
+
+        def edit(user):
+            visit = self.visit(user)
+            return self.count_queries(
+                user,
+                "post",
+                self.edit_url(visit),
+                {
+                    "name": "Client n2",
+                    "care_address": "1 rue du chemin",
+                    "cares": ["AC"],
+                    "date": f"{self.day}/{now.month:02}/{now.year} 22:45",
+                    "total_visit_per_day": 1,
+                    "delta_visit_per_hour": 0,
+                    "delta_visit_per_day": 1,
+                    "number_of_days": 1,
+                    "choice_event_edit": "thisone",
+                },
+            )
+
+        self.assert_budget("update_events", edit)
+
+    def del_url(self, visit) -> str:
+        """Return the delete url of a visit."""
+        return reverse(
+            "nurse:del_event",
+            args=[
+                now.year,
+                now.month,
+                self.day,
+                visit.date.strftime("%H:%M"),
+                visit.id,
+            ],
+        )
+
+    def test_delete_form(self):
+        """Test the delete confirmation page."""
+        self.assert_budget(
+            "del_event_form",
+            lambda user: self.count_queries(
+                user, "get", self.del_url(self.visit(user))
+            ),
+        )
+
+    def test_delete(self):
+        """Test the delete of a visit."""
+        self.assert_budget(
+            "del_event",
+            lambda user: self.count_queries(
+                user, "post", self.del_url(self.visit(user))
+            ),
+        )
+
+    def test_profile(self):
+        """Test the profile page, which lists the nurses of the cabinet."""
+        self.assert_budget(
+            "profile",
+            lambda user: self.count_queries(user, "get", reverse("nursauth:profile")),
+        )
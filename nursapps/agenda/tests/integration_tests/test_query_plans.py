@@ -0,0 +1,99 @@
+"""Test agenda query plans module."""
+from datetime import datetime
+
+from django.db import connection
+from django.test import TestCase, tag
+from django.contrib.auth import get_user_model
+
+from nursapps.agenda.models import Event, Events
+from nursapps.agenda.utils import day_range
+from nursapps.cabinet.models import Cabinet
+
+
+User = get_user_model()
+
+
+@tag("slow")
+class TestEventQueryPlans(TestCase):
+    """Test the day queries scan the date indexes on a large table."""
+
+    number_of_events = 1_000_000
+    number_of_users = 100
+    number_of_cabinets = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed the event table."""
+        cls.users = User.objects.bulk_create(
+            User(username=f"nurse{index}", email=f"nurse{index}@bool.com")
+            for index in range(cls.number_of_users)
+        )
+        cls.cabinets = Cabinet.objects.bulk_create(
+            Cabinet(name=f"cab{index}") for index in range(cls.number_of_cabinets)
+        )
+        events = Events.objects.create()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                # One visit per cabinet slot: the 25 cabinets share each date.
+                f"INSERT INTO {Event._meta.db_table} (user_id, cabinet_id, name, "
+                "care_address, cares, date, events_id, total_visit_per_day, "
+                "delta_visit_per_day, version) SELECT (%s::bigint[])[1 + serie %% %s], "
+                "(%s::bigint[])[1 + serie %% %s %% %s], 'Client', '1 rue du chemin',"
+                " 'AC', %s::timestamptz + (serie / %s) * interval '15 minutes', %s, 1, 1, 1 "
+                "FROM generate_series(0, %s - 1) AS serie",
+                [
+                    [user.id for user in cls.users],
+                    cls.number_of_users,
+                    [cabinet.id for cabinet in cls.cabinets],
+                    cls.number_of_users,
+                    cls.number_of_cabinets,
+                    datetime(2020, 1, 1, 6, 0),
+                    cls.number_of_cabinets,
+                    events.id,
+                    cls.number_of_events,
+                ],
+            )
+            cursor.execute(f"ANALYZE {Event._meta.db_table}")
+
+    def assertUsesIndex(self, queryset, index):
+        """Assert the queryset plan scans the index."""
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn(f"Seq Scan on {Event._meta.db_table}", plan)
+
+    def test_seeded_table_size(self):
+        """Test the event table is seeded."""
+        self.assertEqual(Event.objects.count(), self.number_of_events)
+
+    def test_cabinet_day_query_uses_index(self):
+        """Test the day query of a cabinet (daily agenda, form) uses the index."""
+        start, end = day_range(2020, 2, 3)
+        queryset = Event.objects.filter(
+            cabinet_id=self.cabinets[0].id, date__gte=start, date__lt=end
+        )
+        self.assertUsesIndex(queryset, "unique_cabinet_slot")
+
+    def test_members_day_query_uses_index(self):
+        """Test the day query of several nurses uses the index."""
+        start, end = day_range(2020, 2, 3)
+        queryset = Event.objects.filter(
+            date__gte=start,
+            date__lt=end,
+            user_id__in=[self.users[0].id, self.users[1].id],
+        )
+        self.assertUsesIndex(queryset, "event_user_date_idx")
+
+    def test_slot_check_uses_index(self):
+        """Test the slot conflict check is an indexed existence query."""
+        queryset = Event.objects.filter(
+            cabinet_id=self.cabinets[0].id, date=datetime(2020, 2, 3, 9, 0)
+        )
+        self.assertUsesIndex(queryset, "unique_cabinet_slot")
+
+    def test_user_day_query_uses_index(self):
+        """Test the day query of a nurse (create and edit views) uses the index."""
+        start, end = day_range(2020, 2, 3)
+        queryset = Event.objects.filter(
+            date__gte=start, date__lt=end, user_id=self.users[0].id
+        ).order_by("name")
+        self.assertUsesIndex(queryset, "event_user_date_idx")
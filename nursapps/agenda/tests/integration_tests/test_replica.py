@@ -0,0 +1,106 @@
+"""Test agenda reads routed to the replica."""
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from nursapps.agenda.models import Event
+from nursapps.cabinet.models import Associate, Cabinet
+from nursapps.routers import REPLICA, ReplicaRouter, _replica_reads
+
+
+User = get_user_model()
+
+now = datetime.now()
+
+
+@override_settings(REPLICA_READS=True)
+class TestReplicaReads(TransactionTestCase):
+    """Test the agenda reads go to the replica alias, the writer's excepted."""
+
+    databases = {"default", REPLICA}
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+        Event.objects.create(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            date=datetime(now.year, now.month, 2, 9, 0),
+        )
+
+        self.client = Client()
+        self.client.force_login(self.bill)
+
+    def replica_queries(self, method, url, data=None) -> list:
+        """Return the queries a request sent to the replica."""
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            getattr(self.client, method)(url, data)
+        return [query["sql"] for query in queries]
+
+    def test_daily_agenda_reads_the_replica(self):
+        """Test the visits of the day are read from the replica."""
+        queries = self.replica_queries(
+            "get", reverse("nurse:daily_agenda", args=[now.year, now.month, 2])
+        )
+
+        self.assertTrue(any(Event._meta.db_table in sql for sql in queries))
+
+    def test_autocomplete_reads_the_replica(self):
+        """Test the cabinet names are read from the replica."""
+        queries = self.replica_queries(
+            "get", reverse("cabinet:autocomplete"), {"term": "cab"}
+        )
+
+        self.assertEqual(len(queries), 1)
+
+    def test_writer_reads_the_primary(self):
+        """Test a user who just posted reads the primary, the others the replica."""
+        self.client.post(
+            reverse("nurse:new_event", args=[now.year, now.month, 3, "09:00"]),
+            {
+                "name": "Client n2",
+                "care_address": "2 rue du chemin",
+                "cares": ["AC"],
+                "date": f"03/{now.month:02}/{now.year} 09:00",
+                "total_visit_per_day": 1,
+                "delta_visit_per_hour": 0,
+                "delta_visit_per_day": 1,
+                "number_of_days": 1,
+            },
+        )
+        url = reverse("nurse:daily_agenda", args=[now.year, now.month, 3])
+
+        self.assertEqual(self.replica_queries("get", url), [])
+        self.assertEqual(Event.objects.count(), 2)
+
+        bob = User.objects.create_user(
+            username="bob", email="bob@bool.com", password="poufpouf"
+        )
+        self.client.force_login(bob)
+        self.assertTrue(self.replica_queries("get", url))
+
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        """Test the reads of a write transaction are not sent to the replica."""
+        router = ReplicaRouter()
+        reads = _replica_reads.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Event), REPLICA)
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Event), "default")
+            self.assertEqual(router.db_for_read(User), "default")
+            self.assertEqual(router.db_for_write(Event), "default")
+            self.assertEqual(router.db_for_read(Event), "default")
+        finally:
+            _replica_reads.reset(reads)
@@ -1,12 +1,15 @@
 """Test agenda views module."""
 from dateutil.parser import *
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.test import Client
 from django.urls import reverse
 
+from nursapps.agenda.idempotency import new_submission_token
 from nursapps.agenda.models import Event, Events
 from nursapps.agenda.forms import EditEventForm
 from nursapps.cabinet.models import Associate, Cabinet
@@ -276,3 +279,492 @@ class TestAgendaViews(TestCase):
         response = self.client.get("/agenda/blablablibli/")
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, "pages/404.html")
+
+
+@override_settings(AGENDA_VIRTUAL_SERIES=True)
+class TestVirtualSeriesViews(TestCase):
+    """Test the agenda views on a virtual series."""
+
+    def setUp(self):
+        """Set Up."""
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.bill.is_cabinet_owner = True
+        self.bill.save()
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+
+        self.day = datetime(now.year, now.month, 1, 8, 0)
+        event = Event(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            date=self.day,
+            total_visit_per_day=2,
+            delta_visit_per_hour=6,
+            delta_visit_per_day=1,
+            number_of_days=3,
+        )
+        event.create_events(user_id=self.bill.id)
+        self.events = event.events
+
+        self.client = Client()
+        self.client.force_login(self.bill)
+
+    def test_daily_agenda_expands_the_series(self):
+        """Test the daily agenda shows the visits of the virtual series."""
+        response = self.client.get(
+            reverse("nurse:daily_agenda", args=[now.year, now.month, 2])
+        )
+
+        slots = {
+            slot["hour"].strftime("%H:%M"): slot for slot in response.context["slots"]
+        }
+        self.assertEqual(len(slots["08:00"]["events"]), 1)
+        self.assertEqual(len(slots["14:00"]["events"]), 1)
+        self.assertEqual(
+            slots["14:00"]["url"],
+            reverse(
+                "nurse:detach_occurrence",
+                args=[
+                    str(now.year),
+                    f"{now.month:02}",
+                    "02",
+                    "14:00",
+                    self.events.id,
+                ],
+            ),
+        )
+        self.assertTrue(slots["14:00"]["detach"])
+
+    @override_settings(AGENDA_VIRTUAL_SERIES=False)
+    def test_daily_agenda_without_the_mode(self):
+        """Test the series stored as a rule are still shown once the mode is off."""
+        response = self.client.get(
+            reverse("nurse:daily_agenda", args=[now.year, now.month, 2])
+        )
+
+        self.assertEqual(len(response.context["booked_hours"]), 2)
+
+    def test_month_agenda_counts_the_series(self):
+        """Test the month calendar counts the visits of the virtual series."""
+        response = self.client.get(
+            reverse("nurse:main_agenda", args=[now.year, now.month])
+        )
+
+        self.assertIn("2 visites", response.content.decode())
+
+    def test_detach_occurrence_redirects_to_the_event(self):
+        """Test opening a visit of the series stores it and opens its form."""
+        response = self.client.post(
+            reverse(
+                "nurse:detach_occurrence",
+                args=[now.year, now.month, 2, "14:00", self.events.id],
+            )
+        )
+
+        event = Event.objects.get()
+        self.assertEqual(event.date, self.day + timedelta(days=1, hours=6))
+        self.assertRedirects(
+            response, event.get_html_url, fetch_redirect_response=False
+        )
+
+    def test_detach_occurrence_get(self):
+        """Test a GET does not store the visit."""
+        response = self.client.get(
+            reverse(
+                "nurse:detach_occurrence",
+                args=[now.year, now.month, 2, "14:00", self.events.id],
+            )
+        )
+
+        self.assertEqual(response.status_code, 405)
+        self.assertFalse(Event.objects.exists())
+
+    def test_detach_occurrence_without_visit(self):
+        """Test opening a slot without visit of the series is a 404."""
+        response = self.client.post(
+            reverse(
+                "nurse:detach_occurrence",
+                args=[now.year, now.month, 2, "09:00", self.events.id],
+            )
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestCreateEventsView(TestCase):
+    """Test the create events view on booked slots."""
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+        Event.objects.create(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            date=datetime(now.year, now.month, 2, 9, 0),
+        )
+
+        self.client = Client()
+        self.client.force_login(self.bill)
+
+    def post_series(self, day, number_of_days, submission_token=""):
+        """Post a daily series starting at 09:00 on a day of the month."""
+        return self.client.post(
+            reverse("nurse:new_event", args=[now.year, now.month, day, "09:00"]),
+            {
+                "name": "Client n2",
+                "care_address": "2 rue du chemin",
+                "cares": ["AC"],
+                "date": f"{day:02}/{now.month:02}/{now.year} 09:00",
+                "total_visit_per_day": 1,
+                "delta_visit_per_hour": 0,
+                "delta_visit_per_day": 1,
+                "number_of_days": number_of_days,
+                "submission_token": submission_token,
+            },
+        )
+
+    def test_form_carries_a_submission_token(self):
+        """Test every rendered form gets its own submission token."""
+        url = reverse("nurse:new_event", args=[now.year, now.month, 10, "09:00"])
+
+        tokens = {
+            self.client.get(url).context["form"]["submission_token"].value()
+            for _ in range(2)
+        }
+
+        self.assertEqual(len(tokens), 2)
+
+    def test_replayed_submission_writes_once(self):
+        """Test a replayed POST gets the first redirect and writes nothing."""
+        token = new_submission_token()
+
+        first = self.post_series(10, 3, token)
+        replay = self.post_series(10, 3, token)
+
+        self.assertEqual(replay.status_code, 302)
+        self.assertEqual(replay.url, first.url)
+        self.assertEqual(Events.objects.count(), 1)
+        self.assertEqual(Event.objects.count(), 4)
+
+    def test_rejected_submission_releases_its_token(self):
+        """Test a POST rejected by the form can be corrected and posted again."""
+        token = new_submission_token()
+
+        self.assertEqual(self.post_series(2, 1, token).status_code, 200)
+        self.assertEqual(self.post_series(10, 1, token).status_code, 302)
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_failed_submission_releases_its_token(self):
+        """Test a POST failing on an error can be posted again."""
+        token = new_submission_token()
+
+        with patch.object(Event, "create_events", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post_series(10, 1, token)
+
+        self.assertEqual(self.post_series(10, 1, token).status_code, 302)
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_booked_first_slot(self):
+        """Test the form rejects a booked first slot."""
+        response = self.post_series(2, 1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors["date"])
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_booked_later_slot(self):
+        """Test a series colliding on a later slot is not created."""
+        response = self.post_series(1, 2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors["date"])
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_reports_every_conflict(self):
+        """Test every booked slot of the series is reported before any write."""
+        Event.objects.create(
+            name="Client n3",
+            care_address="3 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            date=datetime(now.year, now.month, 4, 9, 0),
+        )
+
+        response = self.post_series(1, 5)
+
+        errors = " ".join(response.context["form"].errors["date"])
+        self.assertIn(f"02/{now.month:02}/{now.year} 09:00", errors)
+        self.assertIn(f"04/{now.month:02}/{now.year} 09:00", errors)
+        self.assertFalse(Events.objects.exists())
+        self.assertEqual(Event.objects.count(), 2)
+
+
+class TestSeriesViews(TestCase):
+    """Test the JSON endpoints of the series operations."""
+
+    def setUp(self):
+        """Set Up."""
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.bob = User.objects.create_user(
+            username="bob", email="bob@bool.com", password="poufpouf"
+        )
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bob.id)
+        self.events, _ = Event.create_series(
+            [datetime(2022, 1, day, 9, 0) for day in (3, 4, 5)],
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            number_of_days=3,
+        )
+
+        self.client = Client()
+        self.client.force_login(self.bill)
+
+    def post(self, operation, data):
+        """Post an operation on the series."""
+        return self.client.post(
+            reverse(f"nurse:{operation}_series", args=[self.events.id]), data
+        )
+
+    def test_shift(self):
+        """Test the shifted dates of the series are answered."""
+        response = self.post("shift", {"days": 1, "minutes": 15})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["dates"],
+            [f"2022-01-0{day}T09:15:00" for day in (4, 5, 6)],
+        )
+
+    def test_shift_off_the_grid(self):
+        """Test a shift off the quarter hour grid is rejected."""
+        response = self.post("shift", {"minutes": 10})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("minutes", response.json()["errors"])
+
+    def test_shift_into_the_night(self):
+        """Test a shift out of the agenda hours is rejected."""
+        response = self.post("shift", {"minutes": 14 * 60})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            Event.objects.filter(events=self.events).earliest("date").date,
+            datetime(2022, 1, 3, 9, 0),
+        )
+
+    def test_extend_onto_a_booked_slot(self):
+        """Test the booked slots are answered with a conflict."""
+        Event.objects.create(
+            name="Client n2",
+            care_address="2 rue du chemin",
+            cares="AC",
+            user_id=self.bob.id,
+            date=datetime(2022, 1, 6, 9, 0),
+        )
+
+        response = self.post("extend", {"count": 2})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["conflicts"], ["2022-01-06T09:00:00"])
+        self.assertEqual(Event.objects.filter(events=self.events).count(), 3)
+
+    def test_truncate(self):
+        """Test the series is truncated at the posted date."""
+        response = self.post("truncate", {"date": "04/01/2022 09:00"})
+
+        self.assertEqual(response.json()["dates"], ["2022-01-03T09:00:00"])
+
+    def test_reassign(self):
+        """Test the series is given to another nurse of the cabinet."""
+        response = self.post("reassign", {"user": self.bob.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Event.objects.filter(user=self.bob).count(), 3)
+
+    def test_series_of_another_cabinet(self):
+        """Test the series of another cabinet is not found."""
+        carl = User.objects.create_user(
+            username="carl", email="carl@bool.com", password="poufpouf"
+        )
+        Associate.objects.create(
+            cabinet_id=Cabinet.objects.create(name="cabcarl").id, user_id=carl.id
+        )
+        self.client.force_login(carl)
+
+        response = self.post("shift", {"days": 1})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_user_without_cabinet(self):
+        """Test the series are not found by a user without a cabinet."""
+        carl = User.objects.create_user(
+            username="carl", email="carl@bool.com", password="poufpouf"
+        )
+        self.client.force_login(carl)
+
+        for operation, data in (("shift", {"days": 1}), ("extend", {"count": 1})):
+            self.assertEqual(self.post(operation, data).status_code, 404)
+        self.assertEqual(
+            list(
+                Event.objects.filter(events=self.events).values_list("date", flat=True)
+            ),
+            [datetime(2022, 1, day, 9, 0) for day in (3, 4, 5)],
+        )
+
+    def test_get_is_not_allowed(self):
+        """Test the operations only answer POST requests."""
+        response = self.client.get(reverse("nurse:shift_series", args=[self.events.id]))
+
+        self.assertEqual(response.status_code, 405)
+
+
+class TestEditConflictViews(TestCase):
+    """Test the edit and delete views answer a conflict to a stale form."""
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+        self.events, created = Event.create_series(
+            [datetime(now.year, now.month, day, 9, 0) for day in (3, 4, 5)],
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            number_of_days=3,
+        )
+        self.event = created[0]
+        # Written by an associate since the forms were read.
+        Event.objects.filter(pk=self.event.id).update(version=2)
+        Events.objects.filter(pk=self.events.id).update(version=2)
+
+        self.client = Client()
+        self.client.force_login(self.bill)
+
+    def post_edit(self, version, submission_token="", hour="09:00", choice="thisone"):
+        """Post the edit form of the first visit, read at a version."""
+        return self.client.post(
+            reverse(
+                "nurse:edit_event",
+                args=[now.year, now.month, 3, "09:00", self.event.id],
+            ),
+            {
+                "name": "Client n2",
+                "care_address": "1 rue du chemin",
+                "cares": ["AC"],
+                "date": f"03/{now.month:02}/{now.year} {hour}",
+                "total_visit_per_day": 1,
+                "delta_visit_per_hour": 0,
+                "delta_visit_per_day": 1,
+                "number_of_days": 3,
+                "choice_event_edit": choice,
+                "version": version,
+                "series_version": version,
+                "submission_token": submission_token,
+            },
+        )
+
+    def test_edit_form_of_another_cabinet(self):
+        """Test the visit of another cabinet gets no edit form."""
+        url = reverse(
+            "nurse:edit_event", args=[now.year, now.month, 3, "09:00", self.event.id]
+        )
+        self.assertTrue(self.client.get(url).context["is_cabinet_event"])
+
+        bob = User.objects.create_user(
+            username="bob", email="bob@bool.com", password="poufpouf"
+        )
+        Associate.objects.create(
+            cabinet_id=Cabinet.objects.create(name="cabbob").id, user_id=bob.id
+        )
+        self.client.force_login(bob)
+        response = self.client.get(url)
+
+        self.assertFalse(response.context["is_cabinet_event"])
+        self.assertNotContains(response, "formrdv")
+
+    def test_stale_edit(self):
+        """Test a stale edit form gets a conflict and writes nothing."""
+        response = self.post_edit(1)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.context["form"].non_field_errors())
+        self.assertEqual(Event.objects.get(pk=self.event.id).name, "Client n1")
+
+    def test_failed_edit_releases_its_token(self):
+        """Test an edit failing on an error can be posted again."""
+        token = new_submission_token()
+
+        with patch.object(Event, "update_events", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post_edit(2, token)
+
+        self.assertEqual(self.post_edit(2, token).status_code, 302)
+        self.assertEqual(Event.objects.get(pk=self.event.id).name, "Client n2")
+
+    def test_edit_on_a_booked_slot(self):
+        """Test a series moved on a booked slot gets a conflict listing it."""
+        Event.objects.create(
+            name="Client n3",
+            care_address="3 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            date=datetime(now.year, now.month, 4, 10, 0),
+        )
+
+        response = self.post_edit(2, hour="10:00", choice="allevent")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(
+            f"04/{now.month:02}/{now.year} 10:00",
+            response.context["form"].errors["date"][0],
+        )
+        self.assertEqual(
+            sorted(
+                Event.objects.filter(events=self.events).values_list("date", flat=True)
+            ),
+            [datetime(now.year, now.month, day, 9, 0) for day in (3, 4, 5)],
+        )
+
+    def test_stale_delete(self):
+        """Test a stale delete form gets a conflict and deletes nothing."""
+        response = self.client.post(
+            reverse(
+                "nurse:del_event", args=[now.year, now.month, 3, "09:00", self.event.id]
+            ),
+            {"series_version": 1},
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Event.objects.filter(events=self.events).count(), 3)
+
+    def test_delete_form_carries_the_series_version(self):
+        """Test the delete form posts the version of the series it shows."""
+        response = self.client.get(
+            reverse(
+                "nurse:del_event", args=[now.year, now.month, 3, "09:00", self.event.id]
+            )
+        )
+
+        self.assertContains(response, 'name="series_version" value="2"')
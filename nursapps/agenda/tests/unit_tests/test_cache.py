@@ -0,0 +1,159 @@
+"""Test agenda cache module."""
+from datetime import datetime
+from unittest.mock import Mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from nursapps.agenda.cache import (
+    get_or_set_month_calendar,
+    invalidate_cabinet_calendars,
+)
+from nursapps.agenda.models import Event, Events
+from nursapps.cache import CabinetNamespace, Namespace, reset_stats, stats
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+User = get_user_model()
+
+
+class TestMonthCalendarCache(TestCase):
+    """Test the month calendar cache."""
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=self.bill.id)
+
+        self.events = Events.objects.create()
+        self.event = Event.objects.create(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AB, CD, EF",
+            user_id=self.bill.id,
+            events_id=self.events.id,
+            date=datetime(2022, 1, 3, 6, 0),
+        )
+
+    def cached_calendar(self, render):
+        """Return the cached calendar of january 2022."""
+        return get_or_set_month_calendar(self.cabinet.id, 2022, 1, render)
+
+    def test_calendar_is_rendered_once(self):
+        """Test the calendar is rendered once then served from the cache."""
+        render = Mock(return_value="<table></table>")
+        self.cached_calendar(render)
+        html_cal = self.cached_calendar(render)
+
+        self.assertEqual(html_cal, "<table></table>")
+        self.assertEqual(render.call_count, 1)
+
+    def test_calendar_is_scoped_by_cabinet(self):
+        """Test the calendar of a cabinet is not served to another one."""
+        render = Mock(return_value="<table></table>")
+        self.cached_calendar(render)
+        get_or_set_month_calendar(self.cabinet.id + 1, 2022, 1, render)
+
+        self.assertEqual(render.call_count, 2)
+
+    def test_invalidate_cabinet_calendars(self):
+        """Test the invalidation drops the cached calendars after the commit."""
+        render = Mock(return_value="<table></table>")
+        self.cached_calendar(render)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_cabinet_calendars(self.cabinet.id)
+        self.cached_calendar(render)
+
+        self.assertEqual(render.call_count, 2)
+
+    def test_create_events_invalidates_the_calendar(self):
+        """Test create events invalidates the calendar."""
+        render = Mock(return_value="<table></table>")
+        self.cached_calendar(render)
+        event = Event(
+            name="Client n2",
+            care_address="2 rue du chemin",
+            cares="AB",
+            date=datetime(2022, 1, 4, 6, 0),
+            number_of_days=1,
+            delta_visit_per_hour=0,
+        )
+        event.create_events(user_id=self.bill.id)
+        self.cached_calendar(render)
+
+        self.assertEqual(render.call_count, 2)
+
+    def test_update_events_invalidates_the_calendar(self):
+        """Test update events invalidates the calendar."""
+        render = Mock(return_value="<table></table>")
+        self.cached_calendar(render)
+        self.event.date = datetime(2022, 1, 3, 8, 0)
+        group_event = Event.objects.filter(events_id=self.events.id)
+        self.event.update_events(group_event, "thisone")
+        self.cached_calendar(render)
+
+        self.assertEqual(render.call_count, 2)
+
+    def test_updated_dates_in_group_invalidates_the_calendar(self):
+        """Test updated dates in group invalidates the calendar."""
+        render = Mock(return_value="<table></table>")
+        self.cached_calendar(render)
+        group_event = Event.objects.filter(events_id=self.events.id)
+        self.event.updated_dates_in_group(group_event, [datetime(2022, 1, 3, 9, 0)])
+        self.cached_calendar(render)
+
+        self.assertEqual(render.call_count, 2)
+
+    def test_delete_event_invalidates_the_calendar(self):
+        """Test delete event invalidates the calendar."""
+        render = Mock(return_value="<table></table>")
+        self.cached_calendar(render)
+        group_event = Event.objects.filter(events_id=self.events.id)
+        self.event.delete_event(group_event, "2022", "01", "03", 6, 0)
+        self.cached_calendar(render)
+
+        self.assertEqual(render.call_count, 2)
+
+
+class TestNamespaces(TestCase):
+    """Test the namespaces of the shared cache."""
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        reset_stats()
+
+    def test_keys_are_namespaced(self):
+        """Test the same key of two namespaces holds two values."""
+        Namespace("first").set((1, "a"), "first")
+        Namespace("second").set((1, "a"), "second")
+
+        self.assertEqual(Namespace("first").get((1, "a")), "first")
+        self.assertEqual(cache.get("second:1:a"), "second")
+
+    def test_hits_and_misses_are_counted(self):
+        """Test every read counts a hit or a miss of its namespace."""
+        namespace = Namespace("counted")
+        namespace.get(1)
+        namespace.set(1, None)
+        namespace.get(1)
+        namespace.get_or_set(2, lambda: "computed")
+        namespace.get_or_set(2, lambda: "computed")
+
+        self.assertEqual(stats()["counted"], {"hits": 2, "misses": 2})
+
+    def test_cabinet_keys_are_dropped_at_once(self):
+        """Test invalidating a cabinet drops its keys and only its keys."""
+        namespace = CabinetNamespace("cabinet-values")
+        namespace.set((1, "a"), "first")
+        namespace.set((2, "a"), "second")
+
+        namespace.invalidate(1)
+
+        self.assertIsNone(namespace.get((1, "a")))
+        self.assertEqual(namespace.get((2, "a")), "second")
@@ -0,0 +1,45 @@
+"""Test agenda idempotency module."""
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from nursapps.agenda.idempotency import (
+    claim_submission,
+    new_submission_token,
+    release_submission,
+)
+
+
+class TestSubmissionTokens(SimpleTestCase):
+    """Test the submission tokens of the agenda forms."""
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        self.token = new_submission_token()
+
+    def test_replay_gets_the_first_result(self):
+        """Test only the first claim of a token writes."""
+        self.assertIsNone(claim_submission(1, self.token, "/agenda/2022/1/3/"))
+        self.assertEqual(
+            claim_submission(1, self.token, "/agenda/2022/1/4/"), "/agenda/2022/1/3/"
+        )
+
+    def test_tokens_are_per_user(self):
+        """Test a token of a user does not replay for another one."""
+        claim_submission(1, self.token, "/agenda/2022/1/3/")
+
+        self.assertIsNone(claim_submission(2, self.token, "/agenda/2022/1/3/"))
+
+    def test_released_token_is_claimed_again(self):
+        """Test a token posted without writing can be posted again."""
+        claim_submission(1, self.token, "/agenda/2022/1/3/")
+        release_submission(1, self.token)
+
+        self.assertIsNone(claim_submission(1, self.token, "/agenda/2022/1/3/"))
+
+    def test_malformed_token_is_never_claimed(self):
+        """Test a missing or malformed token does not make a POST idempotent."""
+        for token in (None, "", "not a token"):
+            with self.subTest(token=token):
+                self.assertIsNone(claim_submission(1, token, "/"))
+                self.assertIsNone(claim_submission(1, token, "/"))
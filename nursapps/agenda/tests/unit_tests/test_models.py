@@ -1,18 +1,30 @@
 """Test agenda models module."""
 # import unittest.mock as mock
+from io import StringIO
 from unittest.mock import patch
 
 from dateutil.rrule import WEEKLY, rrule, SU
 from dateutil.parser import *
 from datetime import datetime, timedelta
 
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import CommandError
 from django.test import Client
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 
-from nursapps.agenda.models import Event, Events
-from nursapps.cabinet.models import Associate, Cabinet
+from nursapps.agenda.models import (
+    DailyVisitCount,
+    EditConflict,
+    Event,
+    Events,
+    SlotConflict,
+)
+from nursapps.agenda.tests.cases import SeriesTestCase, daily
+from nursapps.cabinet.models import Associate, Cabinet, MembershipConflict
 
 
 User = get_user_model()
@@ -85,6 +97,8 @@ class TestEvent(TestCase):
 
     def test_create_unique_day_at_unique_hour(self):
         """Test create unique day at unique hour."""
+        # The 06:00 slot of the cabinet is booked by the set up event.
+        self.date = datetime(2021, 12, 31, 7, 0)
         event = Event.create_unique_day_at_unique_hour(self, user_id=self.user.id)
 
         self.assertEqual(event.date, self.date)
@@ -94,18 +108,18 @@ class TestEvent(TestCase):
 
         Create two events: at 06:00 and 18:00 just one day
         The expected lenght is 2
-        Expected results: datetime(2021, 12, 31, 6, 0) & datetime(2021, 12, 31, 18, 0)
+        Expected results: datetime(2022, 1, 1, 6, 0) & datetime(2022, 1, 1, 18, 0)
         """
         self.total_visit_per_day = 2
         self.delta_visit_per_hour = 12
-        self.date = datetime(2021, 12, 31, 6, 0)
+        self.date = datetime(2022, 1, 1, 6, 0)
         event = Event.create_unique_day_with_recurence_in_it(self, user_id=self.user.id)
         event = Event.objects.filter(events_id=event.events_id).order_by("date")
         self.assertTrue(len([event.date for event in event]) == 2)
         self.assertEqual(
             [
-                datetime(2021, 12, 31, 6, 0),
-                datetime(2021, 12, 31, 18, 0),
+                datetime(2022, 1, 1, 6, 0),
+                datetime(2022, 1, 1, 18, 0),
             ],
             [event.date for event in event],
         )
@@ -334,3 +348,701 @@ class TestEventUnit(TestCase):
 
     def test_updated_dates_in_group(self):
         """Test updated dates in group."""
+
+
+class TestDailyVisitCount(TestCase):
+    """Test DailyVisitCount class."""
+
+    def setUp(self):
+        """Set Up."""
+        self.user = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=self.user.id)
+
+        self.event = Event(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AB, CD, EF",
+            date=datetime(2022, 1, 3, 6, 0),
+            total_visit_per_day=2,
+            delta_visit_per_hour=12,
+            delta_visit_per_day=1,
+            number_of_days=3,
+        )
+        self.event.create_events(user_id=self.user.id)
+
+    def counters(self) -> dict:
+        """Return the stored counters of the cabinet."""
+        return {
+            counter.day: counter.total
+            for counter in DailyVisitCount.objects.filter(cabinet=self.cabinet)
+        }
+
+    def test_create_events_counts_the_visits(self):
+        """Test create events counts the visits of each day."""
+        self.assertEqual(
+            self.counters(),
+            {
+                datetime(2022, 1, 3).date(): 2,
+                datetime(2022, 1, 4).date(): 2,
+                datetime(2022, 1, 5).date(): 2,
+            },
+        )
+
+    def test_update_events_moves_the_visit(self):
+        """Test update events moves the visit to the new day."""
+        event = Event.objects.filter(date=datetime(2022, 1, 5, 18, 0)).first()
+        event.date = datetime(2022, 1, 6, 18, 0)
+        group_event = Event.objects.filter(events_id=event.events_id)
+        event.update_events(group_event, "thisone")
+
+        self.assertEqual(self.counters()[datetime(2022, 1, 5).date()], 1)
+        self.assertEqual(self.counters()[datetime(2022, 1, 6).date()], 1)
+
+    def test_delete_event_removes_the_counters(self):
+        """Test delete event removes the counters of the deleted days."""
+        event = Event.objects.filter(date=datetime(2022, 1, 4, 6, 0)).first()
+        group_event = Event.objects.filter(events_id=event.events_id)
+        event.delete_event(group_event, "2022", "01", "04", 6, 0)
+
+        self.assertEqual(self.counters(), {datetime(2022, 1, 3).date(): 2})
+
+    def test_delete_user_removes_their_visits(self):
+        """Test the visits deleted with a nurse are uncounted."""
+        bob = User.objects.create_user(
+            username="bob", email="bob@bool.com", password="poufpouf"
+        )
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=bob.id)
+        Event.create_series(
+            [datetime(2022, 1, 3, 9, 0)],
+            name="Client n2",
+            care_address="2 rue du chemin",
+            cares="AC",
+            user_id=bob.id,
+        )
+        DailyVisitCount.objects.rebuild()
+        self.assertEqual(self.counters()[datetime(2022, 1, 3).date()], 3)
+
+        bob.delete()
+
+        self.assertEqual(self.counters()[datetime(2022, 1, 3).date()], 2)
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(), [])
+
+    def test_inconsistencies_and_rebuild(self):
+        """Test the counters out of sync are reported then rebuilt."""
+        DailyVisitCount.objects.filter(cabinet=self.cabinet).update(total=7)
+        self.assertEqual(len(DailyVisitCount.objects.inconsistencies()), 3)
+
+        self.assertEqual(DailyVisitCount.objects.rebuild(self.cabinet.id), 3)
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(), [])
+
+    def test_counts_the_visits_of_the_cabinet_column(self):
+        """Test a visit detached from the cabinet is not counted."""
+        Event.objects.filter(date=datetime(2022, 1, 3, 6, 0)).update(cabinet=None)
+
+        self.assertEqual(
+            DailyVisitCount.objects.count_events(),
+            {
+                (self.cabinet.id, datetime(2022, 1, 3).date()): 1,
+                (self.cabinet.id, datetime(2022, 1, 4).date()): 2,
+                (self.cabinet.id, datetime(2022, 1, 5).date()): 2,
+            },
+        )
+
+    def test_check_visit_counts_command(self):
+        """Test check visit counts command fails when counters are out of sync."""
+        call_command("check_visit_counts", stdout=StringIO())
+        DailyVisitCount.objects.filter(cabinet=self.cabinet).delete()
+
+        with self.assertRaises(CommandError):
+            call_command("check_visit_counts", stdout=StringIO())
+        call_command("rebuild_visit_counts", stdout=StringIO())
+        call_command("check_visit_counts", stdout=StringIO())
+
+
+class TestEventCabinet(TestCase):
+    """Test the denormalized cabinet of the events."""
+
+    def setUp(self):
+        """Set Up."""
+        self.user = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.cabinet = Cabinet.objects.create(name="cabbill")
+        self.other_cabinet = Cabinet.objects.create(name="cabbob")
+        self.associate = Associate.objects.create(
+            cabinet_id=self.cabinet.id, user_id=self.user.id
+        )
+
+        self.event = Event(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AB, CD, EF",
+            date=datetime(2022, 1, 3, 6, 0),
+            number_of_days=2,
+            delta_visit_per_hour=0,
+        )
+        self.event.create_events(user_id=self.user.id)
+
+    def test_created_events_carry_the_cabinet(self):
+        """Test the created events carry the cabinet of the nurse."""
+        self.assertEqual(
+            set(Event.objects.values_list("cabinet_id", flat=True)),
+            {self.cabinet.id},
+        )
+
+    def test_associate_changing_cabinet_moves_events_and_counters(self):
+        """Test an associate changing cabinet moves their events and counters."""
+        self.associate.cabinet = self.other_cabinet
+        self.associate.save()
+
+        self.assertEqual(
+            set(Event.objects.values_list("cabinet_id", flat=True)),
+            {self.other_cabinet.id},
+        )
+        self.assertFalse(DailyVisitCount.objects.filter(cabinet=self.cabinet).exists())
+        self.assertEqual(
+            DailyVisitCount.objects.filter(cabinet=self.other_cabinet).count(), 2
+        )
+
+    def test_associate_joining_a_booked_slot(self):
+        """Test a nurse cannot join a cabinet which booked the slots of a visit."""
+        bob = User.objects.create_user(
+            username="bob", email="bob@bool.com", password="poufpouf"
+        )
+        Associate.objects.create(cabinet_id=self.other_cabinet.id, user_id=bob.id)
+        Event.objects.create(
+            name="Client n2",
+            care_address="2 rue du chemin",
+            cares="AC",
+            user_id=bob.id,
+            cabinet_id=self.other_cabinet.id,
+            date=datetime(2022, 1, 4, 6, 0),
+        )
+        self.associate.cabinet = self.other_cabinet
+
+        with self.assertRaises(MembershipConflict) as conflict:
+            with transaction.atomic():
+                self.associate.save()
+
+        self.assertEqual(conflict.exception.dates, [datetime(2022, 1, 4, 6, 0)])
+        self.assertEqual(
+            Event.objects.filter(user=self.user, cabinet=self.cabinet).count(), 2
+        )
+
+    def test_associate_leaving_cabinet_detaches_events(self):
+        """Test an associate leaving their cabinet detaches their events."""
+        self.associate.delete()
+
+        self.assertEqual(
+            set(Event.objects.values_list("cabinet_id", flat=True)), {None}
+        )
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(), [])
+
+
+class TestCreateSeries(SeriesTestCase):
+    """Test the bulk creation of the series."""
+
+    def form_event(self, number_of_days, day=3) -> Event:
+        """Return an unsaved series of 4 visits a day every 4 hours."""
+        return Event(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AB, CD, EF",
+            date=datetime(2022, 1, day, 6, 0),
+            total_visit_per_day=4,
+            delta_visit_per_hour=4,
+            delta_visit_per_day=1,
+            number_of_days=number_of_days,
+        )
+
+    def test_create_series(self):
+        """Test create series inserts the parent and its occurrences."""
+        dates = [datetime(2022, 1, 3, 6, 0), datetime(2022, 1, 4, 6, 0)]
+        events, created = self.series(dates)
+
+        self.assertEqual(
+            list(
+                Event.objects.filter(events=events)
+                .order_by("date")
+                .values_list("date", flat=True)
+            ),
+            dates,
+        )
+        self.assertEqual(len(created), 2)
+
+    def test_create_events_query_count_does_not_grow_with_the_series(self):
+        """Test a 15 days series costs as many queries as a 2 days one."""
+        with CaptureQueriesContext(connection) as short_series:
+            self.form_event(2).create_events(user_id=self.user.id)
+        with CaptureQueriesContext(connection) as long_series:
+            self.form_event(15, day=10).create_events(user_id=self.user.id)
+
+        self.assertEqual(Event.objects.count(), 4 * 2 + 4 * 15)
+        self.assertEqual(len(long_series), len(short_series))
+
+
+@override_settings(AGENDA_VIRTUAL_SERIES=True)
+class TestVirtualSeries(TestCase):
+    """Test the virtual series, stored as a rule expanded on read."""
+
+    def setUp(self):
+        """Set Up."""
+        self.user = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=self.user.id)
+        self.event = Event(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AB, CD, EF",
+            date=datetime(2022, 1, 3, 6, 0),
+            total_visit_per_day=2,
+            delta_visit_per_hour=12,
+            delta_visit_per_day=1,
+            number_of_days=15,
+        )
+        self.event.create_events(user_id=self.user.id)
+        self.events = Events.objects.get(pk=self.event.events.id)
+
+    def day(self, day) -> list:
+        """Return the dates of the cabinet visits of a day of january 2022."""
+        start = datetime(2022, 1, day)
+        return [
+            occurrence.date
+            for occurrence in Events.objects.occurrences(
+                self.cabinet.id, start, start + timedelta(days=1)
+            )
+        ]
+
+    def test_create_events_stores_the_rule(self):
+        """Test a recurring series stores its rule instead of its visits."""
+        self.assertTrue(self.events.is_virtual)
+        self.assertEqual(Event.objects.count(), 0)
+        self.assertEqual(self.events.last_occurrence, datetime(2022, 1, 17, 18, 0))
+
+    @override_settings(AGENDA_VIRTUAL_SERIES=False)
+    def test_create_events_without_the_mode(self):
+        """Test the series are stored as events when the mode is off."""
+        self.event.create_events(user_id=self.user.id)
+
+        self.assertEqual(Event.objects.count(), 30)
+
+    def test_single_visit_is_an_event(self):
+        """Test a single visit is stored as an event."""
+        self.event.total_visit_per_day = 1
+        self.event.delta_visit_per_hour = 0
+        self.event.number_of_days = 1
+        self.event.create_events(user_id=self.user.id)
+
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_occurrences_of_a_window(self):
+        """Test only the visits of the window are expanded."""
+        self.assertEqual(
+            self.day(4), [datetime(2022, 1, 4, 6, 0), datetime(2022, 1, 4, 18, 0)]
+        )
+        self.assertEqual(self.day(18), [])
+
+    def test_occurrences_of_a_deleted_cabinet(self):
+        """Test the series of a deleted cabinet are read by no cabinet."""
+        self.cabinet.delete()
+
+        self.assertEqual(
+            Events.objects.occurrences(
+                None, datetime(2022, 1, 4), datetime(2022, 1, 5)
+            ),
+            [],
+        )
+
+    @override_settings(AGENDA_VIRTUAL_SERIES=False)
+    def test_occurrences_without_the_mode(self):
+        """Test the stored rules are still expanded once the mode is off."""
+        self.assertEqual(
+            self.day(4), [datetime(2022, 1, 4, 6, 0), datetime(2022, 1, 4, 18, 0)]
+        )
+
+    def edit(self, date, new_date, edit_choice):
+        """Detach the visit at date and move it and the series to new_date."""
+        event = self.events.detach(date)
+        event.name = "Client n2"
+        event.date = new_date
+        group_event = Event.objects.filter(events_id=event.events_id)
+        if edit_choice == "thisone_after":
+            group_event = group_event.filter(date__gte=datetime(2022, 1, new_date.day))
+        event.update_events(group_event, edit_choice)
+        return Event.objects.get(pk=event.pk)
+
+    def test_edit_all_the_series(self):
+        """Test editing all the series moves its rule with its stored visits."""
+        event = self.edit(
+            datetime(2022, 1, 4, 18, 0), datetime(2022, 1, 3, 7, 0), "allevent"
+        )
+
+        series = Events.objects.get(pk=self.events.pk)
+        self.assertEqual(series.date, datetime(2022, 1, 3, 7, 0))
+        self.assertEqual(series.name, "Client n2")
+        self.assertEqual(event.date, datetime(2022, 1, 4, 19, 0))
+        self.assertEqual(self.day(4), [datetime(2022, 1, 4, 7, 0)])
+        self.assertEqual(
+            self.day(17), [datetime(2022, 1, 17, 7, 0), datetime(2022, 1, 17, 19, 0)]
+        )
+
+    def test_edit_the_series_after(self):
+        """Test editing the next visits splits the rule at the visit day."""
+        event = self.edit(
+            datetime(2022, 1, 10, 6, 0), datetime(2022, 1, 10, 8, 0), "thisone_after"
+        )
+
+        rest = Events.objects.exclude(pk=self.events.pk).get()
+        self.assertEqual(event.events_id, rest.id)
+        self.assertEqual(event.date, datetime(2022, 1, 10, 8, 0))
+        self.assertEqual(rest.name, "Client n2")
+        self.assertEqual(Events.objects.get(pk=self.events.pk).name, "Client n1")
+        self.assertEqual(
+            self.day(9), [datetime(2022, 1, 9, 6, 0), datetime(2022, 1, 9, 18, 0)]
+        )
+        self.assertEqual(self.day(10), [datetime(2022, 1, 10, 20, 0)])
+        self.assertEqual(
+            self.day(17), [datetime(2022, 1, 17, 8, 0), datetime(2022, 1, 17, 20, 0)]
+        )
+        self.assertEqual(self.day(18), [])
+
+    def test_edit_the_series_on_a_booked_slot(self):
+        """Test the series raises and is left unchanged when a new slot is booked."""
+        Event.objects.create(
+            name="Client n3",
+            care_address="3 rue du chemin",
+            cares="AC",
+            user_id=self.user.id,
+            date=datetime(2022, 1, 11, 8, 0),
+        )
+
+        with self.assertRaises(SlotConflict) as conflict:
+            self.edit(
+                datetime(2022, 1, 10, 6, 0),
+                datetime(2022, 1, 10, 8, 0),
+                "thisone_after",
+            )
+
+        self.assertEqual(conflict.exception.dates, [datetime(2022, 1, 11, 8, 0)])
+        self.assertEqual(
+            Event.objects.get(name="Client n1").date, datetime(2022, 1, 10, 6, 0)
+        )
+        self.assertEqual(Events.objects.count(), 1)
+        self.assertEqual(
+            self.day(11), [datetime(2022, 1, 11, 6, 0), datetime(2022, 1, 11, 18, 0)]
+        )
+
+    def test_cancel_and_move(self):
+        """Test a cancelled visit is dropped and a moved one shown at its date."""
+        self.events.cancel(datetime(2022, 1, 4, 6, 0))
+        self.events.move(datetime(2022, 1, 4, 18, 0), datetime(2022, 1, 20, 9, 0))
+
+        self.assertEqual(self.day(4), [])
+        self.assertEqual(self.day(20), [datetime(2022, 1, 20, 9, 0)])
+
+    def test_detach(self):
+        """Test a detached visit becomes an event and leaves the rule."""
+        event = self.events.detach(datetime(2022, 1, 4, 18, 0))
+
+        self.assertEqual(Event.objects.get().pk, event.pk)
+        self.assertEqual(event.cabinet_id, self.cabinet.id)
+        self.assertEqual(self.day(4), [datetime(2022, 1, 4, 6, 0)])
+        self.assertEqual(self.events.detach(datetime(2022, 1, 4, 18, 0)), event)
+        self.assertIsNone(self.events.detach(datetime(2022, 1, 4, 12, 0)))
+
+    def test_delete_event_truncates_the_rule(self):
+        """Test deleting a visit and the next ones truncates the rule."""
+        event = self.events.detach(datetime(2022, 1, 10, 6, 0))
+        event.delete_event(
+            Event.objects.filter(events_id=self.events.id), 2022, 1, 10, 6, 0
+        )
+
+        self.assertEqual(Event.objects.count(), 0)
+        self.assertEqual(len(self.day(9)), 2)
+        self.assertEqual(self.day(10), [])
+        self.assertEqual(self.day(11), [])
+
+
+class TestSlotConflicts(SeriesTestCase):
+    """Test the cabinet slot conflict checks."""
+
+    def setUp(self):
+        """Set Up."""
+        super().setUp()
+        _, (self.event, self.other) = self.series(
+            [datetime(2022, 1, 3, 6, 0), datetime(2022, 1, 3, 9, 0)]
+        )
+
+    def test_is_slot_free(self):
+        """Test a slot is free unless a visit of the cabinet is booked on it."""
+        self.assertFalse(
+            Event.objects.is_slot_free(self.cabinet.id, datetime(2022, 1, 3, 6, 0))
+        )
+        self.assertTrue(
+            Event.objects.is_slot_free(self.cabinet.id, datetime(2022, 1, 3, 6, 15))
+        )
+        self.assertTrue(
+            Event.objects.is_slot_free(
+                self.cabinet.id, datetime(2022, 1, 3, 6, 0), exclude=self.event.id
+            )
+        )
+
+    def test_conflicts(self):
+        """Test the booked dates of a series are found in two queries.
+
+        One on the events, one on the virtual series, whatever the length.
+        """
+        dates = [
+            datetime(2022, 1, 3, 6, 0) + timedelta(hours=hour) for hour in range(60)
+        ]
+
+        with self.assertNumQueries(2):
+            conflicts = Event.objects.conflicts(self.cabinet.id, dates)
+
+        self.assertEqual(
+            conflicts, [datetime(2022, 1, 3, 6, 0), datetime(2022, 1, 3, 9, 0)]
+        )
+        self.assertEqual(Event.objects.conflicts(self.cabinet.id, []), [])
+
+    def test_without_cabinet(self):
+        """Test nurses without a cabinet share no slot."""
+        loner = User.objects.create_user(
+            username="lone", email="lone@bool.com", password="poufpouf"
+        )
+        Event.objects.create(
+            name="Client n2",
+            care_address="2 rue du chemin",
+            cares="AC",
+            user_id=loner.id,
+            date=datetime(2022, 1, 4, 6, 0),
+        )
+
+        self.assertTrue(Event.objects.is_slot_free(None, datetime(2022, 1, 4, 6, 0)))
+        self.assertEqual(
+            Event.objects.conflicts(None, [datetime(2022, 1, 4, 6, 0)]), []
+        )
+
+    def test_create_series_on_a_booked_slot(self):
+        """Test the unique constraint rejects a second visit on a slot."""
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Event.create_series(
+                    [datetime(2022, 1, 3, 9, 0)],
+                    name="Client n2",
+                    care_address="2 rue du chemin",
+                    cares="AB",
+                    user_id=self.user.id,
+                )
+
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_update_events_on_a_booked_slot(self):
+        """Test moving a visit on a booked slot raises and leaves it unchanged."""
+        event = Event.objects.get(pk=self.event.id)
+        event.date = datetime(2022, 1, 3, 9, 0)
+        with self.assertRaises(SlotConflict) as conflict:
+            event.update_events(Event.objects.filter(pk=event.id), "thisone")
+
+        self.assertEqual(conflict.exception.dates, [datetime(2022, 1, 3, 9, 0)])
+        self.assertEqual(
+            Event.objects.get(pk=self.event.id).date, datetime(2022, 1, 3, 6, 0)
+        )
+
+    def test_update_events_keeps_the_slot(self):
+        """Test editing a visit without moving it updates it."""
+        event = Event.objects.get(pk=self.event.id)
+        event.name = "Client n3"
+        event.update_events(Event.objects.filter(pk=event.id), "thisone")
+
+        self.assertEqual(Event.objects.get(pk=self.event.id).name, "Client n3")
+
+    def test_updated_dates_in_group_on_a_booked_slot(self):
+        """Test a group moved on a booked slot raises and is left unchanged."""
+        event = Event.objects.get(pk=self.event.id)
+        event.date = datetime(2022, 1, 3, 9, 0)
+        with self.assertRaises(SlotConflict) as conflict:
+            event.updated_dates_in_group(
+                Event.objects.filter(pk=event.id), [datetime(2022, 1, 3, 9, 0)]
+            )
+
+        self.assertEqual(conflict.exception.dates, [datetime(2022, 1, 3, 9, 0)])
+        self.assertEqual(
+            Event.objects.get(pk=self.event.id).date, datetime(2022, 1, 3, 6, 0)
+        )
+
+
+class TestSeriesUpdates(SeriesTestCase):
+    """Test the series edits run as a single update."""
+
+    def hourly_series(self, number_of_visits, day=3):
+        """Create a series of visits every hour from 06:00, return its visits."""
+        events, _ = self.series(
+            [
+                datetime(2022, 1, day, 6, 0) + timedelta(hours=hour)
+                for hour in range(number_of_visits)
+            ]
+        )
+        return Event.objects.filter(events=events).order_by("date")
+
+    def edit(self, group_event, visit, date, edit_choice):
+        """Move a visit of the group to date, as the edit form does."""
+        event = Event.objects.get(pk=group_event[visit].pk)
+        event.date = date
+        event.name = "Client n2"
+        event.update_events(
+            Event.objects.filter(events_id=event.events_id), edit_choice
+        )
+
+    def test_all_events(self):
+        """Test all the visits are shifted, the series overlapping itself."""
+        group_event = self.hourly_series(4)
+        self.edit(group_event, 0, datetime(2022, 1, 3, 7, 0), "allevent")
+
+        self.assertEqual(
+            [event.date.hour for event in group_event.all()], [7, 8, 9, 10]
+        )
+        self.assertEqual({event.name for event in group_event.all()}, {"Client n2"})
+
+    def test_this_one_and_after(self):
+        """Test the visits from the chosen day on are shifted."""
+        group_event = self.hourly_series(4)
+        Event.objects.filter(pk=group_event[0].pk).update(
+            date=datetime(2022, 1, 2, 6, 0)
+        )
+        self.edit(group_event, 1, datetime(2022, 1, 3, 8, 0), "thisone_after")
+
+        self.assertEqual(
+            [event.date for event in group_event.all()],
+            [
+                datetime(2022, 1, 2, 6, 0),
+                datetime(2022, 1, 3, 8, 0),
+                datetime(2022, 1, 3, 9, 0),
+                datetime(2022, 1, 3, 10, 0),
+            ],
+        )
+
+    def test_query_count_does_not_grow_with_the_series(self):
+        """Test a 60 visits series is edited with as many queries as 2 visits."""
+        short_group = self.hourly_series(2)
+        long_group = self.hourly_series(60, day=10)
+
+        with CaptureQueriesContext(connection) as short_edit:
+            self.edit(short_group, 0, datetime(2022, 1, 3, 7, 0), "allevent")
+        with CaptureQueriesContext(connection) as long_edit:
+            self.edit(long_group, 0, datetime(2022, 1, 10, 7, 0), "allevent")
+
+        self.assertEqual(len(long_edit), len(short_edit))
+        self.assertEqual(long_group.all()[59].date, datetime(2022, 1, 12, 18, 0))
+
+
+class TestEditVersions(SeriesTestCase):
+    """Test the edits compare the versions their form was read at."""
+
+    def setUp(self):
+        """Set Up."""
+        super().setUp()
+        self.events, _ = self.series(daily(datetime(2022, 1, 3, 6, 0), 3))
+
+    def edit(self, hour, edit_choice, version=None, series_version=None):
+        """Move the first visit to an hour, with the versions of a form."""
+        event = Event.objects.get(date=datetime(2022, 1, 3, 6, 0))
+        event.date = datetime(2022, 1, 3, hour, 0)
+        event.update_events(
+            Event.objects.filter(events=self.events),
+            edit_choice,
+            version=version,
+            series_version=series_version,
+        )
+
+    def test_current_form_is_saved(self):
+        """Test an edit read at the current versions bumps them."""
+        self.edit(7, "thisone", version=1, series_version=1)
+
+        event = Event.objects.get(date=datetime(2022, 1, 3, 7, 0))
+        self.assertEqual(event.version, 2)
+        self.assertEqual(Events.objects.get(pk=self.events.id).version, 2)
+
+    def test_stale_visit(self):
+        """Test a visit written since the form was read is not overwritten."""
+        self.edit(7, "thisone", version=1)
+
+        event = Event.objects.get(date=datetime(2022, 1, 3, 7, 0))
+        event.date = datetime(2022, 1, 3, 8, 0)
+        with self.assertRaises(EditConflict):
+            event.update_events(
+                Event.objects.filter(events=self.events), "thisone", version=1
+            )
+        self.assertTrue(Event.objects.filter(date=datetime(2022, 1, 3, 7, 0)).exists())
+
+    def test_stale_series(self):
+        """Test a group edit from a form read before a visit edit is refused."""
+        self.edit(7, "thisone", version=1, series_version=1)
+
+        event = Event.objects.get(date=datetime(2022, 1, 3, 7, 0))
+        event.date = datetime(2022, 1, 3, 9, 0)
+        with self.assertRaises(EditConflict):
+            event.update_events(
+                Event.objects.filter(events=self.events), "allevent", series_version=1
+            )
+        self.assertEqual(
+            Event.objects.filter(events=self.events, date__hour=6).count(), 2
+        )
+
+    def test_stale_delete(self):
+        """Test a delete from a stale form deletes nothing."""
+        self.edit(7, "allevent", series_version=1)
+
+        event = Event.objects.get(date=datetime(2022, 1, 4, 7, 0))
+        with self.assertRaises(EditConflict):
+            event.delete_event(
+                Event.objects.filter(events=self.events),
+                2022,
+                1,
+                4,
+                7,
+                0,
+                series_version=1,
+            )
+        self.assertEqual(Event.objects.filter(events=self.events).count(), 3)
+
+
+class TestSeriesDelete(SeriesTestCase):
+    """Test the series truncation of delete event."""
+
+    def setUp(self):
+        """Set Up."""
+        super().setUp()
+        self.events, self.created = self.series(daily(datetime(2022, 1, 3, 6, 0), 30))
+
+    def delete_from(self, day):
+        """Delete the visits of the series from a day of january 2022 on."""
+        event = Event.objects.get(date=datetime(2022, 1, day, 6, 0))
+        with CaptureQueriesContext(connection) as queries:
+            event.delete_event(
+                Event.objects.filter(events_id=self.events.id), 2022, 1, day, 6, 0
+            )
+        return [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith(f'DELETE FROM "{Event._meta.db_table}"')
+        ]
+
+    def test_following_visits_are_deleted_in_one_statement(self):
+        """Test this visit and the following are deleted by one statement."""
+        deletes = self.delete_from(10)
+
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(Event.objects.filter(events=self.events).count(), 7)
+        self.assertTrue(Events.objects.filter(pk=self.events.id).exists())
+
+    def test_empty_parent_is_deleted(self):
+        """Test the parent of the series is deleted with its last visit."""
+        self.delete_from(3)
+
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Events.objects.filter(pk=self.events.id).exists())
@@ -0,0 +1,211 @@
+"""Test agenda recurrence module."""
+from itertools import product
+
+from dateutil.rrule import WEEKLY, rrule, SU
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from nursapps.agenda.recurrence import Recurrence, is_day_slot
+
+
+def legacy_dates(
+    date,
+    number_of_days,
+    total_visit_per_day,
+    delta_visit_per_day,
+    delta_visit_per_hour,
+    day_per_week,
+) -> list:
+    """Return the dates the seven branches of the former create_events made.
+
+    Return None where the former byhour bound, an absolute hour, cut visits
+    of the day: the weekly series then spread over the following days, or
+    never ended when no hour was left.
+    """
+    n, total, dd, dh = (
+        number_of_days,
+        total_visit_per_day,
+        delta_visit_per_day,
+        delta_visit_per_hour,
+    )
+    if day_per_week:
+        week_days = tuple(int(day) for day in day_per_week.split(", "))
+        if dh:
+            by_hour = tuple(
+                range(date.hour, (dh + 1 if dh > 3 else dh + 2) * total, dh)
+            )
+            if len(by_hour) != total:
+                return None
+            return list(
+                rrule(
+                    WEEKLY,
+                    count=n * total,
+                    wkst=SU,
+                    byhour=by_hour,
+                    byweekday=week_days,
+                    dtstart=date,
+                )
+            )
+        return list(rrule(WEEKLY, count=n, wkst=SU, byweekday=week_days, dtstart=date))
+    if not dh and n < 2:
+        return [date]
+    if dd and (n == 1 or dh):
+        dates = []
+        for index in range(n):
+            dates += [
+                date + timedelta(hours=hour)
+                for hour in range(0, total * dh, dh)
+                if index + date.hour not in [0, 1, 2, 3, 4, 5, 24]
+            ]
+            date += timedelta(days=dd)
+        return dates
+    dates = [date]
+    for _ in range(0, (n - 1 if n >= 3 else n) * dd, dd):
+        date += timedelta(days=dd)
+        dates.append(date)
+    return dates[:n]
+
+
+class TestRecurrence(SimpleTestCase):
+    """Test the recurrence engine."""
+
+    def test_matches_the_former_branches(self):
+        """Test the occurrences match the former create_events branches.
+
+        The former branches let night visits through; the engine drops them.
+        """
+        for hour, n, total, dd, dh, day_per_week in product(
+            (6, 8, 13),
+            (1, 2, 3, 7),
+            (1, 2, 3),
+            (1, 2),
+            (0, 4, 6),
+            ("", "0, 2, 4"),
+        ):
+            fields = (datetime(2022, 1, 3, hour, 15), n, total, dd, dh, day_per_week)
+            legacy = legacy_dates(*fields)
+            if legacy is None:
+                continue
+            with self.subTest(fields=fields):
+                self.assertEqual(
+                    list(Recurrence(*fields)),
+                    [date for date in legacy if is_day_slot(date)],
+                )
+
+    def test_is_lazy(self):
+        """Test the occurrences are yielded on demand."""
+        occurrences = iter(
+            Recurrence(datetime(2022, 1, 3, 6, 0), number_of_days=10**9)
+        )
+
+        self.assertEqual(next(occurrences), datetime(2022, 1, 3, 6, 0))
+        self.assertEqual(next(occurrences), datetime(2022, 1, 4, 6, 0))
+
+    def test_drops_night_visits(self):
+        """Test the visits outside 06:00 - 22:45 are dropped on every rule."""
+        recurrence = Recurrence(
+            datetime(2022, 1, 3, 6, 0),
+            number_of_days=2,
+            total_visit_per_day=4,
+            delta_visit_per_hour=6,
+        )
+
+        self.assertEqual(
+            list(recurrence),
+            [
+                datetime(2022, 1, 3, 6, 0),
+                datetime(2022, 1, 3, 12, 0),
+                datetime(2022, 1, 3, 18, 0),
+                datetime(2022, 1, 4, 6, 0),
+                datetime(2022, 1, 4, 12, 0),
+                datetime(2022, 1, 4, 18, 0),
+            ],
+        )
+
+    def test_keeps_late_start_days(self):
+        """Test a late first visit does not drop whole days of the series."""
+        recurrence = Recurrence(
+            datetime(2022, 1, 3, 21, 0),
+            number_of_days=4,
+            total_visit_per_day=1,
+            delta_visit_per_hour=1,
+        )
+
+        self.assertEqual(len(list(recurrence)), 4)
+
+    def test_weekly_visits_of_a_late_first_visit(self):
+        """Test a weekly rule starting in the afternoon keeps its day visits.
+
+        The former byhour bound was empty there and the expansion never ended.
+        """
+        recurrence = Recurrence(
+            datetime(2022, 1, 3, 13, 15),
+            number_of_days=2,
+            total_visit_per_day=3,
+            delta_visit_per_hour=4,
+            day_per_week="0, 2",
+        )
+
+        self.assertEqual(
+            list(recurrence),
+            [
+                datetime(2022, 1, 3, 13, 15),
+                datetime(2022, 1, 3, 17, 15),
+                datetime(2022, 1, 3, 21, 15),
+                datetime(2022, 1, 5, 13, 15),
+                datetime(2022, 1, 5, 17, 15),
+                datetime(2022, 1, 5, 21, 15),
+            ],
+        )
+
+    def test_between_expands_the_window(self):
+        """Test the window expansion matches the filtered full expansion."""
+        for fields in (
+            (datetime(2022, 1, 3, 6, 15), 15, 3, 2, 6, ""),
+            (datetime(2022, 1, 3, 13, 0), 15, 2, 1, 4, ""),
+            (datetime(2022, 1, 3, 6, 15), 15, 1, 1, 0, "0, 2, 4"),
+            (datetime(2022, 1, 3, 6, 15), 15, 3, 1, 6, "1, 5"),
+        ):
+            recurrence = Recurrence(*fields)
+            for day in range(0, 40, 3):
+                start = datetime(2022, 1, 1) + timedelta(days=day)
+                end = start + timedelta(days=2, hours=5)
+                with self.subTest(fields=fields, start=start):
+                    self.assertEqual(
+                        list(recurrence.between(start, end)),
+                        [date for date in recurrence if start <= date < end],
+                    )
+
+    def test_between_is_lazy(self):
+        """Test a window far in a long series is found without the whole series."""
+        recurrence = Recurrence(datetime(2022, 1, 3, 6, 0), number_of_days=10**9)
+
+        self.assertEqual(
+            list(recurrence.between(datetime(3022, 1, 3), datetime(3022, 1, 4))),
+            [datetime(3022, 1, 3, 6, 0)],
+        )
+
+    def test_from_event(self):
+        """Test the rule is compiled from the event form fields."""
+        event = type(
+            "FormEvent",
+            (),
+            {
+                "date": datetime(2022, 1, 3, 6, 0),
+                "number_of_days": 3,
+                "total_visit_per_day": 1,
+                "delta_visit_per_day": 1,
+                "delta_visit_per_hour": 0,
+                "day_per_week": "0, 2, 4",
+            },
+        )
+
+        self.assertEqual(
+            list(Recurrence.from_event(event)),
+            [
+                datetime(2022, 1, 3, 6, 0),
+                datetime(2022, 1, 5, 6, 0),
+                datetime(2022, 1, 7, 6, 0),
+            ],
+        )
@@ -0,0 +1,193 @@
+"""Test agenda series module."""
+from datetime import datetime
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+from nursapps.agenda import series
+from nursapps.agenda.models import DailyVisitCount, Event, Events
+from nursapps.agenda.tests.cases import SeriesTestCase, daily
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+User = get_user_model()
+
+
+class TestSeriesOperations(SeriesTestCase):
+    """Test the operations on a whole series."""
+
+    def setUp(self):
+        """Set Up."""
+        super().setUp()
+        self.bob = User.objects.create_user(
+            username="bob", email="bob@bool.com", password="poufpouf"
+        )
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=self.bob.id)
+
+    def daily_series(self, number_of_days, day=3):
+        """Create a daily series of visits at 06:00 from a day of january 2022."""
+        events, _ = self.series(
+            daily(datetime(2022, 1, day, 6, 0), number_of_days),
+            number_of_days=number_of_days,
+        )
+        DailyVisitCount.objects.rebuild()
+        return events
+
+    def dates(self, events) -> list:
+        """Return the sorted dates of the visits of a series."""
+        return list(
+            Event.objects.filter(events=events)
+            .order_by("date")
+            .values_list("date", flat=True)
+        )
+
+    def count_queries(self, operation, *args, **kwargs) -> int:
+        """Return the number of queries of an operation."""
+        with CaptureQueriesContext(connection) as queries:
+            operation(*args, **kwargs)
+        return len(queries)
+
+    def test_shift(self):
+        """Test every visit is moved and the counters follow."""
+        events = self.daily_series(3)
+
+        series.shift(events, days=1, minutes=30)
+
+        self.assertEqual(
+            self.dates(events),
+            [datetime(2022, 1, day, 6, 30) for day in (4, 5, 6)],
+        )
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(), [])
+
+    def test_shift_onto_a_booked_slot(self):
+        """Test the series is left unchanged when a new slot is booked."""
+        events = self.daily_series(3)
+        self.series(
+            [datetime(2022, 1, 5, 7, 0)],
+            name="Client n2",
+            care_address="2 rue du chemin",
+            user_id=self.bob.id,
+        )
+
+        with self.assertRaises(series.SlotConflict) as error:
+            series.shift(events, minutes=60)
+
+        self.assertEqual(error.exception.dates, [datetime(2022, 1, 5, 7, 0)])
+        self.assertEqual(self.dates(events)[0], datetime(2022, 1, 3, 6, 0))
+
+    def test_shift_over_its_own_visits(self):
+        """Test a series can be moved onto slots it leaves."""
+        events = self.daily_series(3)
+
+        series.shift(events, days=1)
+
+        self.assertEqual(self.dates(events)[0], datetime(2022, 1, 4, 6, 0))
+
+    def test_shift_out_of_the_day(self):
+        """Test a series moved into the night is left unchanged."""
+        events = self.daily_series(3)
+
+        with self.assertRaises(series.SeriesError):
+            series.shift(events, minutes=-15)
+
+        self.assertEqual(self.dates(events)[0], datetime(2022, 1, 3, 6, 0))
+
+    def test_extend(self):
+        """Test the next visits of the rule are added after the last one."""
+        events = self.daily_series(3)
+
+        dates = series.extend(events, 2)
+
+        self.assertEqual(
+            dates, [datetime(2022, 1, 6, 6, 0), datetime(2022, 1, 7, 6, 0)]
+        )
+        self.assertEqual(len(self.dates(events)), 5)
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(), [])
+
+    def test_extend_onto_a_booked_slot(self):
+        """Test nothing is added when a new slot is booked."""
+        events = self.daily_series(3)
+        self.daily_series(1, day=7)
+
+        with self.assertRaises(series.SlotConflict):
+            series.extend(events, 2)
+
+        self.assertEqual(len(self.dates(events)), 3)
+
+    def test_truncate(self):
+        """Test the visits from the date on are dropped."""
+        events = self.daily_series(5)
+
+        series.truncate(events, datetime(2022, 1, 5, 6, 0))
+
+        self.assertEqual(len(self.dates(events)), 2)
+        self.assertEqual(DailyVisitCount.objects.inconsistencies(), [])
+
+    def test_reassign(self):
+        """Test every visit is given to another nurse of the cabinet."""
+        events = self.daily_series(3)
+
+        self.assertEqual(series.reassign(events, self.bob), 3)
+        self.assertFalse(Event.objects.filter(user=self.user).exists())
+
+    def test_reassign_outside_the_cabinet(self):
+        """Test a series is not given to a nurse of another cabinet."""
+        events = self.daily_series(3)
+        carl = User.objects.create_user(
+            username="carl", email="carl@bool.com", password="poufpouf"
+        )
+        Associate.objects.create(
+            cabinet_id=Cabinet.objects.create(name="cabcarl").id, user_id=carl.id
+        )
+
+        with self.assertRaises(series.SeriesError):
+            series.reassign(events, carl)
+
+        self.assertFalse(Event.objects.filter(user=carl).exists())
+
+    def test_constant_number_of_queries(self):
+        """Test the operations run in the same number of queries on any length."""
+        short, long = self.daily_series(2, day=1), self.daily_series(60, day=10)
+        Associate.objects.get_membership(self.bob.id)
+
+        for operation, args in (
+            (series.shift, {"days": 1}),
+            (series.extend, {"count": 3}),
+            (series.reassign, {"user": self.bob}),
+            (series.truncate, {"date": datetime(2022, 1, 2, 6, 0)}),
+        ):
+            with self.subTest(operation=operation.__name__):
+                self.assertEqual(
+                    self.count_queries(operation, short, **args),
+                    self.count_queries(
+                        operation,
+                        long,
+                        **(
+                            {"date": datetime(2022, 1, 11, 6, 0)}
+                            if operation is series.truncate
+                            else args
+                        ),
+                    ),
+                )
+
+    @override_settings(AGENDA_VIRTUAL_SERIES=True)
+    def test_virtual_series(self):
+        """Test a virtual series is truncated but not shifted."""
+        event = Event(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AB",
+            date=datetime(2022, 1, 3, 6, 0),
+            number_of_days=5,
+        )
+        event.create_events(user_id=self.user.id)
+
+        with self.assertRaises(series.SeriesError):
+            series.shift(event.events, days=1)
+        series.truncate(event.events, datetime(2022, 1, 5, 6, 0))
+
+        self.assertEqual(
+            Events.objects.get(pk=event.events.id).until, datetime(2022, 1, 5, 6, 0)
+        )
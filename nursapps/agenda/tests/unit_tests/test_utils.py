@@ -0,0 +1,140 @@
+"""Test agenda utils module."""
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from nursapps.agenda.models import DailyVisitCount, Event, Events
+from nursapps.agenda.utils import CalEvent, get_daily_slots
+from nursapps.cabinet.models import Associate, Cabinet
+
+
+User = get_user_model()
+
+
+class TestCalEvent(TestCase):
+    """Test CalEvent class."""
+
+    def setUp(self):
+        """Set Up."""
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.bob = User.objects.create_user(
+            username="bob", email="bob@bebo.com", password="poufpouf"
+        )
+        self.john = User.objects.create_user(
+            username="john", email="john@doe.com", password="poufpouf"
+        )
+
+        cabinet = Cabinet.objects.create(name="cabbill")
+        other_cabinet = Cabinet.objects.create(name="cabjohn")
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bill.id)
+        Associate.objects.create(cabinet_id=cabinet.id, user_id=self.bob.id)
+        Associate.objects.create(cabinet_id=other_cabinet.id, user_id=self.john.id)
+
+        self.events = Events.objects.create()
+        date = datetime(2022, 1, 3, 6, 0)
+
+        for user, day, hour in (
+            (self.bill, 0, 0),
+            (self.bob, 0, 1),
+            (self.bill, 2, 0),
+            (self.john, 0, 2),
+        ):
+            Event.objects.create(
+                name="Client n1",
+                care_address="1 rue du chemin",
+                cares="AB, CD, EF",
+                user_id=user.id,
+                events_id=self.events.id,
+                date=date + timedelta(days=day, hours=hour),
+            )
+        DailyVisitCount.objects.rebuild()
+
+    def test_visits_per_day_counts_only_cabinet_events(self):
+        """Test visits per day counts only the events of the cabinet."""
+        cal = CalEvent(self.bill, 2022, 1)
+        self.assertEqual(cal.visits_per_day(), {3: 2, 5: 1})
+
+    def test_formatmonth_runs_two_queries(self):
+        """Test formatmonth reads the counters and the virtual series only."""
+        cal = CalEvent(self.bill, 2022, 1)
+        with self.assertNumQueries(2):
+            html_cal = cal.formatmonth(withyear=True)
+
+        self.assertIn("2 visites", html_cal)
+        self.assertIn("1 visite<", html_cal)
+
+    def test_formatmonth_without_cabinet_shows_no_visit(self):
+        """Test formatmonth shows no visit for a user without cabinet."""
+        alone = User.objects.create_user(
+            username="alone", email="alone@bool.com", password="poufpouf"
+        )
+        cal = CalEvent(alone, 2022, 1)
+        self.assertEqual(cal.visits_per_day(), {})
+
+
+class TestGetDailySlots(TestCase):
+    """Test get daily slots function."""
+
+    def setUp(self):
+        """Set Up."""
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.bob = User.objects.create_user(
+            username="bob", email="bob@bebo.com", password="poufpouf"
+        )
+        events = Events.objects.create()
+        self.bill_event = Event.objects.create(
+            name="Client n1",
+            care_address="1 rue du chemin",
+            cares="AC",
+            user_id=self.bill.id,
+            events_id=events.id,
+            date=datetime(2022, 1, 3, 6, 15),
+        )
+        self.bob_event = Event.objects.create(
+            name="Client n2",
+            care_address="2 rue du chemin",
+            cares="INJ",
+            user_id=self.bob.id,
+            events_id=events.id,
+            date=datetime(2022, 1, 3, 6, 30),
+        )
+        self.hours = [time(6, 0), time(6, 15), time(6, 30)]
+
+    def test_one_row_per_slot(self):
+        """Test every slot gets its row with its link and visible events."""
+        slots = get_daily_slots(
+            2022,
+            1,
+            3,
+            self.hours,
+            [self.bill_event, self.bob_event],
+            self.bill.id,
+            {self.bill.id, self.bob.id},
+        )
+
+        self.assertEqual([slot["hour"] for slot in slots], self.hours)
+        self.assertEqual(
+            slots[0]["url"],
+            reverse("nurse:new_event", args=[2022, 1, 3, "06:00"]),
+        )
+        self.assertEqual(slots[1]["url"], self.bill_event.get_html_url)
+        self.assertFalse(slots[1]["detach"])
+        self.assertEqual(slots[1]["events"], [self.bill_event])
+        self.assertEqual(slots[1]["cares"], "AC")
+        self.assertEqual(slots[2]["events"], [self.bob_event])
+        self.assertEqual(slots[2]["cares"], "")
+
+    def test_events_hidden_outside_the_cabinet(self):
+        """Test the events are hidden to a user outside the cabinet."""
+        slots = get_daily_slots(
+            2022, 1, 3, self.hours, [self.bill_event], self.bob.id, {self.bill.id}
+        )
+
+        self.assertEqual(slots[1]["events"], [])
+        self.assertEqual(slots[1]["url"], "")
@@ -28,5 +28,30 @@ urlpatterns = [
         views.delete_event,
         name="del_event",
     ),
+    re_path(
+        r"^agenda/(?P<year>[0-9]{4})/(?P<month>[0-9]{1,2})/(?P<day>[0-9]{1,2})/rdv/(?P<hour>[0-9|:]{5})/series/(?P<events_id>\d+)/$",
+        views.detach_occurrence,
+        name="detach_occurrence",
+    ),
+    path(
+        "agenda/series/<int:events_id>/shift/",
+        views.shift_series,
+        name="shift_series",
+    ),
+    path(
+        "agenda/series/<int:events_id>/extend/",
+        views.extend_series,
+        name="extend_series",
+    ),
+    path(
+        "agenda/series/<int:events_id>/truncate/",
+        views.truncate_series,
+        name="truncate_series",
+    ),
+    path(
+        "agenda/series/<int:events_id>/reassign/",
+        views.reassign_series,
+        name="reassign_series",
+    ),
     # path("sentry-debug/", views.trigger_error),
 ]
@@ -7,8 +7,9 @@ from datetime import datetime, timedelta
 from calendar import HTMLCalendar
 
 from django.template.defaultfilters import pluralize
+from django.urls import reverse
 
-from nursapps.agenda.models import Event
+from nursapps.agenda.models import DailyVisitCount, Events
 from nursapps.cabinet.models import Associate
 
 
@@ -23,22 +24,27 @@ class CalEvent(HTMLCalendar):
 
         super().__init__()
 
+    def visits_per_day(self) -> dict:
+        """Return a day -> number of visits map for the cabinet of the user.
+
+        The counts are read from the daily visit counters, a single query for
+        the whole month, plus the visits of the virtual series of the month.
+        """
+        visits = DailyVisitCount.objects.for_month(self.user, self.year, self.month)
+        start = datetime(self.year, self.month, 1)
+        end = datetime(self.year + self.month // 12, self.month % 12 + 1, 1)
+        for occurrence in Events.objects.occurrences(
+            Associate.objects.get_membership(self.user).cabinet_id, start, end
+        ):
+            visits[occurrence.date.day] = visits.get(occurrence.date.day, 0) + 1
+        return visits
+
     def formatday(self, day, events) -> str:
-        """Format day."""
-        associate = Associate.objects.filter(user_id=self.user.id).first()
-        if associate:
-            associates = Associate.objects.get_associates(associate.cabinet_id)
-            associates = [associate.id for associate in associates]
-        else:
-            associates = []
+        """Format day.
 
-        event = Event.objects.filter(
-            date__year=self.year,
-            date__month=self.month,
-            date__day=day,
-            user_id__in=associates,
-        )
-        total_event = event.count()
+        events is the day -> number of visits map from visits_per_day.
+        """
+        total_event = events.get(day, 0)
 
         day_ = int(datetime.today().strftime("%d"))
         month_ = int(datetime.today().strftime("%m"))
@@ -89,7 +95,7 @@ class CalEvent(HTMLCalendar):
 
     def formatmonth(self, withyear=True) -> str:
         """Format month."""
-        events = Event.objects.filter(date__year=self.year, date__month=self.month)
+        events = self.visits_per_day()
         cal = (
             '<table class="table-cal" border="0" cellpadding="0" cellspacing="0">'
             '<tr><th class="year" colspan="7"> </th></tr>\n'
@@ -101,6 +107,16 @@ class CalEvent(HTMLCalendar):
         return cal
 
 
+def day_range(year, month, day) -> tuple:
+    """Return the [start, end) datetimes of a day.
+
+    Filtering on a half-open range keeps the date index usable, unlike the
+    date__contains or date__day lookups which cast the column.
+    """
+    start = datetime(int(year), int(month), int(day))
+    return start, start + timedelta(days=1)
+
+
 def last_day(year, month) -> int:
     """Return the last day number of the month."""
     return calendar.monthrange(year, month)[1]
@@ -202,3 +218,40 @@ def get_daily_agenda_hours():
     # adding a zero before single digit:
     hours = [str(datetime.strptime(i, "%H:%M").time())[:5] for i in hours]
     return hours
+
+
+def get_daily_slots(year, month, day, hours, events, user_id, associates) -> list:
+    """Return one row per slot of the daily agenda.
+
+    Each row carries its link (the first event or the new event form), the
+    events the user may see and the cares of their own events, so the
+    template renders every slot without looping over the events again. The
+    link of an unsaved visit of a virtual series is posted, as it detaches it.
+    """
+    events_per_hour = {}
+    for event in events:
+        events_per_hour.setdefault(event.date.strftime("%H:%M"), []).append(event)
+
+    slots = []
+    for hour in hours:
+        slot_hour = hour.strftime("%H:%M")
+        slot_events = events_per_hour.get(slot_hour, [])
+        visible_events = slot_events if user_id in associates else []
+        if not slot_events:
+            url = reverse("nurse:new_event", args=[year, month, day, slot_hour])
+        elif visible_events:
+            url = visible_events[0].get_html_url
+        else:
+            url = ""
+        slots.append(
+            {
+                "hour": hour,
+                "url": url,
+                "detach": bool(visible_events) and visible_events[0].id is None,
+                "events": visible_events,
+                "cares": ", ".join(
+                    event.cares for event in slot_events if event.user_id == user_id
+                ),
+            }
+        )
+    return slots
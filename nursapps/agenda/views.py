@@ -6,18 +6,36 @@ import locale
 
 from datetime import datetime, timedelta, date
 
+from django.db import IntegrityError
+from django.http import Http404, JsonResponse
 from django.http.response import HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.urls import reverse
 
 from django.utils.safestring import mark_safe
 
-from nursapps.agenda.forms import EditEventForm, FormEvent
-from nursapps.agenda.models import Event
+from nursapps.agenda.cache import get_or_set_month_calendar
+from nursapps.agenda import series
+from nursapps.agenda.forms import (
+    EDIT_CONFLICT_MESSAGE,
+    SLOT_TAKEN_MESSAGE,
+    EditEventForm,
+    FormEvent,
+    SeriesExtendForm,
+    SeriesReassignForm,
+    SeriesShiftForm,
+    SeriesTruncateForm,
+    slots_taken_message,
+)
+from nursapps.agenda.idempotency import claim_submission, release_submission
+from nursapps.agenda.models import EditConflict, Event, Events, SlotConflict
 from nursapps.cabinet.models import Associate
+from nursapps.routers import replica_reads
 from nursapps.agenda.utils import (
     CalEvent,
+    day_range,
     is_valid_year_month,
     is_valid_year_month,
     is_valid_year_month_day,
@@ -32,6 +50,7 @@ from nursapps.agenda.utils import (
     next_year,
     prev_year,
     get_daily_agenda_hours,
+    get_daily_slots,
 )
 
 now = datetime.now()
@@ -75,6 +94,7 @@ def index(request):
 
 
 @login_required
+@replica_reads
 def agenda(request, year, month):
     """Show the main agenda view."""
     cal = CalEvent(request.user, year, month)
@@ -84,7 +104,16 @@ def agenda(request, year, month):
             reverse("nurse:main_agenda", args=[str(now.year), str(now.month)])
         )
 
-    html_cal = cal.formatmonth(withyear=True)
+    membership = Associate.objects.get_membership(request.user)
+    if membership.cabinet:
+        html_cal = get_or_set_month_calendar(
+            membership.cabinet_id,
+            year,
+            month,
+            lambda: cal.formatmonth(withyear=True),
+        )
+    else:
+        html_cal = cal.formatmonth(withyear=True)
     pmb = prev_month_base(year, month, day=1)
     nmb = next_month_base(year, month, day=1)
 
@@ -110,25 +139,24 @@ def agenda(request, year, month):
 
 
 @login_required
+@replica_reads
 def daily_agenda(request, year, month, day):
     """Daily agenda."""
     if request.user.is_cabinet_owner or Associate.objects.is_replacment(request.user):
-        associate = Associate.objects.filter(user_id=request.user.id).first()
-        if associate:
-            associates = Associate.objects.get_associates(associate.cabinet_id)
-            associates = [associate.id for associate in associates]
+        membership = Associate.objects.get_membership(request.user)
+        associates = membership.member_ids
         if is_valid_year_month_day(year, month, day):
             hours = [
                 str(timedelta(hours=hour))[:-3] for hour in numpy.arange(6, 23, 0.25)
             ]
-            appointments_per_day = Event.objects.filter(
-                date__contains=dt.date(
-                    year,
-                    month,
-                    day,
-                ),
-                user_id__in=associates,
-            )
+            start, end = day_range(year, month, day)
+            appointments_per_day = list(
+                Event.objects.filter(
+                    cabinet_id=membership.cabinet_id,
+                    date__gte=start,
+                    date__lt=end,
+                )
+            ) + Events.objects.occurrences(membership.cabinet_id, start, end)
             booked_hours = [
                 appointment.date.strftime("%H:%M")
                 for appointment in appointments_per_day
@@ -149,8 +177,15 @@ def daily_agenda(request, year, month, day):
         "year": year,
         "month": month,
         "day": day,
-        "hours": [datetime.strptime(i, "%H:%M").time() for i in hours],
-        "appointments_per_day": appointments_per_day,
+        "slots": get_daily_slots(
+            year,
+            month,
+            day,
+            [datetime.strptime(i, "%H:%M").time() for i in hours],
+            appointments_per_day,
+            request.user.id,
+            associates,
+        ),
         "prevday": prev_day(year, month, day),
         "nextday": next_day(year, month, day),
         "booked_hours": booked_hours,
@@ -158,7 +193,7 @@ def daily_agenda(request, year, month, day):
         "current_month": now.month,
         "current_year": now.year,
         "associates": associates,
-        "cabinet": associate.cabinet.name,
+        "cabinet": membership.cabinet.name,
         "associate_is_replacment": Associate.objects.is_replacment(request.user),
     }
 
@@ -166,11 +201,9 @@ def daily_agenda(request, year, month, day):
 
 
 @login_required
+@replica_reads
 def create_events(request, year, month, day, hour, event_id=None):
     """Create_events."""
-    associate = Associate.objects.filter(user_id=request.user.id).first()
-    associates = Associate.objects.get_associates(associate.cabinet_id)
-    associates = [associate.id for associate in associates]
 
     if not is_valid_year_month_day(year, month, day):
         return HttpResponseRedirect(
@@ -185,8 +218,9 @@ def create_events(request, year, month, day, hour, event_id=None):
             )
         )
 
+    start, end = day_range(year, month, day)
     event_per_day = Event.objects.filter(
-        date__icontains=f"{year}-{month}-{day}", user_id=request.user.id
+        date__gte=start, date__lt=end, user_id=request.user.id
     ).order_by("name")
 
     if event_id:
@@ -210,15 +244,26 @@ def create_events(request, year, month, day, hour, event_id=None):
         },
     )
 
-    if request.POST and form.is_valid():
-        if str(event.date)[11:16] in get_daily_agenda_hours():
-            event.create_events(user_id=request.user.id)
-            return HttpResponseRedirect(
-                reverse(
-                    "nurse:daily_agenda",
-                    kwargs={"year": year, "month": month, "day": day},
-                )
-            )
+    if request.POST:
+        success_url = reverse(
+            "nurse:daily_agenda", kwargs={"year": year, "month": month, "day": day}
+        )
+        token = request.POST.get("submission_token")
+        replay = claim_submission(request.user.id, token, success_url)
+        if replay:
+            return HttpResponseRedirect(replay)
+        # The token is released by any POST which writes nothing, errors
+        # included, so that the nurse can post the form again.
+        try:
+            if form.is_valid() and str(event.date)[11:16] in get_daily_agenda_hours():
+                event.create_events(user_id=request.user.id)
+                return HttpResponseRedirect(success_url)
+        except IntegrityError:
+            form.add_error("date", SLOT_TAKEN_MESSAGE)
+        except Exception:
+            release_submission(request.user.id, token)
+            raise
+        release_submission(request.user.id, token)
     return render(
         request,
         "pages/event.html",
@@ -237,11 +282,10 @@ def create_events(request, year, month, day, hour, event_id=None):
     )
 
 
+@replica_reads
 def edit_event(request, year, month, day, hour, event_id):
     """Edit event."""
-    associate = Associate.objects.filter(user_id=request.user.id).first()
-    associates = Associate.objects.get_associates(associate.cabinet_id)
-    associates = [associate.id for associate in associates]
+    membership = Associate.objects.get_membership(request.user)
     hours = get_daily_agenda_hours()
 
     if not is_valid_year_month_day(year, month, day):
@@ -252,14 +296,17 @@ def edit_event(request, year, month, day, hour, event_id):
             )
         )
 
-    date_of_the_day = datetime(int(year), int(month), int(day)).strftime("%Y-%m-%d")
+    start, end = day_range(year, month, day)
     event_per_day = Event.objects.filter(
-        date__icontains=date_of_the_day, user_id=request.user.id
+        date__gte=start, date__lt=end, user_id=request.user.id
     ).order_by("name")
 
-    event = get_object_or_404(Event, pk=event_id)
-    cabinet_events = Event.objects.filter(
-        user__associate__cabinet_id=associate.cabinet_id
+    event = get_object_or_404(Event.objects.select_related("events"), pk=event_id)
+    # A nurse without a cabinet only edits their own visits.
+    is_cabinet_event = (
+        event.cabinet_id == membership.cabinet_id
+        if membership.cabinet_id
+        else event.user_id == request.user.id
     )
     # This group can be a single or a recurency event
     group_event = Event.objects.filter(events_id=event.events_id)
@@ -279,23 +326,45 @@ def edit_event(request, year, month, day, hour, event_id):
             else dt.datetime(int(year), int(month), int(day), hour_, minute_).strftime(
                 "%Y-%m-%dT%H:%M"
             ),
+            "version": event.version,
+            "series_version": event.events.version if event.events else None,
         },
     )
+    status = 200
 
     if len(group_event) == 1:
         edit_choice = "thisone"  # To prevent list index out of range with other choices
     edit_choice = request.POST.get("choice_event_edit")
 
-    if request.POST and form.is_valid():
-        form.clean_cares()
-        form.clean_day_per_week()
-        event.update_events(group_event, edit_choice)
-        return HttpResponseRedirect(
-            reverse(
-                "nurse:daily_agenda",
-                kwargs={"year": year, "month": month, "day": day},
-            )
+    if request.POST:
+        success_url = reverse(
+            "nurse:daily_agenda", kwargs={"year": year, "month": month, "day": day}
         )
+        token = request.POST.get("submission_token")
+        replay = claim_submission(request.user.id, token, success_url)
+        if replay:
+            return HttpResponseRedirect(replay)
+        try:
+            if form.is_valid():
+                form.clean_cares()
+                form.clean_day_per_week()
+                event.update_events(
+                    group_event,
+                    edit_choice,
+                    version=form.cleaned_data["version"],
+                    series_version=form.cleaned_data["series_version"],
+                )
+                return HttpResponseRedirect(success_url)
+        except EditConflict:
+            form.add_error(None, EDIT_CONFLICT_MESSAGE)
+            status = 409
+        except SlotConflict as conflict:
+            form.add_error("date", slots_taken_message(conflict.dates))
+            status = 409
+        except Exception:
+            release_submission(request.user.id, token)
+            raise
+        release_submission(request.user.id, token)
 
     return render(
         request,
@@ -314,28 +383,124 @@ def edit_event(request, year, month, day, hour, event_id):
             "event": event,
             "current_month": now.month,
             "current_year": now.year,
-            "associates": associates,
-            "cab_events": cabinet_events,
-            "event_id_from_cabinet_events": [event.id for event in cabinet_events],
+            "associates": membership.member_ids,
+            "is_cabinet_event": is_cabinet_event,
         },
+        status=status,
+    )
+
+
+@login_required
+@require_POST
+def detach_occurrence(request, year, month, day, hour, events_id):
+    """Open a visit of a virtual series, stored as an event from now on."""
+    membership = Associate.objects.get_membership(request.user)
+    events = get_object_or_404(
+        Events, pk=events_id, is_virtual=True, cabinet_id=membership.cabinet_id
+    )
+    hour_, minute_ = (int(i) for i in hour.split(":"))
+    event = events.detach(datetime(int(year), int(month), int(day), hour_, minute_))
+    if event is None:
+        raise Http404("Visit not found")
+    return HttpResponseRedirect(event.get_html_url)
+
+
+def series_operation(request, events_id, form_class, operation):
+    """Apply an operation to a series of the cabinet and answer in JSON.
+
+    Answer the dates of the stored visits of the series, the form errors
+    (400) or the booked slots the operation falls on (409).
+    """
+    cabinet_id = Associate.objects.get_membership(request.user).cabinet_id
+    events = series.get_series(events_id, cabinet_id)
+    if events is None:
+        raise Http404("Series not found")
+    form = form_class(request.POST, cabinet_id=cabinet_id)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    try:
+        operation(events, **form.cleaned_data)
+    except series.SlotConflict as error:
+        return JsonResponse(
+            {
+                "error": slots_taken_message(error.dates),
+                "conflicts": [date.isoformat() for date in error.dates],
+            },
+            status=409,
+        )
+    except series.SeriesError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    dates = Event.objects.filter(events=events).order_by("date")
+    return JsonResponse(
+        {
+            "events": events.id,
+            "dates": [
+                date.isoformat() for date in dates.values_list("date", flat=True)
+            ],
+        }
     )
 
 
+@login_required
+@require_POST
+def shift_series(request, events_id):
+    """Shift a series by a number of days and minutes."""
+    return series_operation(request, events_id, SeriesShiftForm, series.shift)
+
+
+@login_required
+@require_POST
+def extend_series(request, events_id):
+    """Extend a series by a number of visits."""
+    return series_operation(request, events_id, SeriesExtendForm, series.extend)
+
+
+@login_required
+@require_POST
+def truncate_series(request, events_id):
+    """Truncate a series at a date."""
+    return series_operation(request, events_id, SeriesTruncateForm, series.truncate)
+
+
+@login_required
+@require_POST
+def reassign_series(request, events_id):
+    """Reassign a series to another nurse of the cabinet."""
+    return series_operation(request, events_id, SeriesReassignForm, series.reassign)
+
+
+@replica_reads
 def delete_event(request, year, month, day, hour, event_id):
     """Delete event."""
     hour_, minute_ = (int(i) for i in hour.split(":"))
-    event = get_object_or_404(Event, pk=event_id)
+    event = get_object_or_404(Event.objects.select_related("events"), pk=event_id)
     group_event = Event.objects.filter(events_id=event.events_id)
+    series_version = event.events.version if event.events else None
+    conflict = None
 
     if request.method == "POST":
-        event.delete_event(group_event, year, month, day, hour_, minute_)
-
-        return HttpResponseRedirect(
-            reverse(
-                "nurse:daily_agenda",
-                kwargs={"year": year, "month": month, "day": day},
+        posted_version = request.POST.get("series_version", "")
+        try:
+            event.delete_event(
+                group_event,
+                year,
+                month,
+                day,
+                hour_,
+                minute_,
+                series_version=int(posted_version)
+                if posted_version.isdigit()
+                else None,
+            )
+        except EditConflict:
+            conflict = EDIT_CONFLICT_MESSAGE
+        else:
+            return HttpResponseRedirect(
+                reverse(
+                    "nurse:daily_agenda",
+                    kwargs={"year": year, "month": month, "day": day},
+                )
             )
-        )
     return render(
         request,
         "pages/del_event.html",
@@ -345,7 +510,10 @@ def delete_event(request, year, month, day, hour, event_id):
             "year": year,
             "month": month,
             "day": day,
+            "series_version": series_version,
+            "conflict": conflict,
             "current_month": now.month,
             "current_year": now.year,
         },
+        status=409 if conflict else 200,
     )
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CabinetConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "nursapps.cabinet"
+
+    def ready(self):
+        """Connect the cabinet signals."""
+        from nursapps.cabinet import signals  # noqa: F401
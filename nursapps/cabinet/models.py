@@ -1,8 +1,13 @@
 """Cabinet models module."""
+from collections import namedtuple
+
 from django.db import models
 from django.conf import settings
 
+from nursapps.cache import Namespace
 from nursapps.nursauth.models import User
+from nursapps.routers import primary_reads
+from nursapps.transactions import serializable
 
 
 class Cabinet(models.Model):
@@ -20,14 +25,85 @@ class Cabinet(models.Model):
         ordering = ["name"]
 
 
+class MembershipConflict(Exception):
+    """Visits of a nurse fall on slots their new cabinet already booked."""
+
+    def __init__(self, dates):
+        """Init."""
+        self.dates = dates
+        super().__init__(
+            "L'association est impossible, ces visites tombent sur des tranches "
+            "horaires déjà occupées dans le cabinet : "
+            + ", ".join(date.strftime("%d/%m/%Y %H:%M") for date in dates)
+        )
+
+
+MEMBERSHIP_TIMEOUT = 60 * 60
+
+
+class Membership(namedtuple("Membership", ["cabinet", "member_ids"])):
+    """Cabinet of a user and the ids of the members of that cabinet."""
+
+    __slots__ = ()
+
+    @property
+    def cabinet_id(self):
+        """Return the cabinet id, None for a user without cabinet."""
+        return self.cabinet.id if self.cabinet else None
+
+
+MEMBERSHIPS = Namespace("cabinet:membership", MEMBERSHIP_TIMEOUT)
+
+
+def invalidate_memberships(user_ids):
+    """Drop the cached memberships of the users, now and after the commit."""
+    MEMBERSHIPS.delete_many(user_ids)
+
+
 class AssociateManager(models.Manager):
     """Associate manager."""
 
     def get_associates(self, cabinet):
         """Get associates."""
-        associates = self.all().filter(cabinet=cabinet)
-        associates = User.objects.filter(pk__in=[asso.user_id for asso in associates])
-        return associates
+        return User.objects.filter(associate__cabinet=cabinet)
+
+    def get_membership(self, user) -> Membership:
+        """Return the cabinet of a user and the frozen set of its member ids.
+
+        user can be a user or a user id. The membership is memoized on the user
+        instance, so once per request for request.user, and cached across
+        requests until an Associate or RequestAssociate of the cabinet changes.
+        """
+        membership = getattr(user, "_membership", None)
+        if membership is not None:
+            return membership
+
+        user_id = getattr(user, "id", user)
+        membership = MEMBERSHIPS.get(user_id)
+        if membership is None:
+            with primary_reads():
+                associates = list(
+                    self.filter(cabinet__associate__user_id=user_id).select_related(
+                        "cabinet"
+                    )
+                )
+            membership = Membership(
+                associates[0].cabinet if associates else None,
+                frozenset(associate.user_id for associate in associates),
+            )
+            MEMBERSHIPS.set(user_id, membership)
+        if not isinstance(user, int):
+            user._membership = membership
+        return membership
+
+    @serializable
+    def confirm(self, cabinet_id, sender_id):
+        """Make the sender of an association request a member of the cabinet."""
+        self.create(cabinet_id=cabinet_id, user_id=sender_id)
+        RequestAssociate.objects.filter(
+            cabinet_id=cabinet_id, sender_id=sender_id
+        ).delete()
+        User.objects.filter(pk=sender_id).update(is_cabinet_owner=True)
 
     def is_replacment(self, user):
         """Verify if user is replacment."""
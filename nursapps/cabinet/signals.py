@@ -0,0 +1,38 @@
+"""Cabinet signals module."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from nursapps.cabinet.models import (
+    MEMBERSHIPS,
+    Associate,
+    RequestAssociate,
+    invalidate_memberships,
+)
+
+
+def invalidate_cabinet_memberships(cabinet_id, user_id):
+    """Drop the cached memberships of a cabinet and of a user joining or leaving."""
+    user_ids = set(
+        Associate.objects.filter(cabinet_id=cabinet_id).values_list(
+            "user_id", flat=True
+        )
+    )
+    user_ids.add(user_id)
+    previous = MEMBERSHIPS.get(user_id)
+    if previous:
+        user_ids |= previous.member_ids
+    invalidate_memberships(user_ids)
+
+
+@receiver(post_save, sender=Associate)
+@receiver(post_delete, sender=Associate)
+def associate_changed(sender, instance, **kwargs):
+    """Invalidate the memberships touched by an associate."""
+    invalidate_cabinet_memberships(instance.cabinet_id, instance.user_id)
+
+
+@receiver(post_save, sender=RequestAssociate)
+@receiver(post_delete, sender=RequestAssociate)
+def request_associate_changed(sender, instance, **kwargs):
+    """Invalidate the memberships touched by an association request."""
+    invalidate_cabinet_memberships(instance.cabinet_id, instance.sender_id)
@@ -0,0 +1,92 @@
+"""Test cabinet models module."""
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import Client
+
+from nursapps.cabinet.models import Associate, Cabinet, RequestAssociate
+
+User = get_user_model()
+
+
+class TestMembership(TestCase):
+    """Test the cabinet membership resolver."""
+
+    def setUp(self):
+        """Set Up."""
+        cache.clear()
+        self.bill = User.objects.create_user(
+            username="bill", email="bill@bool.com", password="poufpouf"
+        )
+        self.bob = User.objects.create_user(
+            username="bob", email="bob@bebo.com", password="poufpouf"
+        )
+        self.bill.is_cabinet_owner = True
+        self.bill.save()
+
+        self.client = Client()
+
+        self.cabinet = Cabinet.objects.create(name="cabbill")
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=self.bill.id)
+
+    def test_get_membership(self):
+        """Test get membership returns the cabinet and the member ids."""
+        membership = Associate.objects.get_membership(self.bill)
+
+        self.assertEqual(membership.cabinet, self.cabinet)
+        self.assertEqual(membership.cabinet_id, self.cabinet.id)
+        self.assertEqual(membership.member_ids, frozenset([self.bill.id]))
+
+    def test_get_membership_without_cabinet(self):
+        """Test get membership of a user without cabinet."""
+        membership = Associate.objects.get_membership(self.bob)
+
+        self.assertIsNone(membership.cabinet_id)
+        self.assertEqual(membership.member_ids, frozenset())
+
+    def test_get_membership_is_memoized_and_cached(self):
+        """Test the membership is memoized on the user then cached."""
+        with self.assertNumQueries(1):
+            Associate.objects.get_membership(self.bill)
+            Associate.objects.get_membership(self.bill)
+
+        bill = User.objects.get(pk=self.bill.id)
+        with self.assertNumQueries(0):
+            Associate.objects.get_membership(bill)
+
+    def test_new_associate_invalidates_memberships(self):
+        """Test a new associate invalidates the memberships of the cabinet."""
+        Associate.objects.get_membership(self.bill.id)
+        Associate.objects.create(cabinet_id=self.cabinet.id, user_id=self.bob.id)
+
+        self.assertEqual(
+            Associate.objects.get_membership(self.bill.id).member_ids,
+            frozenset([self.bill.id, self.bob.id]),
+        )
+        self.assertEqual(
+            Associate.objects.get_membership(self.bob.id).cabinet, self.cabinet
+        )
+
+    def test_confirm_associate_invalidates_memberships(self):
+        """Test confirm associate invalidates the memberships of the cabinet."""
+        RequestAssociate.objects.create(
+            sender_id=self.bob.id,
+            receiver_id=self.bill.id,
+            cabinet_id=self.cabinet.id,
+        )
+        Associate.objects.get_membership(self.bill.id)
+        Associate.objects.get_membership(self.bob.id)
+
+        self.client.force_login(self.bill)
+        self.client.post(
+            "/accounts/profile/confirm-associate/",
+            {"confirm": self.bob.id, "choice": "associate"},
+        )
+
+        self.assertEqual(
+            Associate.objects.get_membership(self.bill.id).member_ids,
+            frozenset([self.bill.id, self.bob.id]),
+        )
+        self.assertEqual(
+            Associate.objects.get_membership(self.bob.id).cabinet_id, self.cabinet.id
+        )
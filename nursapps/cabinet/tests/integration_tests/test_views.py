@@ -13,6 +13,7 @@ from nursapps.cabinet.forms import (
     AssociationValidationForm,
     CancelAssociationForm,
 )
+from nursapps.agenda.models import Event
 from nursapps.cabinet.models import Associate, Cabinet, RequestAssociate
 
 User = get_user_model()
@@ -136,6 +137,33 @@ class TestCabinetViews(TestCase):
         )
         self.assertTemplateUsed(response, "registration/profile.html")
 
+    def test_confirm_associate_on_booked_slots(self):
+        """Test a nurse whose visits collide with the cabinet ones is refused."""
+        for user in (self.bill, self.bob):
+            Event.objects.create(
+                name="Client n1",
+                care_address="1 rue du chemin",
+                cares="AC",
+                user_id=user.id,
+                cabinet_id=self.cabinet.id if user == self.bill else None,
+                date=datetime(2022, 1, 3, 9, 0),
+            )
+        RequestAssociate.objects.create(
+            sender_id=self.bob.id, receiver_id=self.bill.id, cabinet_id=self.cabinet.id
+        )
+        self.client.force_login(self.bill)
+
+        response = self.client.post(
+            reverse("cabinet:confirm_associate"),
+            {"confirm": self.bob.id, "choice": "associate"},
+            follow=True,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "03/01/2022 09:00")
+        self.assertFalse(Associate.objects.filter(user=self.bob).exists())
+        self.assertTrue(RequestAssociate.objects.filter(sender_id=self.bob.id).exists())
+
     def test_confirm_associate(self):
         """Test confirm associate."""
         self.client.force_login(self.bob)
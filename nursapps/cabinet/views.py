@@ -7,8 +7,13 @@ from django.contrib.auth.decorators import login_required
 from django.http.response import JsonResponse
 from django.contrib import messages
 
-from nursapps.cabinet.models import Associate, Cabinet, RequestAssociate
-from nursapps.nursauth.models import User
+from nursapps.cabinet.models import (
+    Associate,
+    Cabinet,
+    MembershipConflict,
+    RequestAssociate,
+)
+from nursapps.routers import replica_reads
 from nursapps.cabinet.forms import (
     CreateCabinetForm,
     SearchCabinetForm,
@@ -22,6 +27,7 @@ now = datetime.now()
 
 
 @vary_on_headers("User-Agent")
+@replica_reads
 def autocomplete(request):
     """Jquery autocomplete response."""
     if request.method == "GET":
@@ -126,23 +132,19 @@ def confirm_associate(request):
     """Confirm associate."""
     associate = Associate.objects.get(user_id=request.user.id)
     if associate:
-        associates = Associate.objects.get_associates(associate.id)
+        associates = Associate.objects.get_associates(associate.cabinet_id)
         cabinet = Cabinet.objects.filter(pk=associate.cabinet_id).first()
 
     if request.method == "POST":
         valid_form = AssociationValidationForm(request.POST)
         if valid_form.is_valid():
             sender_id = request.POST.get("confirm")
-            choice = request.POST.get("choice")
             cabinet = Cabinet.objects.filter(pk=cabinet.id).first()
             if sender_id:
-                Associate.objects.create(cabinet_id=cabinet.id, user_id=sender_id)
-                RequestAssociate.objects.filter(
-                    cabinet_id=cabinet.id, sender_id=sender_id
-                ).delete()
-                user = User.objects.filter(pk=sender_id)
-                if choice == "associate" or "collaborator":
-                    user.update(is_cabinet_owner=True)
+                try:
+                    Associate.objects.confirm(cabinet.id, sender_id)
+                except MembershipConflict as conflict:
+                    messages.add_message(request, messages.ERROR, str(conflict))
                 return redirect("nursauth:profile")
     else:
         valid_form = AssociationValidationForm()
@@ -0,0 +1,139 @@
+"""Cache module.
+
+The shared cache of the apps. Every kind of value has its namespace of keys;
+the keys of a cabinet are versioned so that they are all dropped at once.
+The hits and misses of every namespace are counted per process.
+"""
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+
+_MISSING = object()
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+def stats() -> dict:
+    """Return the hits and misses per namespace counted by this process."""
+    with _counters_lock:
+        counters = dict(_counters)
+    namespaces = {}
+    for (name, outcome), count in counters.items():
+        namespaces.setdefault(name, {"hits": 0, "misses": 0})[outcome] = count
+    return namespaces
+
+
+def reset_stats():
+    """Reset the hit and miss counters."""
+    with _counters_lock:
+        _counters.clear()
+
+
+class Namespace:
+    """Keys of one kind of value in the shared cache.
+
+    A key is a value or a tuple of values, prefixed with the namespace name.
+    """
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT):
+        """Init."""
+        self.name = name
+        self.timeout = timeout
+
+    def key(self, key) -> str:
+        """Return the cache key of a key of the namespace."""
+        parts = key if isinstance(key, tuple) else (key,)
+        return ":".join(str(part) for part in (self.name, *parts))
+
+    def count(self, outcome):
+        """Count a hit or a miss of the namespace."""
+        with _counters_lock:
+            _counters[self.name, outcome] += 1
+
+    def get(self, key, default=None):
+        """Return the value of a key, default when missing."""
+        value = cache.get(self.key(key), _MISSING)
+        self.count("misses" if value is _MISSING else "hits")
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """Store the value of a key."""
+        cache.set(self.key(key), value, self.timeout_of(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT) -> bool:
+        """Store the value of a missing key, return False if it was there."""
+        return cache.add(self.key(key), value, self.timeout_of(timeout))
+
+    def delete(self, key):
+        """Drop a key."""
+        cache.delete(self.key(key))
+
+    def delete_many(self, keys):
+        """Drop keys, now and once the current transaction commits."""
+        cache_keys = [self.key(key) for key in keys]
+        cache.delete_many(cache_keys)
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+    def get_or_set(self, key, compute, timeout=DEFAULT_TIMEOUT):
+        """Return the value of a key, computed and stored when missing.
+
+        The cache key is computed before the value: for a cabinet namespace,
+        a value computed while a write was in flight is stored under a
+        version that write has already left behind.
+        """
+        cache_key = self.key(key)
+        value = cache.get(cache_key, _MISSING)
+        self.count("misses" if value is _MISSING else "hits")
+        if value is _MISSING:
+            value = compute()
+            cache.set(cache_key, value, self.timeout_of(timeout))
+        return value
+
+    def timeout_of(self, timeout):
+        """Return the timeout of a write, the namespace one by default."""
+        return self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+
+class CabinetNamespace(Namespace):
+    """Keys of a cabinet, the first value of a key being the cabinet id."""
+
+    def version_key(self, cabinet_id) -> str:
+        """Return the cache key of the version of the keys of a cabinet."""
+        return f"{self.name}-version:{cabinet_id}"
+
+    def version(self, cabinet_id) -> int:
+        """Return the current version of the keys of a cabinet."""
+        key = self.version_key(cabinet_id)
+        cache.add(key, 1, timeout=None)
+        return cache.get(key, 1)
+
+    def key(self, key) -> str:
+        """Return the cache key of a key at the current cabinet version."""
+        cabinet_id, *parts = key if isinstance(key, tuple) else (key,)
+        return super().key((cabinet_id, self.version(cabinet_id), *parts))
+
+    def bump(self, cabinet_id):
+        """Move the keys of a cabinet to a new version."""
+        key = self.version_key(cabinet_id)
+        if not cache.add(key, 2, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 2, timeout=None)
+
+    def invalidate(self, cabinet_id):
+        """Drop every key of a cabinet.
+
+        The version is bumped right away and again once the transaction
+        commits, so a value computed while the write was in flight is never
+        served.
+        """
+        if cabinet_id is None:
+            return
+        self.bump(cabinet_id)
+        transaction.on_commit(lambda: self.bump(cabinet_id))
@@ -0,0 +1,113 @@
+"""Instrumentation module.
+
+Per request: the number and time of the SQL queries, the template render
+time and the total latency, logged as one JSON line keyed by URL name. The
+SQL run by a template is counted in both the SQL and the template times.
+"""
+import functools
+import json
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+
+logger = logging.getLogger(__name__)
+
+_metrics = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Counters of a request."""
+
+    __slots__ = ("queries", "sql_time", "template_time")
+
+    def __init__(self):
+        """Init."""
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        """Run and time a query, as a database execute wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+
+def timed_render(render):
+    """Add the time of the top template renders to the request metrics."""
+
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        metrics = _metrics.get()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+    wrapper.timed = True
+    return wrapper
+
+
+class InstrumentationMiddleware:
+    """Log the SQL, template and total times of every request.
+
+    Left out of the middleware chain unless REQUEST_INSTRUMENTATION is set;
+    REQUEST_INSTRUMENTATION_HEADER adds them as a Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        """Init."""
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if not getattr(Template.render, "timed", False):
+            Template.render = timed_render(Template.render)
+
+    def __call__(self, request):
+        """Measure the request."""
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        logger.info(
+            json.dumps(
+                {
+                    "view": match.view_name if match else None,
+                    "method": request.method,
+                    "status": response.status_code,
+                    "queries": metrics.queries,
+                    "sql_ms": round(metrics.sql_time * 1000, 3),
+                    "template_ms": round(metrics.template_time * 1000, 3),
+                    "total_ms": round(total * 1000, 3),
+                }
+            )
+        )
+        if settings.REQUEST_INSTRUMENTATION_HEADER:
+            response["Server-Timing"] = (
+                f'sql;dur={metrics.sql_time * 1000:.3f};desc="{metrics.queries} '
+                f'queries", template;dur={metrics.template_time * 1000:.3f}, '
+                f"total;dur={total * 1000:.3f}"
+            )
+        return response
@@ -0,0 +1,116 @@
+"""Profiling module.
+
+Profile a single request on demand, in production. A request carrying a
+signed X-Profile header, or the profile query flag of a staff user, runs
+under cProfile. Its stats are dumped as a pstats file in
+REQUEST_PROFILING_DIR and the hottest functions of the agenda are logged
+with the file name.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+
+PROFILE_FLAG = "profile"
+
+PROFILE_SALT = "nursapps.profiling"
+
+HOT_MODULE = os.path.join("nursapps", "agenda", "")
+
+HOT_FUNCTIONS = 10
+
+
+def profiling_token() -> str:
+    """Return a signed value of the X-Profile header."""
+    return signing.TimestampSigner(salt=PROFILE_SALT).sign(PROFILE_FLAG)
+
+
+def wants_profile(request) -> bool:
+    """Return True if the request asks for a profile and may get it."""
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        try:
+            signing.TimestampSigner(salt=PROFILE_SALT).unsign(
+                token, max_age=settings.REQUEST_PROFILING_TOKEN_AGE
+            )
+        except signing.BadSignature:
+            return False
+        return True
+    return PROFILE_FLAG in request.GET and request.user.is_staff
+
+
+def hot_functions(stats, limit=HOT_FUNCTIONS) -> list:
+    """Return the functions of the agenda taking the most cumulative time."""
+    functions = [
+        {
+            "function": f"{os.path.relpath(path, settings.BASE_DIR)}:{line}({name})",
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for (path, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items()
+        if HOT_MODULE in path
+    ]
+    functions.sort(key=lambda function: function["cumtime_ms"], reverse=True)
+    return functions[:limit]
+
+
+class ProfilingMiddleware:
+    """Profile the requests which ask for it.
+
+    Left out of the middleware chain unless REQUEST_PROFILING is set. The
+    name of the pstats file is sent back in the X-Profile header.
+    """
+
+    def __init__(self, get_response):
+        """Init."""
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Profile the request if it asks for it."""
+        if not wants_profile(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        response = profile.runcall(self.get_response, request)
+
+        match = request.resolver_match
+        view = match.view_name if match else None
+        directory = Path(settings.REQUEST_PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / (
+            f"{datetime.now():%Y%m%d-%H%M%S}-"
+            f"{(view or 'unresolved').replace(':', '-')}-{uuid.uuid4().hex[:8]}.prof"
+        )
+        stats = pstats.Stats(profile)
+        stats.dump_stats(path)
+
+        logger.info(
+            json.dumps(
+                {
+                    "view": view,
+                    "path": request.get_full_path(),
+                    "status": response.status_code,
+                    "profile": str(path),
+                    "total_ms": round(stats.total_tt * 1000, 3),
+                    "hot": hot_functions(stats),
+                }
+            )
+        )
+        response[PROFILE_HEADER] = path.name
+        return response
@@ -0,0 +1,117 @@
+"""Database routers module.
+
+The agenda and cabinet reads of the views decorated with replica_reads go to
+the replica alias. A user who just wrote reads from the primary for a few
+seconds, the time for the replica to catch up.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from nursapps.cache import Namespace
+
+
+REPLICA = "replica"
+
+REPLICA_APPS = {"agenda", "cabinet"}
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+PINNED_USERS = Namespace("routers:pinned")
+
+_replica_reads = ContextVar("replica_reads", default=False)
+_pin_user = ContextVar("pin_user", default=None)
+
+
+def pin_to_primary(user_id):
+    """Send the reads of a user to the primary for a while."""
+    if user_id is not None:
+        PINNED_USERS.set(user_id, True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id) -> bool:
+    """Return True if the reads of a user go to the primary."""
+    return user_id is not None and PINNED_USERS.get(user_id, False)
+
+
+def replica_reads(view):
+    """Send the reads of a view to the replica.
+
+    Only for safe methods and users who did not write lately; a write in the
+    view sends its following reads to the primary.
+    """
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user_id = getattr(request.user, "id", None)
+        if (
+            not settings.REPLICA_READS
+            or request.method not in SAFE_METHODS
+            or is_pinned(user_id)
+        ):
+            return view(request, *args, **kwargs)
+        reads, user = _replica_reads.set(True), _pin_user.set(user_id)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(reads)
+            _pin_user.reset(user)
+
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Send the reads to the primary, for the data stored in the shared cache."""
+    reads = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(reads)
+
+
+class ReplicaPinMiddleware:
+    """Send the reads of a user who posted to the primary for a while."""
+
+    def __init__(self, get_response):
+        """Init."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Pin the user after an unsafe request."""
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            pin_to_primary(getattr(getattr(request, "user", None), "id", None))
+        return response
+
+
+class ReplicaRouter:
+    """Route the reads of the replica_reads views to the replica."""
+
+    def db_for_read(self, model, **hints):
+        """Return the replica inside a replica_reads view, out of transactions."""
+        if (
+            _replica_reads.get()
+            and model._meta.app_label in REPLICA_APPS
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """Return the primary and send the following reads there."""
+        if _replica_reads.get():
+            _replica_reads.set(False)
+            pin_to_primary(_pin_user.get())
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow the relations between the primary and replica rows."""
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Migrate the primary only."""
+        return db != REPLICA
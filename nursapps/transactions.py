@@ -0,0 +1,52 @@
+"""Transactions module.
+
+Connections run at READ COMMITTED; the write operations run in their own
+SERIALIZABLE transaction, retried when PostgreSQL aborts it on a
+serialization failure or a deadlock.
+"""
+import functools
+import random
+import time
+
+from django.db import OperationalError, connection, transaction
+
+
+SERIALIZABLE_ATTEMPTS = 5
+SERIALIZABLE_BACKOFF = 0.05
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+def is_retryable(error) -> bool:
+    """Return True if the transaction was aborted and can be run again."""
+    return getattr(error.__cause__, "pgcode", None) in RETRYABLE_SQLSTATES
+
+
+def serializable(func=None, *, attempts=SERIALIZABLE_ATTEMPTS):
+    """Run func in a SERIALIZABLE transaction, retried with backoff.
+
+    The isolation level is set and the retries are made by the outermost
+    call only: nested in a transaction, func joins it and a failure goes up
+    to whoever started it.
+    """
+    if func is None:
+        return functools.partial(serializable, attempts=attempts)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET TRANSACTION ISOLATION LEVEL SERIALIZABLE")
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if attempt == attempts - 1 or not is_retryable(error):
+                    raise
+            time.sleep(SERIALIZABLE_BACKOFF * 2**attempt * random.uniform(0.5, 1.5))
+
+    return wrapper